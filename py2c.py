@@ -2,20 +2,143 @@
 
 if __name__ == '__main__':
 
-    import sys, py_compile, marshal
-    from py2c.translator import CodeTranslator
-    from py2c.compile import compile_to_bytecode
-
-    if len(sys.argv) < 2:
-        print(f'Usage: {sys.argv[0]} pyc_file [out_file]')
-        exit(1)
-    
+    import argparse, sys
+    from py2c.cache import BuildCache
+    from py2c.compile import translate_file
+
+    parser = argparse.ArgumentParser(
+        description='Translate a python file to c source code.',
+        usage='%(prog)s [options] python_file [out_file]\n'
+        '       %(prog)s --batch [options] (python_file | directory)...',
+        fromfile_prefix_chars='@')
+    parser.add_argument('inputs', nargs='+', metavar='python_file')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='always retranslate, ignoring the build cache')
+    parser.add_argument('--cache-dir',
+                        help='location of the build cache (default: '
+                        '$PY2C_CACHE_DIR or ~/.cache/py2c)')
+    parser.add_argument('--memoize-pure', action='store_true',
+                        help='cache the results of recursive functions on '
+                        'integers that have no side effects')
+    parser.add_argument('--extension', action='store_true',
+                        help='output a python extension module named after '
+                        'the python file instead of a program')
+    parser.add_argument('--mixed', action='store_true',
+                        help='run the functions that cannot be translated, '
+                        'and the module level code if it cannot be, in '
+                        'python; programs then embed python')
+    parser.add_argument('--profile', action='store_true',
+                        help='run the python file first, recording the types '
+                        'of the parameters, locals and results of its '
+                        'functions, and translate the unannotated functions '
+                        'for those types')
+    parser.add_argument('--profile-file', metavar='PATH',
+                        help='where --profile writes the types (default: '
+                        'python_file.profile.json), or without --profile a '
+                        'profile to translate with')
+    parser.add_argument('--parallel', action='store_true',
+                        help='run the loops over a range whose iterations '
+                        'are independent, or only sum or find a maximum, on '
+                        'several threads with OpenMP; compile with -fopenmp')
+    parser.add_argument('--threads', type=int, default=0,
+                        help='number of threads of --parallel (default: '
+                        'chosen by OpenMP, one per core unless '
+                        'OMP_NUM_THREADS is set)')
+    parser.add_argument('--vectorize', action='store_true',
+                        help='write the loops so that the c compiler can '
+                        'vectorize them: counted, with constant steps, '
+                        'restrict pointers to the items they read and '
+                        'temporaries local to the loop body')
+    parser.add_argument('--vectorize-report', action='store_true',
+                        help='with --vectorize, compile the c file with '
+                        '--cc and --cflags and show which python loops the '
+                        'compiler vectorized, and why not the others')
+    parser.add_argument('--tail-call-report', action='store_true',
+                        help='show the recursive functions that run as a '
+                        'loop, because they return calls to themselves')
+
+    batch = parser.add_argument_group(
+        'batch mode', 'translate many files (or every file in a directory) '
+        'in parallel, writing filename.c next to each of them; a file list '
+        'can be passed as @list.txt')
+    batch.add_argument('--batch', action='store_true')
+    batch.add_argument('-j', '--jobs', type=int,
+                       help='number of parallel jobs (default: cpu count)')
+    batch.add_argument('--compile', action='store_true',
+                       help='also compile each translation to an executable, '
+                       'or to an extension module with --extension')
+    batch.add_argument('--cc', default='gcc', help='c compiler to use')
+    batch.add_argument('--cflags', default='-O3',
+                       help='flags passed to the c compiler')
+    args = parser.parse_args()
+
+    if args.batch and (args.profile or args.profile_file):
+        parser.error('--profile and --profile-file need a single python file')
+    if args.threads and not args.parallel:
+        parser.error('--threads needs --parallel')
+    if args.threads < 0:
+        parser.error('--threads must not be negative')
+    if args.vectorize_report and not args.vectorize:
+        parser.error('--vectorize-report needs --vectorize')
+    if args.batch and args.vectorize_report:
+        parser.error('--vectorize-report needs a single python file')
+    if args.batch and args.tail_call_report:
+        parser.error('--tail-call-report needs a single python file')
+    # the number of threads, or None to run every loop serially
+    parallel = args.threads if args.parallel else None
+
+    if args.batch:
+        from py2c.batch import translate_batch, print_summary
+        results = translate_batch(
+            args.inputs, jobs=args.jobs, use_cache=not args.no_cache,
+            cache_dir=args.cache_dir,
+            compiler=args.cc if args.compile else None,
+            flags=args.cflags.split(), memoize_pure=args.memoize_pure,
+            extension=args.extension, mixed=args.mixed,
+            parallel=parallel, vectorize=args.vectorize)
+        print_summary(results)
+        exit(1 if any(result.error for result in results) else 0)
+
+    if len(args.inputs) > 2:
+        parser.error('more than one input file requires --batch')
+    python_file = args.inputs[0]
+
     # Use filename.c if output file is not provided
-    if len(sys.argv) < 3:
-        sys.argv.append('.'.join(sys.argv[1].split('.')[:-1]) + '.c')
-    
-    bytecode = compile_to_bytecode(sys.argv[1])
-    c_source = CodeTranslator(bytecode).translate()
-
-    with open(sys.argv[2], 'w') as writefile:
-        writefile.write(c_source)
+    if len(args.inputs) < 2:
+        args.inputs.append('.'.join(python_file.split('.')[:-1]) + '.c')
+    out_file = args.inputs[1]
+
+    profile_file = args.profile_file
+    if args.profile:
+        from py2c.profiler import record_profile
+        profile_file = profile_file or \
+            '.'.join(python_file.split('.')[:-1]) + '.profile.json'
+        record_profile(python_file, profile_file)
+
+    cache = None if args.no_cache else BuildCache(args.cache_dir)
+    tail_calls = translate_file(python_file, out_file, cache,
+                                args.memoize_pure, args.extension, args.mixed,
+                                profile_file, parallel, args.vectorize)
+
+    if args.tail_call_report:
+        from py2c.compile import format_tail_call_report
+        for line in format_tail_call_report(python_file, tail_calls):
+            print(line)
+
+    if args.vectorize_report:
+        import subprocess
+        from py2c.compile import vectorization_report, \
+            format_vectorization_report, extension_flags, embedding_flags, \
+            openmp_flags
+        flags = args.cflags.split()
+        if args.extension:
+            flags += extension_flags()
+        elif args.mixed:
+            flags += embedding_flags()
+        if parallel is not None:
+            flags += openmp_flags()
+        try:
+            report = vectorization_report(out_file, args.cc, flags)
+        except subprocess.CalledProcessError as e:
+            sys.exit(f'{args.cc} failed:\n{e.stderr.strip()}')
+        print('\n'.join(format_vectorization_report(python_file, report)))
@@ -0,0 +1,31 @@
+import types, typing
+
+__version__ = '0.2.0'
+
+
+# calls to functions decorated with this are never inlined by the translator
+def noinline(func):
+    return func
+
+
+# annotation of the parameters that view a buffer without copying it, such
+# as a numpy array, an array.array or a memoryview: array[float] for
+# buffers of doubles and array[int] for buffers of longs. Translated code
+# can pass its lists as well, but python lists are rejected with TypeError
+T = typing.TypeVar('T')
+
+
+class array(typing.Generic[T]):
+    def __class_getitem__(cls, item_type):
+        return types.GenericAlias(cls, (item_type, ))
+
+
+# compiles the function to native code and returns the native function, which
+# is called like the python one. The compiled code is cached on disk, so later
+# runs load it without compiling. Can be used as @jit or as
+# @jit(compiler='clang', flags=('-O2', ), cache_dir=...)
+def jit(func=None, **options):
+    from py2c.native import compile_function
+    if func is None:
+        return lambda func: compile_function(func, **options)
+    return compile_function(func, **options)
@@ -0,0 +1,115 @@
+import os, subprocess, time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from py2c.cache import BuildCache
+from py2c.compile import translate_file, compile_c, extension_flags, \
+    embedding_flags, openmp_flags, EXTENSION_SUFFIX
+
+
+class BatchResult:
+    def __init__(self, path):
+        self.path = path
+        self.c_path = os.path.splitext(path)[0] + '.c'
+        self.binary = None
+        self.error = None
+        self.translation_time = 0.0
+        self.compilation_time = 0.0
+
+
+# expand directories into the python files they contain
+def find_sources(inputs):
+    paths = []
+    for path in inputs:
+        if not os.path.isdir(path):
+            paths.append(path)
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames[:] = sorted(d for d in dirnames if d != '__pycache__')
+            paths += [
+                os.path.join(dirpath, filename)
+                for filename in sorted(filenames) if filename.endswith('.py')
+            ]
+    return paths
+
+
+# runs in a worker process, so it only takes and returns picklable values
+def _translate(path, use_cache, cache_dir, memoize_pure, extension, mixed,
+               parallel, vectorize):
+    result = BatchResult(path)
+    cache = BuildCache(cache_dir) if use_cache else None
+    start = time.time()
+    try:
+        translate_file(path, result.c_path, cache, memoize_pure, extension,
+                       mixed, parallel=parallel, vectorize=vectorize)
+    except Exception as e:
+        result.error = f'translation failed: {type(e).__name__}: {e}'
+    result.translation_time = time.time() - start
+    return result
+
+
+def _compile(result, compiler, flags, cache, suffix, libs):
+    binary = os.path.splitext(result.path)[0] + suffix
+    start = time.time()
+    try:
+        compile_c(result.c_path, binary, compiler, flags, cache, libs)
+        result.binary = binary
+    except subprocess.CalledProcessError as e:
+        result.error = f'{compiler} failed:\n{e.stderr.strip()}'
+    except OSError as e:
+        result.error = f'{compiler} failed: {e}'
+    result.compilation_time = time.time() - start
+    return result
+
+
+# translate every file in a process pool, then run up to jobs compiler
+# processes at a time on the files that translated
+# compiler=None skips compilation, extension builds extension modules, and
+# mixed has python run what cannot be translated, parallel runs loops on
+# that many threads, and vectorize writes loops for the vectorizer
+def translate_batch(inputs, jobs=None, use_cache=True, cache_dir=None,
+                    compiler=None, flags=(), memoize_pure=False,
+                    extension=False, mixed=False, parallel=None,
+                    vectorize=False):
+    paths = find_sources(inputs)
+    jobs = jobs or os.cpu_count()
+
+    with ProcessPoolExecutor(jobs) as pool:
+        results = list(
+            pool.map(_translate, paths, [use_cache] * len(paths),
+                     [cache_dir] * len(paths),
+                     [memoize_pure] * len(paths),
+                     [extension] * len(paths), [mixed] * len(paths),
+                     [parallel] * len(paths), [vectorize] * len(paths),
+                     chunksize=max(1, len(paths) // (jobs * 4))))
+
+    if parallel is not None:
+        flags = [*flags, *openmp_flags()]
+    if compiler is not None and extension:
+        compile_batch(results, compiler, [*flags, *extension_flags()], jobs,
+                      use_cache, cache_dir, EXTENSION_SUFFIX)
+    elif compiler is not None:
+        # programs in mixed mode embed python
+        compile_batch(results, compiler, flags, jobs, use_cache, cache_dir,
+                      libs=embedding_flags() if mixed else ())
+
+    return results
+
+
+# compile the translated files to filename + suffix, up to jobs at a time
+def compile_batch(results, compiler, flags=(), jobs=None, use_cache=True,
+                  cache_dir=None, suffix='', libs=()):
+    cache = BuildCache(cache_dir) if use_cache else None
+    # the compiler does the work, so threads are enough to keep it busy
+    with ThreadPoolExecutor(jobs or os.cpu_count()) as pool:
+        list(
+            pool.map(
+                lambda result: _compile(result, compiler, flags, cache,
+                                        suffix, libs),
+                [result for result in results if not result.error]))
+
+
+def print_summary(results):
+    failures = [result for result in results if result.error]
+    for result in failures:
+        print(f'{result.path}: {result.error}')
+    print(f'{len(results) - len(failures)} of {len(results)} files succeeded, '
+          f'{len(failures)} failed')
@@ -0,0 +1,100 @@
+import functools, glob, hashlib, importlib.util, io, os, shutil, tempfile
+import py2c
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'py2c')
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024  # bytes
+
+
+# the released version plus a digest of the translator sources, so that
+# working on py2c itself never picks up stale translations
+@functools.lru_cache(maxsize=None)
+def translator_version():
+    digest = hashlib.sha256(py2c.__version__.encode())
+    package_dir = os.path.dirname(os.path.abspath(py2c.__file__))
+    for path in sorted(
+            glob.glob(os.path.join(package_dir, '*.py')) +
+            glob.glob(os.path.join(package_dir, 'runtime', '*.h'))):
+        with open(path, 'rb') as readfile:
+            digest.update(readfile.read())
+    return digest.hexdigest()
+
+
+# On-disk store of generated C sources and compiled binaries. Entries are
+# addressed by a hash of everything that affects their contents, so a hit can
+# be reused as-is. The least recently used entries are evicted once the cache
+# grows past max_size bytes.
+class BuildCache:
+    def __init__(self, directory=None, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory or os.environ.get('PY2C_CACHE_DIR',
+                                                     DEFAULT_CACHE_DIR)
+        self.max_size = max_size
+        # total size of the entries, only scanned from disk when first needed
+        self.size = None
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, source, flags=()):
+        if isinstance(source, str):
+            source = source.encode()
+        digest = hashlib.sha256()
+        digest.update(importlib.util.MAGIC_NUMBER)
+        digest.update(translator_version().encode())
+        for flag in flags:
+            digest.update(b'\0' + str(flag).encode())
+        digest.update(b'\0\0' + source)
+        return digest.hexdigest()
+
+    def path(self, key, suffix=''):
+        return os.path.join(self.directory, key + suffix)
+
+    # return the path of the entry, or None on a miss
+    def get(self, key, suffix=''):
+        path = self.path(key, suffix)
+        try:
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, data, suffix='', executable=False):
+        if isinstance(data, str):
+            data = data.encode()
+        return self.put_file(key, io.BytesIO(data), suffix, executable)
+
+    # like put, but copies the entry from a file object
+    def put_file(self, key, readfile, suffix='', executable=False):
+        mode = 'w' if isinstance(readfile.read(0), str) else 'wb'
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, mode) as writefile:
+            shutil.copyfileobj(readfile, writefile)
+        if executable:
+            os.chmod(tmp_path, 0o755)
+        path = self.path(key, suffix)
+        if self.size is None:
+            self.evict()
+        if os.path.exists(path):  # replaced, so no longer part of the size
+            self.size -= os.path.getsize(path)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)  # atomic, so readers never see half a file
+        self.size += size
+        if self.size > self.max_size:
+            self.evict()
+        return path
+
+    def evict(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        entries.sort()
+        while total > self.max_size and entries:
+            _, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.size = total
@@ -0,0 +1,444 @@
+import dis
+from py2c.ir import Branch, Jump, IfStatement, Label, EndLoop, negate, \
+    BinaryOperation, assigned_names, leaves_loops, statement_names
+
+JUMP_OPS = set(dis.hasjabs) | set(dis.hasjrel)
+UNCONDITIONAL_JUMPS = {dis.opmap['JUMP_ABSOLUTE'], dis.opmap['JUMP_FORWARD']}
+TERMINATORS = {
+    dis.opmap[name]
+    for name in ['RETURN_VALUE', 'RAISE_VARARGS', 'RERAISE']
+    if name in dis.opmap
+}
+
+
+class BasicBlock:
+    def __init__(self, start, instructions, label_prefix=''):
+        self.start = start  # offset of the first instruction
+        self.instructions = instructions
+        self.succs = []
+        self.preds = []
+        # filled in by the translator
+        self.statements = []
+        self.terminator = None
+        self.entry_types = None
+        self.label = Label(f'{label_prefix}L{start}')
+
+    @property
+    def last(self):
+        return self.instructions[-1]
+
+    # the block reached when the last instruction does not jump
+    @property
+    def fallthrough(self):
+        if self.last.opcode in UNCONDITIONAL_JUMPS or \
+                self.last.opcode in TERMINATORS:
+            return None
+        return self.succs[0] if self.succs else None
+
+    def __repr__(self):
+        return f'<block {self.start}>'
+
+
+class Loop:
+    def __init__(self, header, body, exit_):
+        self.header = header
+        self.body = body  # set of blocks, including the header
+        self.exit = exit_  # block reached on normal loop exit, or None
+        self.is_for = header.instructions[0].opname == 'FOR_ITER'
+
+
+class ControlFlowGraph:
+    # label_prefix keeps the labels of functions inlined into the same c
+    # function apart
+    def __init__(self, instructions, label_prefix=''):
+        self.label_prefix = label_prefix
+        self.blocks = []
+        self.block_at = {}  # start offset -> block
+
+        # a new block starts at jump targets and after jumps and returns
+        leaders = {instructions[0].offset}
+        for i, instr in enumerate(instructions):
+            if instr.is_jump_target:
+                leaders.add(instr.offset)
+            if (instr.opcode in JUMP_OPS or instr.opcode in TERMINATORS) \
+                    and i + 1 < len(instructions):
+                leaders.add(instructions[i + 1].offset)
+
+        current = []
+        for instr in instructions:
+            if instr.offset in leaders and current:
+                self.add_block(current)
+                current = []
+            current.append(instr)
+        self.add_block(current)
+
+        for i, block in enumerate(self.blocks):
+            following = self.blocks[i + 1] if i + 1 < len(self.blocks) \
+                else None
+            last = block.last
+            if last.opcode not in UNCONDITIONAL_JUMPS and \
+                    last.opcode not in TERMINATORS and following:
+                block.succs.append(following)
+            if last.opcode in JUMP_OPS:
+                target = self.block_at[last.argval]
+                if target not in block.succs:
+                    block.succs.append(target)
+            for succ in block.succs:
+                succ.preds.append(block)
+
+        self.entry = self.blocks[0]
+        self.reachable = self.reverse_postorder(self.entry,
+                                                lambda block: block.succs)
+        self.idom = self.dominators()
+        self.ipdom = self.post_dominators()
+        self.loops = self.find_loops()
+
+    def add_block(self, instructions):
+        block = BasicBlock(instructions[0].offset, instructions,
+                           self.label_prefix)
+        self.blocks.append(block)
+        self.block_at[block.start] = block
+
+    @staticmethod
+    def reverse_postorder(start, succs):
+        order = []
+        seen = {start}
+        stack = [(start, iter(succs(start)))]
+        while stack:
+            block, block_succs = stack[-1]
+            for succ in block_succs:
+                if succ not in seen:
+                    seen.add(succ)
+                    stack.append((succ, iter(succs(succ))))
+                    break
+            else:
+                order.append(block)
+                stack.pop()
+        order.reverse()
+        return order
+
+    # Cooper, Harvey and Kennedy's iterative algorithm
+    @staticmethod
+    def solve_dominators(order, preds):
+        index = {block: i for i, block in enumerate(order)}
+        idom = {order[0]: order[0]}
+
+        def intersect(a, b):
+            while a is not b:
+                while index[a] > index[b]:
+                    a = idom[a]
+                while index[b] > index[a]:
+                    b = idom[b]
+            return a
+
+        changed = True
+        while changed:
+            changed = False
+            for block in order[1:]:
+                new_idom = None
+                for pred in preds(block):
+                    if pred in idom:
+                        new_idom = pred if new_idom is None else intersect(
+                            pred, new_idom)
+                if new_idom is not None and idom.get(block) is not new_idom:
+                    idom[block] = new_idom
+                    changed = True
+        return idom
+
+    def dominators(self):
+        return self.solve_dominators(self.reachable,
+                                     lambda block: block.preds)
+
+    def dominates(self, a, b):
+        while b is not a:
+            parent = self.idom.get(b)
+            if parent is None or parent is b:
+                return False
+            b = parent
+        return True
+
+    # dominators of the reversed graph, where every block that leaves the
+    # function flows into a virtual exit node (mapped to None in the result)
+    def post_dominators(self):
+        virtual_exit = object()
+        exits = [block for block in self.reachable if not block.succs]
+        order = self.reverse_postorder(
+            virtual_exit,
+            lambda block: exits if block is virtual_exit else block.preds)
+        ipdom = self.solve_dominators(
+            order, lambda block: block.succs or [virtual_exit])
+        ipdom.pop(virtual_exit)
+        return {
+            block: None if post_dom is virtual_exit else post_dom
+            for block, post_dom in ipdom.items()
+        }
+
+    def find_loops(self):
+        reachable = set(self.reachable)
+        loops = {}
+        for block in self.reachable:
+            for succ in block.succs:
+                if not self.dominates(succ, block):
+                    continue
+                # back edge, collect the natural loop
+                body = loops[succ].body if succ in loops else {succ}
+                work = [block]
+                while work:
+                    node = work.pop()
+                    if node not in body and node in reachable:
+                        body.add(node)
+                        work += node.preds
+                loops[succ] = Loop(succ, body, None)
+
+        # for loops whose body never gets back to the FOR_ITER
+        for block in self.reachable:
+            if block.instructions[0].opname == 'FOR_ITER' and \
+                    block not in loops:
+                exit_ = self.block_at[block.last.argval]
+                body = {block}
+                work = [block.fallthrough]
+                while work:
+                    node = work.pop()
+                    if node not in body and node is not exit_ and \
+                            self.dominates(block, node):
+                        body.add(node)
+                        work += node.succs
+                loops[block] = Loop(block, body, exit_)
+
+        for header, loop in loops.items():
+            if loop.exit is not None:
+                continue
+            if loop.is_for:
+                loop.exit = self.block_at[header.last.argval]
+                continue
+            exits = [
+                succ for succ in header.succs if succ not in loop.body
+            ] or sorted({
+                succ
+                for block in loop.body for succ in block.succs
+                if succ not in loop.body
+            }, key=lambda block: block.start)
+            loop.exit = exits[0] if exits else None
+        return loops
+
+
+# Turns the translated blocks of a ControlFlowGraph back into nested C
+# control flow, falling back to goto for jumps that do not fit, appending
+# the statements to out as it goes. The ForLoop of each for loop records
+# what its body assigns and whether it can leave the loop, for the loop to
+# run in parallel. With names, scopes holds the for loops around every use
+# of each word of the statements, see statement_names
+class Structurer:
+    def __init__(self, cfg, out, names=False):
+        self.cfg = cfg
+        self.out = out
+        # the blocks emitted, numbered in order
+        self.emitted = {}
+        # the for loops being emitted, from the outermost, with the number
+        # of the next block emitted when each was opened
+        self.open_loops = []
+        # every for loop emitted, in order
+        self.for_loops = []
+        self.scopes = {} if names else None
+
+    # Labels are only written if a goto refers to them, which may come
+    # after them, so the blocks are structured once without writing
+    # anything to find the gotos first
+    def structure(self):
+        out, self.out = self.out, None
+        self.region(self.cfg.entry, None, [])
+        self.out = out
+        self.emitted = {}
+        self.region(self.cfg.entry, None, [])
+
+    # skip over blocks that do nothing but jump somewhere else
+    def forward(self, block):
+        while block is not None and not block.statements and \
+                isinstance(block.terminator, Jump) and \
+                block not in self.cfg.loops:
+            block = block.terminator.target
+        return block
+
+    # the statement that gets from inside loop to block, if there is one
+    def loop_jump(self, block, loop):
+        if loop is None:
+            return None
+        if self.forward(block) is loop.header:
+            return 'continue;'
+        if block is loop.exit or self.forward(block) is self.forward(
+                loop.exit):
+            return 'break;'
+        return None
+
+    def emit(self, statement):
+        if self.out is None:
+            return
+        self.out.append(statement)
+        for for_loop, _ in self.open_loops:
+            for_loop.body_assigns.update(assigned_names(statement))
+            if leaves_loops(statement):
+                for_loop.body_leaves = True
+        if self.scopes is not None:
+            self.use(statement_names(statement))
+
+    # note the uses of the names in the for loops open
+    def use(self, names):
+        scope = tuple(for_loop for for_loop, _ in self.open_loops)
+        for name in names:
+            common = self.scopes.get(name, scope)
+            length = 0
+            while length < len(common) and length < len(scope) and \
+                    common[length] is scope[length]:
+                length += 1
+            self.scopes[name] = common[:length]
+
+    def mark_emitted(self, block):
+        self.emitted[block] = len(self.emitted)
+
+    def goto(self, block):
+        block.label.used = True
+        self.emit(f'goto {block.label.name};\n')
+        # the loops opened after the label was emitted are left
+        for for_loop, opened in self.open_loops:
+            if self.emitted[block] < opened:
+                for_loop.body_leaves = True
+
+    # the statement that gets from inside loop to block, noting a break
+    # out of a for loop
+    def jump(self, block, loop):
+        jump = self.loop_jump(block, loop)
+        if jump == 'break;' and loop.is_for:
+            loop.header.terminator.body_leaves = True
+        return jump
+
+    def open_for_loop(self, for_loop):
+        if self.out is None:
+            self.open_loops.append((for_loop, len(self.emitted)))
+            return
+        scopes, self.scopes = self.scopes, None
+        self.emit(for_loop)
+        self.scopes = scopes
+        if scopes is not None:
+            # the bounds are read before the loop, the last line assigns the
+            # loop variable in the body
+            self.use(statement_names(
+                str(for_loop).rstrip('\n').rpartition('\n')[0]))
+        for outer, _ in self.open_loops:
+            outer.inner.append(for_loop)
+        self.for_loops.append(for_loop)
+        self.open_loops.append((for_loop, len(self.emitted)))
+        if scopes is not None:
+            self.use([for_loop.var.name])
+
+    # emit blocks starting at block until stop is reached
+    def region(self, block, stop, loops):
+        while block is not None and block is not stop:
+            jump = self.jump(block, loops[-1] if loops else None)
+            if jump:
+                self.emit(jump + '\n')
+                return
+            if block in self.emitted:
+                self.goto(block)
+                return
+            if block in self.cfg.loops:
+                block = self.loop(self.cfg.loops[block], loops)
+            else:
+                block = self.block(block, stop, loops)
+
+    def loop(self, loop, loops):
+        header = loop.header
+        inner = loops + [loop]
+        self.mark_emitted(header)
+        self.emit(header.label)
+
+        if loop.is_for:
+            if header.statements:
+                self.emit(header.statements)
+            self.open_for_loop(header.terminator)
+            self.region(header.fallthrough, header, inner)
+            self.open_loops.pop()
+            self.emit(EndLoop(header.terminator))
+            return loop.exit
+
+        term = header.terminator
+        if isinstance(term, Branch) and not header.statements and \
+                loop.exit in (term.target, term.fallthrough):
+            # plain `while cond:` loop
+            if term.target is loop.exit:
+                cond, body = negate(term.cond), term.fallthrough
+            else:
+                cond, body = term.cond, term.target
+            self.emit(f'while ({cond.name}) {{\n')
+            self.region(body, header, inner)
+        else:
+            self.emit('while (1) {\n')
+            self.region(self.block(header, header, inner), header, inner)
+        self.emit('}\n')
+        return loop.exit
+
+    # fold chains of pure conditional jumps into one && / || condition
+    def merge_conditions(self, cond, target, fallthrough, stop, loops):
+        exits = [loop.exit for loop in loops]
+        while fallthrough is not stop and fallthrough not in self.emitted \
+                and fallthrough not in self.cfg.loops \
+                and fallthrough not in exits \
+                and (not loops or fallthrough in loops[-1].body) \
+                and len(fallthrough.preds) == 1 \
+                and not fallthrough.statements \
+                and isinstance(fallthrough.terminator, Branch):
+            term = fallthrough.terminator
+            if term.target is target:
+                cond = BinaryOperation(cond, '||', term.cond, 'long')
+            elif term.fallthrough is target:
+                cond = BinaryOperation(negate(cond), '&&', term.cond, 'long')
+            else:
+                break
+            self.mark_emitted(fallthrough)
+            target, fallthrough = term.target, term.fallthrough
+        return cond, target, fallthrough
+
+    def block(self, block, stop, loops):
+        self.mark_emitted(block)
+        self.emit(block.label)
+        if block.statements:
+            self.emit(block.statements)
+        term = block.terminator
+
+        if isinstance(term, Jump):
+            return term.target
+        if not isinstance(term, Branch):
+            return block.fallthrough
+
+        cond, target, fallthrough = self.merge_conditions(
+            term.cond, term.target, term.fallthrough, stop, loops)
+
+        # jumps out of the innermost loop
+        loop = loops[-1] if loops else None
+        for cond_, to, other in ((cond, target, fallthrough),
+                                 (negate(cond), fallthrough, target)):
+            jump = self.jump(to, loop)
+            if jump:
+                self.emit(IfStatement(cond_.name, jump))
+                return other
+
+        # the follow block is emitted after the if, so it must only be
+        # reachable through it, unless the enclosing region stops there
+        follow = self.cfg.ipdom.get(block)
+        if follow is not None and follow is not stop and (
+                not self.cfg.dominates(block, follow) or
+                (loop and follow not in loop.body)):
+            follow = None
+        if self.forward(fallthrough) is follow:
+            cond, target, fallthrough = negate(cond), fallthrough, target
+
+        self.emit(f'if ({negate(cond).name}) {{\n')
+        self.region(fallthrough, follow, loops)
+        if follow is None:
+            # the then branch never comes back, the rest continues inline
+            self.emit('}\n')
+            return target
+        if target is not follow:
+            self.emit('} else {\n')
+            self.region(target, follow, loops)
+        self.emit('}\n')
+        return follow
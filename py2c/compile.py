@@ -1,8 +1,224 @@
-import py_compile, marshal
+import ast, os, re, shutil, subprocess, sysconfig
+from py2c.profiler import load_profile
+from py2c.translator import CodeTranslator
+from py2c.ir import C_STRING
+
+# file name suffix of extension modules for the running python
+EXTENSION_SUFFIX = sysconfig.get_config_var('EXT_SUFFIX')
+# the comment before each loop translated with vectorize, see ir.ForLoop
+LOOP_MARKER = re.compile(r'// py2c loop at line (\d+)$')
+# a message of gcc -fopt-info-vec-all: file:line:column: kind: text
+VECTORIZER_MESSAGE = re.compile(r'.*:(\d+):\d+: (optimized|missed): (.*)')
+
 
 def compile_to_bytecode(filepath):
-    pyc_file = py_compile.compile(filepath)
-    readfile = open(pyc_file, 'rb')
-    readfile.read(16)  # get through header bits
-    bytecode = marshal.load(readfile)
-    return bytecode
+    with open(filepath, 'rb') as readfile:
+        source = readfile.read()
+    return compile(source, filepath, 'exec', dont_inherit=True)
+
+
+# the name of the extension module built from a python file
+def module_name(filepath):
+    name = os.path.splitext(os.path.basename(filepath))[0]
+    if not name.isidentifier():
+        raise Exception(f'{name} is not a valid module name')
+    return name
+
+
+# the compiler flags for building an extension module for the running python
+def extension_flags():
+    return ['-shared', '-fPIC', f'-I{sysconfig.get_paths()["include"]}']
+
+
+# the flags for linking a program with the running python, which programs
+# translated in mixed mode embed. They go after the c file
+def embedding_flags():
+    config = sysconfig.get_config_var
+    flags = [
+        f'-I{sysconfig.get_paths()["include"]}', f'-L{config("LIBDIR")}',
+        f'-lpython{config("VERSION")}{config("ABIFLAGS") or ""}'
+    ]
+    if config('Py_ENABLE_SHARED'):
+        flags.append(f'-Wl,-rpath,{config("LIBDIR")}')
+    return flags + config('LIBS').split() + config('SYSLIBS').split()
+
+
+# the compiler flag that makes the loops translated with parallel run on
+# several threads, without it they run on one
+def openmp_flags():
+    return ['-fopenmp']
+
+
+# translate a python file to a c file, reusing a cached translation if the
+# source has not changed. With extension, the c file is an extension module
+# named after the python file. With mixed, python runs what cannot be
+# translated. With parallel, the loops with independent iterations run on
+# that many threads (0 for the number of cores), see openmp_flags. With
+# vectorize, the loops are written for the vectorizer of the c compiler, see
+# vectorization_report. Returns the (name, kind) of the functions
+# whose recursion runs as a loop, see format_tail_call_report
+def translate_file(filepath, out_path, cache=None, memoize_pure=False,
+                   extension=False, mixed=False, profile_path=None,
+                   parallel=None, vectorize=False):
+    module = module_name(filepath) if extension else None
+    if cache is not None:
+        with open(filepath, 'rb') as readfile:
+            data = readfile.read()
+        if profile_path is not None:
+            with open(profile_path, 'rb') as readfile:
+                data += readfile.read()
+        key = cache.key(data, flags=('translate', memoize_pure, module, mixed,
+                                     profile_path is not None, parallel,
+                                     vectorize))
+        cached = cache.get(key, '.c')
+        cached_tail_calls = cache.get(key, '.tail')
+        if cached and cached_tail_calls:
+            shutil.copyfile(cached, out_path)
+            with open(cached_tail_calls) as readfile:
+                return ast.literal_eval(readfile.read())
+
+    profile = load_profile(profile_path) if profile_path else None
+    source = None
+    if mixed:
+        with open(filepath) as readfile:
+            source = readfile.read()
+    translator = CodeTranslator(compile_to_bytecode(filepath), cache,
+                                memoize_pure, module, source, profile,
+                                parallel, vectorize)
+    try:
+        with open(out_path, 'w') as writefile:
+            translator.translate(writefile)
+    except Exception:
+        os.remove(out_path)  # don't leave half a program behind
+        raise
+
+    if cache is not None:
+        cache.put(key, repr(translator.tail_calls), '.tail')
+        with open(out_path) as readfile:
+            cache.put_file(key, readfile, '.c')
+    return translator.tail_calls
+
+
+# compile a c file to an executable, reusing a cached binary if the same
+# source was already built with the same compiler and flags. libs are passed
+# after the c file
+# raises subprocess.CalledProcessError holding the compiler output on failure
+def compile_c(c_path, out_path, compiler='gcc', flags=(), cache=None,
+              libs=()):
+    if cache is not None:
+        with open(c_path, 'rb') as readfile:
+            key = cache.key(readfile.read(), flags=(compiler, *flags, *libs))
+        cached = cache.get(key)
+        if cached:
+            shutil.copy2(cached, out_path)
+            return
+
+    subprocess.run([compiler, *flags, c_path, '-o', out_path, *libs],
+                   capture_output=True, text=True, check=True)
+
+    if cache is not None:
+        with open(out_path, 'rb') as readfile:
+            cache.put(key, readfile.read(), executable=True)
+
+
+# Compile a c file translated with vectorize without linking it, with the
+# compiler reporting on the loops it vectorizes (gcc or clang's
+# -fopt-info-vec-all), and return what it did to each loop of the python
+# file: (python line, c copies of the loop, copies vectorized, the reasons
+# the others were not) by line. Loops are copied by inlining
+# raises subprocess.CalledProcessError holding the compiler output on failure
+def vectorization_report(c_path, compiler='gcc', flags=()):
+    # the python line of each loop by the c line of its for, which follows
+    # its marker, and the c line closing it
+    with open(c_path) as readfile:
+        lines = [C_STRING.sub('""', line) for line in readfile]
+    loops = {}
+    ends = {}
+    for number, line in enumerate(lines, 1):
+        match = LOOP_MARKER.match(line)
+        if match is None:
+            continue
+        loops[number + 1] = int(match.group(1))
+        depth = 0
+        for end in range(number + 1, len(lines) + 1):
+            depth += lines[end - 1].count('{') - lines[end - 1].count('}')
+            if depth <= 0:
+                break
+        ends[number + 1] = end
+
+    # the compiler gives the location of a loop at a statement of it,
+    # which is in the innermost loop around that line
+    def loop_at(number):
+        around = [start for start in loops if start <= number <= ends[start]]
+        return max(around, default=None)
+
+    output = subprocess.run(
+        [compiler, *flags, '-fopt-info-vec-all', '-c', c_path, '-o',
+         os.devnull],
+        capture_output=True, text=True, check=True).stderr
+
+    # the c lines of the loops vectorized, the inner loops of a vectorized
+    # loop included, and the reasons for the others
+    vectorized = set()
+    reasons = {}
+    loop = None
+    for message in output.splitlines():
+        match = VECTORIZER_MESSAGE.fullmatch(message)
+        if match is None:
+            continue
+        number, kind, text = int(match.group(1)), match.group(2), \
+            match.group(3)
+        if text.startswith(('loop vectorized', 'outer-loop already '
+                            'vectorized', "couldn't vectorize loop")):
+            loop = loop_at(number)
+            if loop is not None and (kind == 'optimized' or
+                                     text.startswith('outer-loop')):
+                vectorized.add(loop)
+            continue
+        if not text.startswith('not vectorized'):
+            # the reasons follow the loop, at the line of the statement at
+            # fault, until the compiler looks at something else
+            loop = None
+        if kind == 'missed' and loop is not None:
+            text = text.replace('not vectorized: ', '').rstrip('.')
+            reasons.setdefault(loop, [])
+            if text not in reasons[loop]:
+                reasons[loop].append(text)
+
+    report = []
+    for line in sorted(set(loops.values())):
+        copies = [number for number in loops if loops[number] == line]
+        missed = []
+        for number in copies:
+            if number not in vectorized:
+                missed += [text for text in reasons.get(number, [])
+                           if text not in missed]
+        report.append((line, len(copies), len(vectorized.intersection(copies)),
+                       missed))
+    return report
+
+
+# the lines describing a vectorization_report of the python file
+def format_vectorization_report(filepath, report):
+    lines = []
+    for line, copies, vectorized, reasons in report:
+        if vectorized == copies:
+            status = 'vectorized'
+        elif vectorized:
+            status = f'vectorized in {vectorized} of {copies} copies'
+        else:
+            status = 'not vectorized'
+        if vectorized < copies:
+            status += ': ' + '; '.join(
+                reasons or ['no reason given by the compiler'])
+        lines.append(f'{filepath}:{line}: loop {status}')
+    return lines
+
+
+# the lines describing the tail calls returned by translate_file for the
+# python file
+def format_tail_call_report(filepath, tail_calls):
+    return [
+        f'{filepath}: {kind} recursion of {name} runs as a loop'
+        for name, kind in tail_calls
+    ]
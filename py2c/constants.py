@@ -0,0 +1,481 @@
+import dis, functools, math, sys, types, typing
+from py2c.inference import StackAnalysis, opcode_table, \
+    previous_instruction, is_generic
+from py2c.ir import Module, Decorator, BuildClass
+
+# lattice of the analysis: UNDEF, then a single python value, then NAC
+UNDEF = type('Undefined', (), {'__repr__': lambda self: 'UNDEF'})()
+NAC = type('NotAConstant', (), {'__repr__': lambda self: 'NAC'})()
+
+C_LONG_MIN = -2**63
+C_LONG_MAX = 2**63 - 1
+
+# calls to pure functions are evaluated for at most this many lines
+MAX_EVALUATION_LINES = 10000
+
+# bytecode that can appear in a function without side effects
+PURE_OPS = {
+    'NOP', 'EXTENDED_ARG', 'POP_TOP', 'ROT_TWO', 'ROT_THREE', 'DUP_TOP',
+    'LOAD_CONST', 'LOAD_FAST', 'STORE_FAST', 'COMPARE_OP', 'CALL_FUNCTION',
+    'RETURN_VALUE', 'GET_ITER', 'FOR_ITER', 'JUMP_ABSOLUTE', 'JUMP_FORWARD',
+    'POP_JUMP_IF_FALSE', 'POP_JUMP_IF_TRUE', 'JUMP_IF_FALSE_OR_POP',
+    'JUMP_IF_TRUE_OR_POP', 'UNARY_POSITIVE', 'UNARY_NEGATIVE', 'UNARY_NOT',
+    'BINARY_ADD', 'BINARY_SUBTRACT', 'BINARY_MULTIPLY', 'BINARY_MODULO',
+    'BINARY_FLOOR_DIVIDE', 'BINARY_TRUE_DIVIDE', 'BINARY_POWER',
+    'INPLACE_ADD', 'INPLACE_SUBTRACT', 'INPLACE_MULTIPLY', 'INPLACE_MODULO',
+    'INPLACE_FLOOR_DIVIDE', 'INPLACE_TRUE_DIVIDE', 'INPLACE_POWER',
+    'BUILD_TUPLE', 'UNPACK_SEQUENCE'
+}
+# bytecode c computes differently from python: c rounds integer division
+# towards zero, python towards negative infinity
+C_DIVERGENT_OPS = {
+    'BINARY_FLOOR_DIVIDE', 'BINARY_MODULO', 'INPLACE_FLOOR_DIVIDE',
+    'INPLACE_MODULO'
+}
+# builtins that pure functions may call
+PURE_BUILTINS = {'range': range}
+
+# the c operator generated for each opcode
+ARITHMETIC_OPS = {
+    'BINARY_ADD': '+',
+    'BINARY_SUBTRACT': '-',
+    'BINARY_MULTIPLY': '*',
+    'BINARY_FLOOR_DIVIDE': '/',
+    'BINARY_MODULO': '%',
+    'INPLACE_ADD': '+',
+    'INPLACE_SUBTRACT': '-',
+    'INPLACE_MULTIPLY': '*',
+    'INPLACE_FLOOR_DIVIDE': '/',
+    'INPLACE_MODULO': '%',
+}
+
+
+# whether value can be written as a c literal of a numeric type
+def is_constant(value):
+    if type(value) in (int, bool):
+        return C_LONG_MIN <= value <= C_LONG_MAX
+    return type(value) == float and math.isfinite(value)
+
+
+# the names the code or the functions nested in it assign with
+# `global name`
+def global_stores(code):
+    names = {
+        instr.argval
+        for instr in dis.get_instructions(code)
+        if instr.opname == 'STORE_GLOBAL'
+    }
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= global_stores(const)
+    return names
+
+
+# the value a c variable of py_type holds after value is assigned to it
+def convert(value, py_type):
+    if is_constant(value) and py_type in (int, float):
+        return py_type(value)
+    return value
+
+
+def join(a, b):
+    if a is UNDEF or a is b:
+        return b
+    if b is UNDEF:
+        return a
+    if a is NAC or b is NAC or type(a) != type(b) or a != b:
+        return NAC
+    return a
+
+
+# lhs op rhs the way the generated c computes it, or NAC if c would not
+# produce the same value (or any value)
+def evaluate(lhs, op, rhs):
+    if not (is_constant(lhs) and is_constant(rhs)):
+        return NAC
+    if type(lhs) == bool or type(rhs) == bool:
+        lhs, rhs = int(lhs), int(rhs)
+    if op in ('<', '<=', '==', '!=', '>', '>='):
+        result = {
+            '<': lhs < rhs,
+            '<=': lhs <= rhs,
+            '==': lhs == rhs,
+            '!=': lhs != rhs,
+            '>': lhs > rhs,
+            '>=': lhs >= rhs,
+        }[op]
+        return int(result)
+    if op in ('/', '%') and rhs == 0:
+        return NAC
+    if op == '+':
+        result = lhs + rhs
+    elif op == '-':
+        result = lhs - rhs
+    elif op == '*':
+        result = lhs * rhs
+    elif op == '/' and float in (type(lhs), type(rhs)):
+        result = lhs / rhs
+    elif op == '/':
+        # c rounds towards zero, python towards negative infinity
+        result = abs(lhs) // abs(rhs) * (1 if (lhs < 0) == (rhs < 0) else -1)
+    elif op == '%' and type(lhs) == int and type(rhs) == int:
+        result = lhs - rhs * evaluate(lhs, '/', rhs)
+    else:
+        return NAC
+    return result if is_constant(result) else NAC
+
+
+@functools.lru_cache(maxsize=None)
+def code_opnames(code):
+    return {instr.opname for instr in dis.get_instructions(code)}
+
+
+# Run a pure function at translation time, or return NAC if it raises or
+# takes more than max_lines lines to finish. The result has to be the one
+# the generated c computes, so the functions it calls must not divide
+# integers, and the integers their variables hold must fit in a c long
+def evaluate_call(func, args, max_lines=MAX_EVALUATION_LINES):
+    lines = 0
+
+    def trace(frame, event, arg):
+        nonlocal lines
+        if event == 'call' and code_opnames(frame.f_code) & C_DIVERGENT_OPS:
+            raise ArithmeticError('c divides integers differently')
+        values = list(frame.f_locals.values())
+        if event == 'return':
+            values.append(arg)
+        if any(type(value) is int and not is_constant(value)
+               for value in values):
+            raise OverflowError('a c long would overflow')
+        if event == 'line':
+            lines += 1
+            if lines > max_lines:
+                raise TimeoutError('evaluation takes too long')
+        return trace
+
+    # convert the arguments the way the call in c would
+    args = [param[0](arg) for param, arg in zip(func.func_sig, args)]
+    old_trace = sys.gettrace()
+    sys.settrace(trace)
+    try:
+        result = func(*args)
+    except Exception:
+        return NAC
+    finally:
+        sys.settrace(old_trace)
+    if not is_constant(result):
+        return NAC
+    return func.func_sig[-1][0](result)
+
+
+# the functions in env that only compute a value from their arguments,
+# starting from all of them and dropping the ones that use anything else
+def pure_functions(env):
+    pure = {
+        value
+        for value in env.values() if isinstance(value, types.FunctionType)
+    }
+    changed = True
+    while changed:
+        changed = False
+        for func in list(pure):
+            if not is_pure(func.__code__, env, pure):
+                pure.discard(func)
+                changed = True
+    return pure
+
+
+def is_pure(code, env, pure):
+    if code.co_freevars or code.co_cellvars:
+        return False
+    for instr in dis.get_instructions(code):
+        if instr.opname == 'LOAD_GLOBAL':
+            value = env.get(instr.argval,
+                            PURE_BUILTINS.get(instr.argval, NAC))
+            if not (is_constant(value) or value in pure or
+                    value in PURE_BUILTINS.values()):
+                return False
+        elif instr.opname not in PURE_OPS:
+            return False
+    return True
+
+
+# Finds the values that are the same every time an instruction runs, and the
+# variables that only ever hold one value. Module level names that turn out
+# to be constant, and the functions that are found to be pure, are passed on
+# to the analysis of each function as env and pure. Calls to pure functions
+# with constant arguments are folded by running them.
+class ConstantPropagation(StackAnalysis):
+    UNDEFINED = UNDEF
+    UNKNOWN = NAC
+    # handler of each opcode, filled in after the class
+    OPCODE_TABLE: typing.ClassVar[dict] = {}
+
+    def __init__(self, code, cfg, instructions, types_, env=None, pure=None):
+        super().__init__(code, cfg, instructions)
+        # the TypeInference of the code, values are converted to the types
+        # of the variables they are stored to
+        self.types = types_
+        # environment that pure functions are evaluated in, holding the
+        # constant module level names
+        self.env = env if env is not None else {
+            '__builtins__': PURE_BUILTINS
+        }
+        self.pure = pure if pure is not None else set()
+
+        # names stored to by this code, the others are looked up in env
+        self.stored_names = {
+            instr.arg
+            for instr in instructions
+            if instr.opname in ('STORE_NAME', 'DELETE_NAME', 'STORE_GLOBAL')
+        }
+        # names any function may assign, whose value is never known
+        written = global_stores(code)
+        self.written_names = {
+            name_idx
+            for name_idx, name in enumerate(code.co_names) if name in written
+        }
+        # one function object per MAKE_FUNCTION, so that passes agree
+        self.functions = {}
+        # results of the pure calls that were evaluated
+        self.calls = {}
+
+        self.solve()
+        if pure is None:
+            # evaluating calls can make more names constant, and those can
+            # make more functions pure
+            while True:
+                self.update_env()
+                pure = pure_functions(self.env)
+                if pure == self.pure:
+                    break
+                self.pure = pure
+                self.solve()
+
+    def solve(self):
+        self.entry_stacks = {self.cfg.entry: []}
+        self.local_values = {i: NAC for i in range(self.types.num_params)}
+        self.name_values = {i: NAC for i in self.written_names}
+        super().solve()
+
+    def start_pass(self):
+        # constant pushed by each instruction, only kept from the last pass
+        self.results = {}
+
+    def update_env(self):
+        for name_idx, value in self.name_values.items():
+            name = self.code.co_names[name_idx]
+            if is_constant(value) or isinstance(value, types.FunctionType):
+                self.env[name] = value
+            else:
+                self.env.pop(name, None)
+
+    def join(self, a, b):
+        return join(a, b)
+
+    # the constant value of the variable, or None
+    def local_value(self, local_idx):
+        value = self.local_values.get(local_idx, UNDEF)
+        return value if is_constant(value) else None
+
+    def name_value(self, name_idx):
+        value = self.name_values.get(name_idx, UNDEF)
+        return value if is_constant(value) else None
+
+    def push(self, value):
+        self.stack.append(value)
+        if is_constant(value):
+            self.results[self.cur_instr.offset] = value
+
+    def arithmetic(self):
+        rhs = self.stack.pop()
+        lhs = self.stack.pop()
+        if lhs is UNDEF or rhs is UNDEF:
+            self.push(UNDEF)
+        else:
+            self.push(
+                evaluate(lhs, ARITHMETIC_OPS[self.cur_instr.opname], rhs))
+
+    BINARY_ADD = BINARY_FLOOR_DIVIDE = BINARY_MODULO = BINARY_MULTIPLY = \
+        BINARY_SUBTRACT = INPLACE_ADD = INPLACE_FLOOR_DIVIDE = \
+        INPLACE_MODULO = INPLACE_MULTIPLY = INPLACE_SUBTRACT = arithmetic
+
+    # lists, dicts and built tuples are never constant, but the fallback for
+    # opcodes without a handler would leave one of the operands on the stack
+    def BINARY_SUBSCR(self):
+        del self.stack[-2:]
+        self.push(NAC)
+
+    def BUILD_LIST(self):
+        del self.stack[len(self.stack) - self.cur_instr.arg:]
+        self.push(NAC)
+
+    BUILD_TUPLE = BUILD_LIST
+
+    def BUILD_CONST_KEY_MAP(self):
+        del self.stack[-1 - self.cur_instr.arg:]
+        self.push(NAC)
+
+    def BUILD_MAP(self):
+        del self.stack[len(self.stack) - 2 * self.cur_instr.arg:]
+        self.push(NAC)
+
+    def CONTAINS_OP(self):
+        del self.stack[-2:]
+        self.push(NAC)
+
+    def DUP_TOP(self):
+        self.stack.append(self.stack[-1])
+
+    def DUP_TOP_TWO(self):
+        self.stack += self.stack[-2:]
+
+    def ROT_TWO(self):
+        self.stack[-2:] = [self.stack[-1], self.stack[-2]]
+
+    # [a, b, c] -> [c, a, b]
+    def ROT_THREE(self):
+        self.stack[-3:] = [self.stack[-1], self.stack[-3], self.stack[-2]]
+
+    # `a, b = 1, 2` unpacks a constant tuple into constants
+    def UNPACK_SEQUENCE(self):
+        items = self.stack.pop()
+        count = self.cur_instr.arg
+        if items is UNDEF:
+            self.stack += [UNDEF] * count
+        elif type(items) is tuple and len(items) == count:
+            self.stack += reversed(items)
+        else:
+            self.stack += [NAC] * count
+
+    def BINARY_TRUE_DIVIDE(self):
+        rhs = self.stack.pop()
+        lhs = self.stack.pop()
+        if lhs is UNDEF or rhs is UNDEF:
+            self.push(UNDEF)
+        elif is_constant(lhs):
+            self.push(evaluate(float(lhs), '/', rhs))
+        else:
+            self.push(NAC)
+
+    INPLACE_TRUE_DIVIDE = BINARY_TRUE_DIVIDE
+
+    def CALL_FUNCTION(self):
+        argc = self.cur_instr.arg
+        args = self.stack[len(self.stack) - argc:]
+        del self.stack[len(self.stack) - argc:]
+        func = self.stack.pop()
+        if isinstance(func, Decorator):
+            # none of the decorators change what the function computes
+            self.push(args[0] if argc == 1 and isinstance(
+                args[0], types.FunctionType) else func)
+        elif func is UNDEF or UNDEF in args:
+            self.push(UNDEF)
+        elif func in self.pure and all(is_constant(arg) for arg in args):
+            key = (func, tuple((type(arg), arg) for arg in args))
+            if key not in self.calls:
+                self.calls[key] = evaluate_call(func, args)
+            self.push(self.calls[key])
+        else:
+            self.push(NAC)
+
+    def CALL_FUNCTION_KW(self):
+        # only decorators are called with keyword arguments
+        del self.stack[-1 - self.cur_instr.arg:]
+        func = self.stack.pop()
+        self.push(func if isinstance(func, Decorator) or func is UNDEF else
+                  NAC)
+
+    # `module.function(...)`, with a NULL below the function
+    def CALL_METHOD(self):
+        self.CALL_FUNCTION()
+        del self.stack[-2]
+
+    def COMPARE_OP(self):
+        rhs = self.stack.pop()
+        lhs = self.stack.pop()
+        if lhs is UNDEF or rhs is UNDEF:
+            self.push(UNDEF)
+        else:
+            self.push(evaluate(lhs, dis.cmp_op[self.cur_instr.arg], rhs))
+
+    def DELETE_FAST(self):
+        self.store(self.local_values, self.cur_instr.arg, NAC)
+
+    def DELETE_NAME(self):
+        self.store(self.name_values, self.cur_instr.arg, NAC)
+
+    def IMPORT_FROM(self):
+        self.push(Decorator(f'{self.stack[-1].name}.{self.cur_instr.argval}'))
+
+    def IMPORT_NAME(self):
+        del self.stack[-2:]
+        self.push(Module(self.cur_instr.argval))
+
+    def LOAD_ATTR(self):
+        owner = self.stack.pop()
+        if isinstance(owner, Module):
+            self.push(Decorator(f'{owner.name}.{self.cur_instr.argval}'))
+        else:
+            self.push(UNDEF if owner is UNDEF else NAC)
+
+    def LOAD_BUILD_CLASS(self):
+        self.stack.append(BuildClass)
+
+    def LOAD_CONST(self):
+        self.push(self.code.co_consts[self.cur_instr.arg])
+
+    def LOAD_FAST(self):
+        self.push(self.local_values.get(self.cur_instr.arg, UNDEF))
+
+    def LOAD_GLOBAL(self):
+        name_idx = self.cur_instr.arg
+        if name_idx in self.stored_names:
+            self.push(self.name_values.get(name_idx, UNDEF))
+        else:
+            self.push(self.env.get(self.code.co_names[name_idx], NAC))
+
+    LOAD_NAME = LOAD_GLOBAL
+
+    def LOAD_METHOD(self):
+        self.LOAD_ATTR()
+        self.stack.insert(-1, NAC)
+
+    def MAKE_FUNCTION(self):
+        # code object, name and one value per flag
+        del self.stack[-2 - bin(self.cur_instr.arg).count('1'):]
+        if self.stack and self.stack[-1] is BuildClass:
+            # the class body, classes are not constants
+            self.stack.append(NAC)
+            return
+        offset = self.cur_instr.offset
+        func_sig = self.types.functions[offset].func_sig
+        if func_sig is None or is_generic(func_sig):
+            # run by python in mixed mode, or translated once per argument
+            # types, never evaluated
+            self.stack.append(NAC)
+            return
+        if offset not in self.functions:
+            code = self.code.co_consts[previous_instruction(
+                self.instructions, self.instr_idx, 2).arg]
+            func = types.FunctionType(code, self.env)
+            func.func_sig = func_sig
+            self.functions[offset] = func
+        self.stack.append(self.functions[offset])
+
+    def STORE_FAST(self):
+        local_idx = self.cur_instr.arg
+        self.store(
+            self.local_values, local_idx,
+            convert(self.stack.pop(), self.types.local_types.get(local_idx)))
+
+    def STORE_NAME(self):
+        name_idx = self.cur_instr.arg
+        self.store(
+            self.name_values, name_idx,
+            convert(self.stack.pop(), self.types.name_types.get(name_idx)))
+
+    STORE_GLOBAL = STORE_NAME
+
+
+ConstantPropagation.OPCODE_TABLE = opcode_table(ConstantPropagation)
@@ -0,0 +1,1010 @@
+import dis, inspect, re, typing
+from py2c import array
+from py2c.cfg import ControlFlowGraph
+from py2c.ir import FunctionPointer, Print, Range, Len, Module, Decorator, \
+    ListMethod, DictMethod, DictView, BuildClass, ClassType, InstanceType, \
+    BoundMethod, GenericFunction
+
+STR_TO_TYPE = {'int': int, 'float': float, 'str': str, 'bool': bool}
+# ordered from the narrowest to the widest type
+NUMERIC_TYPES = [bool, int, float]
+BUILTINS = {'print': Print, 'range': Range, 'len': Len}
+# element types lists can have, a bare list is one whose element type is not
+# known yet
+LIST_TYPES = [list[int], list[float]]
+# list methods that change the length of the list
+RESIZING_METHODS = {'append', 'clear', 'extend', 'insert', 'pop', 'remove'}
+# arrays are views of buffers of numbers owned by the caller, see
+# runtime/view.h
+ARRAY_TYPES = [array[int], array[float]]
+# key and value types dicts can have, a bare dict is one whose types are not
+# known yet
+DICT_TYPES = [dict[int, int], dict[int, float], dict[str, int]]
+# names of the parameter types in the names of the clones of generic
+# functions, such as f__long_double
+MANGLED_NAMES = {int: 'long', float: 'double', bool: 'bool', str: 'str'}
+# item types tuples can have, a bare tuple is one that only exists in
+# annotations or has items c cannot hold
+TUPLE_ITEM_TYPES = [int, float, str]
+
+
+def is_list(py_type):
+    return py_type is list or py_type in LIST_TYPES
+
+
+# the type of a list holding values of type py_type, or None if there is
+# no c equivalent
+def list_of(py_type):
+    list_type = list[int if py_type is bool else py_type]
+    return list_type if list_type in LIST_TYPES else None
+
+
+# the type of the elements of a list or an array
+def element_type(list_type):
+    return list_type.__args__[0] \
+        if list_type in LIST_TYPES + ARRAY_TYPES else None
+
+
+def is_array(py_type):
+    return py_type in ARRAY_TYPES
+
+
+def is_dict(py_type):
+    return py_type is dict or py_type in DICT_TYPES
+
+
+# the type of a dict from key_type to value_type, or None if there is no c
+# equivalent
+def dict_of(key_type, value_type):
+    dict_type = dict[int if key_type is bool else key_type,
+                     int if value_type is bool else value_type]
+    return dict_type if dict_type in DICT_TYPES else None
+
+
+def key_type(dict_type):
+    return dict_type.__args__[0] if dict_type in DICT_TYPES else None
+
+
+def value_type(dict_type):
+    return dict_type.__args__[1] if dict_type in DICT_TYPES else None
+
+
+def is_tuple(py_type):
+    return getattr(py_type, '__origin__', None) is tuple
+
+
+# the type of a tuple holding values of the item types, or None if there is
+# no c equivalent
+def tuple_of(item_types):
+    item_types = tuple(int if _type is bool else _type
+                       for _type in item_types)
+    if not item_types or any(_type not in TUPLE_ITEM_TYPES
+                             for _type in item_types):
+        return None
+    return tuple[item_types]
+
+
+def item_types(tuple_type):
+    return tuple_type.__args__ if is_tuple(tuple_type) else None
+
+
+# the type that can hold values of both types, widening numbers the way
+# python does, None means that nothing is known about a value
+def join(a, b):
+    if a is None or a == b:
+        return b if a is None else a
+    if b is None:
+        return a
+    if a in NUMERIC_TYPES and b in NUMERIC_TYPES:
+        return max(a, b, key=NUMERIC_TYPES.index)
+    if is_list(a) and is_list(b) and list in (a, b):
+        # the element type of a list never changes once it is known
+        return b if a is list else a
+    if is_dict(a) and is_dict(b) and dict in (a, b):
+        return b if a is dict else a
+    for x, y in ((a, b), (b, a)):
+        if is_array(x) and is_list(y) and element_type(y) in (
+                None, element_type(x)):
+            # the array views the memory of the list
+            return x
+    if isinstance(a, DictView) and isinstance(b, DictView) and \
+            (a.items, a.field) == (b.items, b.field):
+        # the types of the dict got known in a later pass
+        return DictView(a.items, join(a.dict_type, b.dict_type), a.field)
+    if is_tuple(a) and is_tuple(b) and len(a.__args__) == len(b.__args__):
+        # the items are widened one by one
+        tuple_type = tuple_of(
+            [join(x, y) for x, y in zip(a.__args__, b.__args__)])
+        if tuple_type is not None:
+            return tuple_type
+    raise TypeError(f'{a} and {b} have no common type')
+
+
+# whether a value of type from_ can be stored in a variable of type to
+def assignable(to, from_):
+    try:
+        return join(to, from_) == to
+    except TypeError:
+        return False
+
+
+# the instruction count instructions before instructions[index],
+# not counting EXTENDED_ARG prefixes
+def previous_instruction(instructions, index, count):
+    while count:
+        index -= 1
+        if instructions[index].opcode != dis.EXTENDED_ARG:
+            count -= 1
+    return instructions[index]
+
+
+# the union of the types, or the type itself if there is only one
+def union_of(types_):
+    return typing.Union[tuple(types_)]
+
+
+def is_union(py_type):
+    return typing.get_origin(py_type) is typing.Union
+
+
+# the index of the item of tuple_type that the BINARY_SUBSCR at
+# instructions[index] reads, or None if it is not a literal in range
+def tuple_index(instructions, index, tuple_type):
+    load = previous_instruction(instructions, index, 1)
+    if load.opname != 'LOAD_CONST' or type(load.argval) is not int:
+        return None
+    size = len(tuple_type.__args__)
+    if not -size <= load.argval < size:
+        return None
+    return load.argval % size
+
+
+# the type of the annotation ending count instructions before
+# instructions[index], such as int or list[float], or None if it is not
+# supported, and the number of instructions the annotation takes. classes
+# holds the classes the annotation may name, by name
+def annotation_type(instructions, index, count, classes=None):
+    last = previous_instruction(instructions, index, count)
+    if last.opname == 'BINARY_OR':
+        # int | float, the right operand comes last
+        rhs, rhs_size = annotation_type(instructions, index, count + 1,
+                                        classes)
+        lhs, lhs_size = annotation_type(instructions, index,
+                                        count + 1 + rhs_size, classes)
+        size = lhs_size + rhs_size + 1
+        if lhs is None or rhs is None or isinstance(lhs, InstanceType) or \
+                isinstance(rhs, InstanceType):
+            return None, size
+        return union_of([lhs, rhs]), size
+    if last.opname != 'BINARY_SUBSCR':
+        if last.opname == 'LOAD_CONST' and last.argval is None:
+            return type(None), 1
+        if classes and last.argval in classes:
+            return classes[last.argval].instance, 1
+        return STR_TO_TYPE.get(last.argval), 1
+    container, element = [
+        previous_instruction(instructions, index, count + offset)
+        for offset in (2, 1)
+    ]
+    if container.argval == 'list' and element.argval in STR_TO_TYPE:
+        return list_of(STR_TO_TYPE[element.argval]), 3
+    if container.argval == 'array' and element.argval in ('int', 'float'):
+        return array[STR_TO_TYPE[element.argval]], 3
+    if container.argval == 'tuple' and element.argval in STR_TO_TYPE:
+        return tuple_of([STR_TO_TYPE[element.argval]]), 3
+    if element.opname == 'BUILD_TUPLE':
+        # dict[key, value] or tuple[item, ...]
+        size = element.arg + 3
+        container = previous_instruction(instructions, index,
+                                         count + size - 1)
+        args = [
+            previous_instruction(instructions, index, count + offset).argval
+            for offset in range(size - 2, 1, -1)
+        ]
+        if any(arg not in STR_TO_TYPE for arg in args):
+            return None, size
+        args = [STR_TO_TYPE[arg] for arg in args]
+        if container.argval == 'dict' and len(args) == 2:
+            return dict_of(*args), size
+        if container.argval == 'tuple':
+            return tuple_of(args), size
+        if container.argval == 'Union':
+            return union_of(args), size
+        return None, size
+    return None, 3
+
+
+# the key of the function of the code object in a type profile, see
+# profiler.py
+def profile_key(code):
+    return f'{code.co_name}:{code.co_firstlineno}'
+
+
+# the signature the type profile recorded for the function made by the
+# MAKE_FUNCTION at instructions[index], or None if it has annotations or was
+# not profiled
+def profiled_signature(code, instructions, index, profile):
+    if not profile or instructions[index].arg & 0x04:
+        return None
+    func_code = code.co_consts[previous_instruction(instructions, index,
+                                                    2).arg]
+    entry = profile.get(profile_key(func_code))
+    if not entry or not entry['signature'] or \
+            len(entry['signature']) != func_code.co_argcount + 1:
+        return None
+    return list(entry['signature'])
+
+
+# look back from the MAKE_FUNCTION at instructions[index] to the annotations
+# of the function, or to its signature in the type profile if it has none,
+# returns [(type, param name), ..., (return type, 'return')]. The type is
+# None where there is no annotation, see is_generic
+def function_signature(code, instructions, index, classes=None,
+                       profile=None):
+    func_sig = profiled_signature(code, instructions, index, profile)
+    if func_sig is not None:
+        return func_sig
+    func_code = code.co_consts[previous_instruction(instructions, index,
+                                                    2).arg]
+    annotations = {}
+    if instructions[index].arg & 0x04:
+        param_names = code.co_consts[previous_instruction(
+            instructions, index, 4).arg]
+        count = 5
+        for name in reversed(param_names):
+            param_type, size = annotation_type(instructions, index, count,
+                                               classes)
+            if param_type is None:
+                raise TypeError(f'the annotation of {name} is not supported')
+            annotations[name] = param_type
+            count += size
+    params = func_code.co_varnames[:func_code.co_argcount]
+    return [(annotations.get(name), name)
+            for name in params] + [(annotations.get('return'), 'return')]
+
+
+# whether the function has parameters that are not annotated or annotated
+# with a union, or has no annotated result. It is then translated once for
+# each combination of argument types it is called with, see specialize
+def is_generic(func_sig):
+    return any(param[0] is None or is_union(param[0]) for param in func_sig)
+
+
+# whether values of the type are held in c variables of a type of their own,
+# unlike bare lists and dicts, whose item types are not known yet
+def has_c_type(py_type):
+    return py_type in NUMERIC_TYPES + [str] + LIST_TYPES + ARRAY_TYPES + \
+        DICT_TYPES or isinstance(py_type, InstanceType) or is_tuple(py_type)
+
+
+def mangled_name(py_type):
+    if py_type in MANGLED_NAMES:
+        return MANGLED_NAMES[py_type]
+    if isinstance(py_type, InstanceType):
+        return py_type.cls.name
+    return re.sub(r'\W+', '_', str(py_type)).strip('_')
+
+
+# the type of the parameter of a clone called with an argument of type
+# arg_type, given the annotation of the parameter
+def clone_param_type(generic, annotation, name, arg_type):
+    if annotation is not None and not is_union(annotation):
+        return annotation  # the argument is converted as for any function
+    if annotation is None:
+        members = [arg_type]
+    elif arg_type in annotation.__args__:
+        members = [arg_type]
+    else:
+        members = annotation.__args__
+    for member in members:
+        if has_c_type(member) and assignable(member, arg_type):
+            return member
+    raise TypeError(f'{generic.name}() cannot take {name} of type '
+                    f'{getattr(arg_type, "__name__", arg_type)}')
+
+
+# The clone of the generic function for arguments of types arg_types, which
+# is made the first time the function is called with them. A result that is
+# not annotated, or annotated with a union, gets the type the clone returns.
+# That is found by inferring the types of the clone until its result type
+# stops changing, as its recursive calls see the result type found so far.
+# global_types are the names the function sees
+def specialize(generic, arg_types, global_types):
+    if len(arg_types) != len(generic.func_sig) - 1:
+        raise TypeError(f'{generic.name} takes {len(generic.func_sig) - 1} '
+                        f'arguments but {len(arg_types)} were given')
+    param_types = tuple(
+        clone_param_type(generic, annotation, name, arg_type)
+        for (annotation, name), arg_type in zip(generic.func_sig, arg_types))
+    if param_types in generic.clones:
+        return generic.clones[param_types]
+
+    name = generic.name
+    if param_types:
+        name += '__' + '_'.join(mangled_name(_type) for _type in param_types)
+    ret_type = generic.func_sig[-1][0]
+    func_sig = [(_type, param[1])
+                for _type, param in zip(param_types, generic.func_sig)]
+    func_sig.append((None if is_union(ret_type) else ret_type, 'return'))
+    clone = FunctionPointer(name, func_sig, generic.code)
+    clone.decorators = generic.decorators
+    generic.clones[param_types] = clone
+    if func_sig[-1][0] is not None:
+        return clone
+    instructions = list(dis.get_instructions(generic.code))
+    cfg = ControlFlowGraph(instructions)
+    try:
+        while True:
+            result_type = TypeInference(generic.code, cfg, instructions,
+                                        func_sig, global_types).result_type
+            if result_type == func_sig[-1][0]:
+                break
+            func_sig[-1] = (result_type, 'return')
+        if result_type is None:
+            raise TypeError(f'the result type of {name} cannot be inferred')
+        if is_union(ret_type) and not any(
+                assignable(member, result_type)
+                for member in ret_type.__args__):
+            raise TypeError(f'{name} is annotated to return {ret_type} but '
+                            f'returns {result_type.__name__}')
+    except Exception:
+        # the arguments may not have their final types yet
+        del generic.clones[param_types]
+        raise
+    return clone
+
+
+# the names in the literal stored to __slots__ by the instruction at index,
+# or None if it is not a literal
+def slot_names(instructions, index):
+    value = previous_instruction(instructions, index, 1)
+    if value.opname == 'LOAD_CONST':
+        names = value.argval
+    elif value.opname == 'LIST_EXTEND':
+        # `['x', 'y']` extends an empty list with a tuple
+        names = previous_instruction(instructions, index, 2).argval
+    elif value.opname in ('BUILD_LIST', 'BUILD_TUPLE'):
+        names = tuple(
+            previous_instruction(instructions, index, value.arg - i + 1)
+            .argval for i in range(value.arg))
+    else:
+        return None
+    if isinstance(names, str):
+        names = (names, )
+    if not isinstance(names, tuple) or not all(
+            isinstance(name, str) for name in names):
+        return None
+    return names
+
+
+# the class made by the class body code, which may only declare annotated
+# __slots__ and define methods. The parameters of the methods other than
+# self have to be annotated, classes holds the classes they may name
+def define_class(code, classes):
+    instructions = list(dis.get_instructions(code))
+    cls = ClassType(code.co_name, code)
+    classes = dict(classes, **{cls.name: cls})
+    slots = None
+    annotations = {}
+    for i, instr in enumerate(instructions):
+        value = previous_instruction(instructions, i, 1) if i else None
+        if instr.opname == 'STORE_SUBSCR':
+            # `name: type` stores type into __annotations__[name]
+            annotations[value.argval] = annotation_type(
+                instructions, i, 3, classes)[0]
+        elif instr.opname != 'STORE_NAME' or instr.argval in (
+                '__module__', '__qualname__', '__doc__'):
+            continue
+        elif instr.argval == '__slots__':
+            slots = slot_names(instructions, i)
+            if slots is None:
+                raise TypeError(f'the __slots__ of class {cls.name} must be '
+                                'a tuple or list of names')
+        elif value.opname != 'MAKE_FUNCTION' or value.arg != 4:
+            raise TypeError(f'class {cls.name} can only declare __slots__ '
+                            f'and methods, {instr.argval} is neither')
+        else:
+            make_idx = instructions.index(value)
+            method_code = code.co_consts[previous_instruction(
+                instructions, make_idx, 2).arg]
+            func_sig = function_signature(code, instructions, make_idx,
+                                          classes)
+            if method_code.co_argcount and func_sig[0][0] is None:
+                func_sig[0] = (cls.instance, func_sig[0][1])  # self
+            if is_generic(func_sig):
+                raise TypeError(f'the parameters and the return of method '
+                                f'{cls.name}.{instr.argval} must be '
+                                'annotated')
+            cls.methods[instr.argval] = FunctionPointer(
+                f'{cls.name}_{instr.argval}', func_sig, method_code)
+    if slots is None:
+        raise TypeError(f'class {cls.name} must declare __slots__')
+    for name, _type in annotations.items():
+        if name not in slots:
+            raise TypeError(f'{cls.name}.{name} is annotated but not a slot')
+    for slot in slots:
+        if annotations.get(slot) is None:
+            raise TypeError(f'the annotation of {cls.name}.{slot} is not '
+                            'supported')
+        if is_array(annotations[slot]):
+            # the buffer is only borrowed for the duration of a call
+            raise TypeError(f'{cls.name}.{slot} cannot hold an array')
+        cls.fields[slot] = annotations[slot]
+    return cls
+
+
+# Forward dataflow analysis of the values on the bytecode value stack,
+# propagated along the edges of the control flow graph until nothing
+# changes. Subclasses define the abstract values, how two of them join, and
+# a handler per opcode that updates self.stack.
+class StackAnalysis:
+    UNDEFINED = None  # value of a variable before anything is stored to it
+    UNKNOWN = None  # result of opcodes without a handler
+
+    def __init__(self, code, cfg, instructions):
+        self.code = code
+        self.cfg = cfg
+        self.instructions = instructions
+        self.instr_indices = {
+            instr.offset: i for i, instr in enumerate(instructions)
+        }
+
+        # values on the stack when entering each block
+        self.entry_stacks = {cfg.entry: []}
+
+        self.stack = []
+        self.cur_instr = None
+        self.instr_idx = 0
+        self.changed = False
+
+    def join(self, a, b):
+        raise NotImplementedError
+
+    def solve(self):
+        self.changed = True
+        while self.changed:
+            self.changed = False
+            self.start_pass()
+            for block in self.cfg.reachable:
+                if block in self.entry_stacks:
+                    self.transfer(block)
+
+    # called before every pass over the blocks
+    def start_pass(self):
+        pass
+
+    def transfer(self, block):
+        self.stack = list(self.entry_stacks[block])
+        self.instr_idx = self.instr_indices[block.start]
+        for instr in block.instructions:
+            self.cur_instr = instr
+            before = list(self.stack)
+            handler = self.OPCODE_TABLE.get(instr.opcode)
+            if handler is None:
+                self.unknown()
+            else:
+                handler(self)
+            self.instr_idx += 1
+
+        last = block.last
+        for succ in block.succs:
+            if succ is block.fallthrough:
+                self.merge(succ, self.stack)
+            else:
+                # jumps only ever pop from the stack before the last
+                # instruction, which may keep a value the fallthrough pops
+                jump_depth = len(before) + dis.stack_effect(
+                    last.opcode, last.arg, jump=True)
+                self.merge(succ, before[:jump_depth])
+
+    def merge(self, block, stack):
+        old = self.entry_stacks.get(block)
+        new = list(stack) if old is None else [
+            self.join(a, b) for a, b in zip(old, stack)
+        ]
+        if new != old:
+            self.entry_stacks[block] = new
+            self.changed = True
+
+    def store(self, values, idx, value):
+        old = values.get(idx, self.UNDEFINED)
+        new = self.join(old, value)
+        if new is not old and new != old:
+            values[idx] = new
+            self.changed = True
+
+    # opcodes without a handler push values nothing is known about
+    def unknown(self):
+        effect = dis.stack_effect(self.cur_instr.opcode, self.cur_instr.arg,
+                                  jump=False)
+        if effect < 0:
+            del self.stack[effect:]
+        self.stack += [self.UNKNOWN] * max(effect, 0)
+
+
+# static dispatch table from opcode number to the handler of the class
+def opcode_table(cls):
+    return {
+        opcode: getattr(cls, name)
+        for name, opcode in dis.opmap.items() if hasattr(cls, name)
+    }
+
+
+# Infers the types on the value stack. A C variable has a single type, so
+# every local variable and name gets the join of all the values stored to it,
+# starting from its annotation if it has one.
+class TypeInference(StackAnalysis):
+    # handler of each opcode, filled in after the class
+    OPCODE_TABLE: typing.ClassVar[dict] = {}
+
+    def __init__(self, code, cfg, instructions, func_sig, global_types,
+                 mixed=False, profile=None):
+        super().__init__(code, cfg, instructions)
+        self.global_types = global_types
+        # in mixed mode, functions without a supported signature are left to
+        # python instead of failing the translation
+        self.mixed = mixed
+        # the types recorded by profiler.py, by profile_key
+        self.profile = profile
+
+        # inferred types by index into co_varnames and co_names
+        self.local_types = {}
+        self.name_types = {}
+        # parameters keep their annotated types
+        self.num_params = max(len(func_sig) - 1, 0)
+        for i in range(self.num_params):
+            self.local_types[i] = func_sig[i][0]
+        # and the other locals start from the types they had when profiled
+        entry = profile.get(profile_key(code)) if profile else None
+        if entry:
+            for i in range(self.num_params, len(code.co_varnames)):
+                if code.co_varnames[i] in entry['locals']:
+                    self.local_types[i] = entry['locals'][code.co_varnames[i]]
+
+        # one function pointer per MAKE_FUNCTION, and one class per class
+        # statement, so that passes agree
+        self.functions = {}
+        self.classes = {}
+
+        # whether the code stores into arrays, and the functions it passes
+        # arrays to
+        self.stores_arrays = False
+        self.array_callees = []
+
+        # the join of the types the code returns
+        self.result_type = None
+
+        self.solve()
+
+    def join(self, a, b):
+        return join(a, b)
+
+    # the types of the names the functions called from here see
+    def visible_types(self):
+        return dict(
+            self.global_types, **{
+                self.code.co_names[name_idx]: _type
+                for name_idx, _type in self.name_types.items()
+            })
+
+    # the classes annotations can name, by name
+    def known_classes(self):
+        classes = {
+            name: _type
+            for name, _type in self.global_types.items()
+            if isinstance(_type, ClassType)
+        }
+        for types_, names in ((self.name_types, self.code.co_names),
+                              (self.local_types, self.code.co_varnames)):
+            for idx, _type in types_.items():
+                if isinstance(_type, ClassType):
+                    classes[names[idx]] = _type
+        return classes
+
+    def store(self, types_, idx, value, name, fixed=False):
+        old = types_.get(idx)
+        try:
+            new = join(old, value)
+        except TypeError:
+            raise TypeError(
+                f'variable {name} must have unchanging type') from None
+        if new == old:
+            return
+        if fixed:
+            raise TypeError(f'parameter {name} is annotated as '
+                            f'{old.__name__} but assigned a {value.__name__}')
+        types_[idx] = new
+        self.changed = True
+
+    # give the variable loaded by source, which holds an empty list or dict,
+    # its element types
+    def refine(self, source, container_type):
+        if container_type is None:
+            return
+        if source.opname == 'LOAD_FAST':
+            self.store(self.local_types, source.arg, container_type,
+                       source.argval)
+        elif source.opname == 'LOAD_NAME':
+            self.store(self.name_types, source.arg, container_type,
+                       source.argval)
+
+    def load_name(self, name_idx):
+        if name_idx in self.name_types:
+            return self.name_types[name_idx]
+        name = self.code.co_names[name_idx]
+        if name in self.global_types:
+            return self.global_types[name]
+        return BUILTINS.get(name)
+
+    def arithmetic(self):
+        rhs = self.stack.pop()
+        lhs = self.stack.pop()
+        if lhs in NUMERIC_TYPES and rhs in NUMERIC_TYPES:
+            self.stack.append(float if float in (lhs, rhs) else int)
+        elif self.cur_instr.opname == 'BINARY_MULTIPLY' and \
+                {is_list(lhs), is_list(rhs)} == {True, False}:
+            # [0] * n
+            self.stack.append(lhs if is_list(lhs) else rhs)
+        else:
+            self.stack.append(None)
+
+    BINARY_ADD = BINARY_FLOOR_DIVIDE = BINARY_MODULO = BINARY_MULTIPLY = \
+        BINARY_SUBTRACT = INPLACE_ADD = INPLACE_FLOOR_DIVIDE = \
+        INPLACE_MODULO = INPLACE_MULTIPLY = INPLACE_SUBTRACT = arithmetic
+
+    def BINARY_SUBSCR(self):
+        del self.stack[-1]
+        container = self.stack.pop()
+        if is_tuple(container):
+            index = tuple_index(self.instructions, self.instr_idx, container)
+            self.stack.append(None if index is None else
+                              container.__args__[index])
+            return
+        self.stack.append(value_type(container) if is_dict(container) else
+                          element_type(container))
+
+    def BINARY_TRUE_DIVIDE(self):
+        del self.stack[-2:]
+        self.stack.append(float)
+
+    INPLACE_TRUE_DIVIDE = BINARY_TRUE_DIVIDE
+
+    def BUILD_LIST(self):
+        count = self.cur_instr.arg
+        item_type = None
+        for value in self.stack[len(self.stack) - count:]:
+            item_type = join(item_type, value)
+        del self.stack[len(self.stack) - count:]
+        self.stack.append(list_of(item_type) if count else list)
+
+    # `{key: value, ...}` with constant keys, also builds annotations
+    def BUILD_CONST_KEY_MAP(self):
+        count = self.cur_instr.arg
+        keys = self.code.co_consts[previous_instruction(
+            self.instructions, self.instr_idx, 1).arg]
+        key_type = value_type = None
+        try:
+            for key, value in zip(keys, self.stack[-1 - count:-1]):
+                key_type = join(key_type, type(key))
+                value_type = join(value_type, value)
+        except TypeError:
+            key_type = None
+        del self.stack[-1 - count:]
+        self.stack.append(dict_of(key_type, value_type))
+
+    # `{key: value, ...}`, with the keys and values interleaved
+    def BUILD_MAP(self):
+        count = self.cur_instr.arg
+        key_type = value_type = None
+        items = self.stack[len(self.stack) - 2 * count:]
+        for key, value in zip(items[::2], items[1::2]):
+            key_type = join(key_type, key)
+            value_type = join(value_type, value)
+        del self.stack[len(self.stack) - 2 * count:]
+        self.stack.append(dict_of(key_type, value_type) if count else dict)
+
+    def BUILD_TUPLE(self):
+        items = self.stack[len(self.stack) - self.cur_instr.arg:]
+        del self.stack[len(self.stack) - self.cur_instr.arg:]
+        self.stack.append(tuple_of(items) or tuple)
+
+    def CALL_FUNCTION(self):
+        argc = self.cur_instr.arg
+        args = self.stack[len(self.stack) - argc:]
+        del self.stack[len(self.stack) - argc:]
+        func = self.stack.pop()
+        if isinstance(func, GenericFunction):
+            try:
+                func = specialize(func, args, self.visible_types())
+            except TypeError:
+                # raised again when translating, if the arguments have their
+                # final types by then
+                self.stack.append(None)
+                return
+        callee = func.func if isinstance(func, BoundMethod) else func
+        if isinstance(callee, FunctionPointer) and \
+                any(is_array(arg) for arg in args) and \
+                callee not in self.array_callees:
+            self.array_callees.append(callee)
+        if isinstance(func, Decorator):
+            # applying the decorator returns the function, calling it with
+            # arguments returns the decorator to apply
+            self.stack.append(args[0] if argc == 1 and isinstance(
+                args[0], (FunctionPointer, GenericFunction)) else func)
+        elif isinstance(func, FunctionPointer):
+            if func.func_sig is None:
+                raise TypeError(f'{func.name} is run by python, so it cannot '
+                                'be called from translated code')
+            self.stack.append(func.func_sig[-1][0])
+        elif isinstance(func, BoundMethod) and func.func is not None:
+            self.stack.append(func.func.func_sig[-1][0])
+        elif func is BuildClass:
+            self.stack.append(self.build_class(argc))
+        elif isinstance(func, ClassType):
+            self.stack.append(func.instance)
+        elif func is Range:
+            self.stack.append(Range)
+        elif func is Len:
+            self.stack.append(int)
+        else:
+            self.stack.append(None)
+
+    # the class made by the `class` statement calling LOAD_BUILD_CLASS
+    def build_class(self, argc):
+        offset = self.cur_instr.offset
+        if offset not in self.classes:
+            if argc != 2:
+                raise TypeError('classes with base classes are not supported')
+            code = self.code.co_consts[previous_instruction(
+                self.instructions, self.instr_idx, 4).arg]
+            self.classes[offset] = define_class(code, self.known_classes())
+        return self.classes[offset]
+
+    def CALL_FUNCTION_KW(self):
+        # the arguments and the tuple of their names
+        del self.stack[-1 - self.cur_instr.arg:]
+        func = self.stack.pop()
+        self.stack.append(func if isinstance(func, Decorator) else None)
+
+    # `module.function(...)` or `items.method(...)`, with a NULL below
+    def CALL_METHOD(self):
+        method = self.stack[-1 - self.cur_instr.arg]
+        if isinstance(method, DictMethod):
+            args = self.stack[len(self.stack) - self.cur_instr.arg:]
+            del self.stack[-2 - self.cur_instr.arg:]
+            if method.name in ('keys', 'values'):
+                self.stack.append(
+                    DictView(method.items, method.dict_type,
+                             method.name[:-1]))
+            elif method.name == 'get' and len(args) == 2:
+                # the default decides the value type of an empty dict
+                self.stack.append(value_type(method.dict_type) or args[1])
+            else:
+                self.stack.append(None)
+            return
+        if not isinstance(method, ListMethod):
+            self.CALL_FUNCTION()
+            del self.stack[-2]
+            return
+        args = self.stack[len(self.stack) - self.cur_instr.arg:]
+        del self.stack[-2 - self.cur_instr.arg:]
+        if method.name == 'append' and method.list_type is list and \
+                args[0] in NUMERIC_TYPES:
+            # the first append to an empty list decides its element type
+            self.refine(method.items, list_of(args[0]))
+        self.stack.append(element_type(method.list_type)
+                          if method.name == 'pop' else None)
+
+    def COMPARE_OP(self):
+        del self.stack[-2:]
+        self.stack.append(bool)
+
+    CONTAINS_OP = COMPARE_OP
+
+    def DUP_TOP(self):
+        self.stack.append(self.stack[-1])
+
+    def DUP_TOP_TWO(self):
+        self.stack += self.stack[-2:]
+
+    def FOR_ITER(self):
+        iterable = self.stack[-1]
+        if is_list(iterable) or is_array(iterable):
+            self.stack.append(element_type(iterable))
+        elif is_dict(iterable):
+            self.stack.append(key_type(iterable))
+        elif isinstance(iterable, DictView):
+            self.stack.append(
+                key_type(iterable.dict_type) if iterable.field == 'key' else
+                value_type(iterable.dict_type))
+        else:
+            self.stack.append(int)
+
+    def GET_ITER(self):
+        pass
+
+    def IMPORT_FROM(self):
+        self.stack.append(
+            Decorator(f'{self.stack[-1].name}.{self.cur_instr.argval}'))
+
+    def IMPORT_NAME(self):
+        del self.stack[-2:]
+        self.stack.append(Module(self.cur_instr.argval))
+
+    def LOAD_ATTR(self):
+        owner = self.stack.pop()
+        if isinstance(owner, InstanceType):
+            self.stack.append(owner.cls.fields.get(self.cur_instr.argval))
+            return
+        self.stack.append(
+            Decorator(f'{owner.name}.{self.cur_instr.argval}') if isinstance(
+                owner, Module) else None)
+
+    def LOAD_BUILD_CLASS(self):
+        self.stack.append(BuildClass)
+
+    def LOAD_CONST(self):
+        const = self.code.co_consts[self.cur_instr.arg]
+        if type(const) is tuple:
+            self.stack.append(
+                tuple_of([type(item) for item in const]) or tuple)
+        else:
+            self.stack.append(type(const))
+
+    def LOAD_FAST(self):
+        self.stack.append(self.local_types.get(self.cur_instr.arg))
+
+    def LOAD_GLOBAL(self):
+        self.stack.append(self.load_name(self.cur_instr.arg))
+
+    LOAD_NAME = LOAD_GLOBAL
+
+    def LIST_EXTEND(self):
+        # `[1, 2, 3]` is an empty list extended with a constant tuple
+        items = self.code.co_consts[previous_instruction(
+            self.instructions, self.instr_idx, 1).arg]
+        del self.stack[-1]
+        list_idx = len(self.stack) - self.cur_instr.arg
+        item_type = None
+        for item in items:
+            item_type = join(item_type, type(item))
+        self.stack[list_idx] = join(self.stack[list_idx], list_of(item_type))
+
+    def LOAD_METHOD(self):
+        source = previous_instruction(self.instructions, self.instr_idx, 1)
+        if is_list(self.stack[-1]):
+            self.stack.append(
+                ListMethod(self.cur_instr.argval, source, self.stack.pop()))
+        elif is_dict(self.stack[-1]):
+            self.stack.append(
+                DictMethod(self.cur_instr.argval, source, self.stack.pop()))
+        elif isinstance(self.stack[-1], InstanceType):
+            self.stack.append(
+                BoundMethod(
+                    self.stack.pop().cls.methods.get(self.cur_instr.argval),
+                    source))
+        else:
+            self.LOAD_ATTR()
+        self.stack.insert(-1, None)
+
+    def MAKE_FUNCTION(self):
+        # code object, name and one value per flag
+        del self.stack[-2 - bin(self.cur_instr.arg).count('1'):]
+        if self.stack and self.stack[-1] is BuildClass:
+            # the class body, which build_class looks at
+            self.stack.append(None)
+            return
+        offset = self.cur_instr.offset
+        if offset not in self.functions:
+            name = self.code.co_consts[previous_instruction(
+                self.instructions, self.instr_idx, 1).arg]
+            code = self.code.co_consts[previous_instruction(
+                self.instructions, self.instr_idx, 2).arg]
+            try:
+                func_sig = function_signature(self.code, self.instructions,
+                                              self.instr_idx,
+                                              self.known_classes(),
+                                              self.profile)
+            except Exception:
+                if not self.mixed:
+                    raise
+                func_sig = None  # run by python
+            if func_sig is not None and is_generic(func_sig):
+                if self.mixed:
+                    func_sig = None
+                else:
+                    self.functions[offset] = GenericFunction(
+                        name, func_sig, code)
+            if offset not in self.functions:
+                self.functions[offset] = FunctionPointer(name, func_sig, code)
+        self.stack.append(self.functions[offset])
+
+    def RETURN_VALUE(self):
+        try:
+            self.result_type = join(self.result_type, self.stack.pop())
+        except TypeError:
+            raise TypeError(f'{self.code.co_name} must return values of one '
+                            'type') from None
+
+    def ROT_TWO(self):
+        self.stack[-2:] = [self.stack[-1], self.stack[-2]]
+
+    # [a, b, c] -> [c, a, b]
+    def ROT_THREE(self):
+        self.stack[-3:] = [self.stack[-1], self.stack[-3], self.stack[-2]]
+
+    def STORE_FAST(self):
+        local_idx = self.cur_instr.arg
+        self.store(self.local_types, local_idx, self.stack.pop(),
+                   self.code.co_varnames[local_idx],
+                   fixed=local_idx < self.num_params)
+
+    def STORE_NAME(self):
+        name_idx = self.cur_instr.arg
+        self.store(self.name_types, name_idx, self.stack.pop(),
+                   self.code.co_names[name_idx])
+
+    # `global name` in a function, the name keeps its module level type.
+    # The module level code stores the names some function declares global
+    # with STORE_GLOBAL as well
+    def STORE_GLOBAL(self):
+        if not self.code.co_flags & inspect.CO_NEWLOCALS:
+            self.STORE_NAME()
+            return
+        name = self.code.co_names[self.cur_instr.arg]
+        value = self.stack.pop()
+        global_type = self.global_types.get(name)
+        if global_type is None:
+            raise TypeError(f'global {name} must be assigned at module level')
+        if value is not None and not assignable(global_type, value):
+            raise TypeError(f'variable {name} must have unchanging type')
+
+    # `a, b = items` pushes the items in reverse, so that a is stored first
+    def UNPACK_SEQUENCE(self):
+        items = item_types(self.stack.pop())
+        count = self.cur_instr.arg
+        if items is None or len(items) != count:
+            items = [None] * count
+        self.stack += reversed(items)
+
+    def STORE_SUBSCR(self):
+        value, owner, subscript = self.stack[-3:]
+        del self.stack[-3:]
+        if is_array(owner):
+            self.stores_arrays = True
+        key, container = [
+            previous_instruction(self.instructions, self.instr_idx, count)
+            for count in (1, 2)
+        ]
+        if owner is dict:
+            # the first item stored to an empty dict decides its types
+            self.refine(container, dict_of(subscript, value))
+        # `name: type = value` stores type into __annotations__[name]
+        elif key.opname == 'LOAD_CONST' and \
+                key.argval in self.code.co_names and \
+                container.argval == '__annotations__':
+            annotation, size = annotation_type(self.instructions,
+                                               self.instr_idx, 3)
+            if annotation is not None:
+                self.store(self.name_types,
+                           self.code.co_names.index(key.argval), annotation,
+                           key.argval)
+
+
+TypeInference.OPCODE_TABLE = opcode_table(TypeInference)
+
+
+# whether the function stores into the arrays passed to it, or passes them
+# to a function that does, so that extension modules only ask for writable
+# buffers when they have to
+def writes_arrays(fp, global_types, seen=None):
+    seen = set() if seen is None else seen
+    if fp.code in seen:
+        return False
+    seen.add(fp.code)
+    instructions = list(dis.get_instructions(fp.code))
+    types_ = TypeInference(fp.code, ControlFlowGraph(instructions),
+                           instructions, fp.func_sig, global_types)
+    return types_.stores_arrays or any(
+        writes_arrays(callee, global_types, seen)
+        for callee in types_.array_callees)
@@ -1,18 +1,284 @@
+import codecs, re, tempfile
+
+# statements of a function are kept in memory up to this many bytes,
+# larger function bodies are spilled to a temporary file
+SPOOL_SIZE = 1 << 20
+# bytes copied from a buffer at once
+COPY_SIZE = 1 << 16
+# c string literals, whose contents are not names
+C_STRING = re.compile(r'"(?:\\.|[^"\\])*"')
+
+
 class Variable:
+    pure = True
+    # variables that constants were propagated into are never used
+    declared = True
+
     def __init__(self, name, _type=None):
         self.name = name
         self.type = _type
         self.py_type = ''
 
     def __str__(self):
-        return f'{self.type} {self.name};\n' if self.type else ''
+        if not self.type or not self.declared:
+            return ''
+        return f'{self.type} {self.name};\n'
+
+
+# a literal, named by its c spelling. Integers are long literals, so that
+# they have the type printf's %ld expects when passed to it directly
+class Constant(Variable):
+    def __init__(self, value, _type=None):
+        if isinstance(value, str):
+            name = c_string(value)
+        elif isinstance(value, int):
+            name = f'{int(value)}L'
+        else:
+            name = repr(value)
+        super().__init__(name, _type)
+        self.value = value
+
+
+# the c string literal of a python string, encoded as utf-8
+def c_string(value):
+    chars = []
+    for byte in value.encode():
+        char = chr(byte)
+        if char in '"\\':
+            chars.append('\\' + char)
+        elif 32 <= byte < 127:
+            chars.append(char)
+        else:
+            chars.append(f'\\{byte:03o}')
+    return f'"{"".join(chars)}"'
+
+
+# temporaries standing in for a slot of the bytecode value stack
+class StackVariable(Variable):
+    def __init__(self, name, _type, index):
+        super().__init__(name, _type)
+        self.index = index
 
 
 # these have a different __str__ method so they are separate from Variable
 class FunctionPointer:
-    def __init__(self, name, func_sig):
+    def __init__(self, name, func_sig, code=None):
+        self.name = name
+        self.func_sig = func_sig
+        self.code = code
+        # the decorators applied to the function, by qualified name
+        self.decorators = {}
+        # in mixed mode, the code object python runs when the function could
+        # not be translated
+        self.python_code = None
+        # whether the signature is the one a type profile recorded, rather
+        # than annotated
+        self.profiled = False
+
+
+# A function with parameters that are not annotated or annotated with a
+# union, or without an annotated result. Each call is to the clone of it for
+# the types of the arguments, see inference.specialize
+class GenericFunction:
+    def __init__(self, name, func_sig, code):
         self.name = name
+        # the annotations, with None where there is none
         self.func_sig = func_sig
+        self.code = code
+        self.decorators = {}
+        # the FunctionPointer of each clone, by its parameter types
+        self.clones = {}
+
+
+# decorators py2c understands, by qualified name
+DECORATORS = {
+    'py2c.noinline', 'py2c.jit', 'functools.lru_cache', 'functools.cache'
+}
+# names that are only used in annotations
+ANNOTATIONS = {'py2c.array', 'typing.Union'}
+
+
+# a module imported with `import module` or `from module import name`
+class Module:
+    def __init__(self, name):
+        self.name = name
+
+    def __eq__(self, other):
+        return isinstance(other, Module) and other.name == self.name
+
+    def __hash__(self):
+        return hash(self.name)
+
+
+# a decorator imported from a module, it is applied when the function is made
+class Decorator:
+    def __init__(self, name, args=(), keywords=None):
+        self.name = name
+        # the constant arguments of `@decorator(...)`
+        self.args = args
+        self.keywords = keywords or {}
+
+    def __eq__(self, other):
+        return isinstance(other, Decorator) and other.name == self.name
+
+    def __hash__(self):
+        return hash(self.name)
+
+
+# pushed by LOAD_BUILD_CLASS, calling it with the class body makes the class
+class BuildClass:
+    pass
+
+
+# a class with __slots__, compiled to a struct with a field per slot and a
+# c function per method. Instances are pointers to the struct
+class ClassType:
+    def __init__(self, name, code):
+        self.name = name
+        self.code = code  # of the class body
+        self.fields = {}  # slot name -> python type, in struct order
+        self.methods = {}  # method name -> FunctionPointer
+        self.instance = InstanceType(self)
+
+
+# the type of the instances of a class
+class InstanceType:
+    def __init__(self, cls):
+        self.cls = cls
+
+    # describes the class for the fingerprints of the functions using it,
+    # other classes are only named so that linked classes terminate
+    def __repr__(self):
+        def name(py_type):
+            return py_type.cls.name if isinstance(py_type, InstanceType) \
+                else repr(py_type)
+
+        fields = ', '.join(f'{field}: {name(_type)}'
+                           for field, _type in self.cls.fields.items())
+        methods = ', '.join(
+            f'{method}({", ".join(name(param[0]) for param in fp.func_sig)})'
+            for method, fp in self.cls.methods.items())
+        return f'{self.cls.name}({fields}; {methods})'
+
+
+# a method looked up on an instance, called directly since classes have no
+# subclasses to override it
+class BoundMethod:
+    def __init__(self, func, receiver):
+        self.func = func  # FunctionPointer of the method
+        self.receiver = receiver
+
+    def __eq__(self, other):
+        return isinstance(other, BoundMethod) and (
+            other.func, other.receiver) == (self.func, self.receiver)
+
+
+# Statements are rendered as soon as they are appended, since the variable
+# declarations that have to precede them are only known at the end. Those
+# rendered_late can still change until the whole function is translated,
+# so they are kept along with their position and rendered when the buffer
+# is written. With names, the buffer collects the words of the statements,
+# see FunctionTranslator.localize
+class StatementBuffer:
+    def __init__(self, names=False):
+        self.file = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        # [position, statement] of the statements rendered late
+        self.holes = []
+        # the names of the variables the statements assign
+        self.assigned = set()
+        self.names = set() if names else None
+
+    @property
+    def size(self):
+        return self.file.tell()  # always at the end but while writing
+
+    def append(self, statement):
+        if isinstance(statement, (FunctionPointer, GenericFunction)) or \
+                statement == '':
+            return
+        self.assigned.update(assigned_names(statement))
+        if self.names is not None:
+            self.names.update(statement_names(statement))
+        if isinstance(statement, BlockStatements):
+            statement.buffer.copy(self, statement.start, statement.end,
+                                  statement.holes)
+        elif isinstance(statement, StatementBuffer):
+            # an inlined function, which is translated already
+            for chunk in statement.chunks():
+                self.file.write(chunk)
+        elif getattr(statement, 'rendered_late', False):
+            self.holes.append([self.size, statement])
+        else:
+            self.file.write(str(statement).encode())
+
+    # the statements of an inlined function are one statement of the caller
+    @property
+    def assigns(self):
+        return self.assigned
+
+    # copy the statements from start to end, and the holes among them, to
+    # the end of the buffer out
+    def copy(self, out, start, end, holes):
+        offset = out.size - start
+        for hole in self.holes[holes.start:holes.stop]:
+            out.holes.append([hole[0] + offset, hole[1]])
+        self.file.seek(start)
+        while start < end:
+            chunk = self.file.read(min(end - start, COPY_SIZE))
+            out.file.write(chunk)
+            start += len(chunk)
+        self.file.seek(0, 2)
+
+    # the rendered statements, as utf-8 encoded chunks
+    def chunks(self):
+        end = self.size
+        self.file.seek(0)
+        position = 0
+        for hole_position, statement in self.holes + [[end, '']]:
+            while position < hole_position:
+                chunk = self.file.read(min(hole_position - position,
+                                           COPY_SIZE))
+                position += len(chunk)
+                yield chunk
+            yield str(statement).encode()
+        self.file.seek(0, 2)
+
+    def write(self, out):
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        for chunk in self.chunks():
+            out.write(decoder.decode(chunk))
+
+    def close(self):
+        self.file.close()
+
+
+# The statements of a basic block, which are appended to the buffer of the
+# function as the block is translated, and emitted in one piece by
+# cfg.Structurer. They record what their statements assign, whether one
+# leaves the loops around it, and with names the words of the statements
+class BlockStatements:
+    def __init__(self, buffer, names=False):
+        self.buffer = buffer
+        self.start = self.end = buffer.size
+        self.holes = range(len(buffer.holes), len(buffer.holes))
+        self.count = 0
+        self.assigns = set()
+        self.leaves = False
+        self.names = set() if names else None
+
+    def append(self, statement):
+        assert self.end == self.buffer.size, 'another block was translated'
+        self.count += 1
+        self.assigns.update(assigned_names(statement))
+        self.leaves = self.leaves or leaves_loops(statement)
+        if self.names is not None:
+            self.names.update(statement_names(statement))
+        self.buffer.append(statement)
+        self.end = self.buffer.size
+        self.holes = range(self.holes.start, len(self.buffer.holes))
+
+    def __bool__(self):
+        return self.count > 0
 
 
 class FunctionBlock:
@@ -20,19 +286,46 @@ class FunctionBlock:
         self.stack_vars = []
         self.local_vars = []
         self.fast_local_vars = []
-        self.statements = []
+        self.statements = StatementBuffer()
 
     def keep_good(self, val):
-        return not isinstance(val, FunctionPointer)
+        return isinstance(val, Variable)
 
-    def __str__(self):
-        output = ''
-        output += ''.join(map(str, filter(self.keep_good, self.stack_vars)))
-        output += ''.join(map(str, filter(self.keep_good, self.local_vars)))
-        output += ''.join(
-            map(str, filter(self.keep_good, self.fast_local_vars)))
-        output += ''.join(map(str, filter(self.keep_good, self.statements)))
-        return output
+    # the c types of the variables that are declared
+    def c_types(self):
+        return [
+            variable.type
+            for variables in (self.stack_vars, self.local_vars,
+                              self.fast_local_vars)
+            for variable in filter(self.keep_good, variables)
+            if variable.type and variable.declared
+        ]
+
+    def write(self, out):
+        for variables in (self.stack_vars, self.local_vars,
+                          self.fast_local_vars):
+            for variable in filter(self.keep_good, variables):
+                out.write(str(variable))
+        self.statements.write(out)
+
+
+# the names of the variables the statement assigns, and whether it leaves
+# the loops around it other than by continue, see ParallelLoop
+def assigned_names(statement):
+    return getattr(statement, 'assigns', ())
+
+
+def leaves_loops(statement):
+    return getattr(statement, 'leaves', False)
+
+
+# the words of the statement outside of c strings, which include the names
+# of the variables it uses
+def statement_names(statement):
+    names = getattr(statement, 'names', None)
+    if names is None:
+        names = re.findall(r'\w+', C_STRING.sub('""', str(statement)))
+    return names
 
 
 class Assignment:
@@ -40,12 +333,114 @@ class Assignment:
         self.lhs = lhs
         self.rhs = rhs
 
+    @property
+    def assigns(self):
+        return (self.lhs.name, ) if isinstance(self.lhs, Variable) else ()
+
     def __str__(self):
         if isinstance(self.rhs, Variable):
             return f'{self.lhs.name} = {self.rhs.name};\n'
         return f'{self.lhs.name} = {self.rhs};\n'
 
 
+# block terminators, the targets are replaced by the blocks they jump to
+# before the control flow is structured
+class Branch:
+    def __init__(self, cond, target):
+        self.cond = cond  # jump to target if cond is true
+        self.target = target
+        self.fallthrough = None
+
+
+class Jump:
+    def __init__(self, target):
+        self.target = target
+
+
+# only rendered if some goto refers to it
+class Label:
+    def __init__(self, name):
+        self.name = name
+        self.used = False
+
+    def __str__(self):
+        return f'{self.name}:;\n' if self.used else ''
+
+
+class Return:
+    leaves = True
+    # tail calls are only found once every return is
+    rendered_late = True
+
+    def __init__(self, value):
+        self.value = value  # None in functions returning None
+
+    def __str__(self):
+        if self.value is None:
+            return 'return;\n'
+        return f'return {self.value.name};\n'
+
+
+# a return of a call to the function itself, rewritten to assign the
+# arguments to the parameters and jump back to the start of the function,
+# after folding the rest of the returned value into the accumulator
+class TailCall:
+    leaves = True
+    rendered_late = True
+
+    def __init__(self, params, args, start, accumulate=None):
+        self.params = params
+        self.args = args
+        self.start = start
+        self.accumulate = accumulate  # Assignment to the accumulator or None
+
+    def __str__(self):
+        changed = [(param, arg) for param, arg in zip(self.params, self.args)
+                   if param.name != arg.name]
+        output = '{\n'
+        if len(changed) > 1:
+            # every argument is computed from the old parameters
+            for i, (param, arg) in enumerate(changed):
+                output += f'{param.type} tail{i} = {arg.name};\n'
+            changed = [(param, Variable(f'tail{i}'))
+                       for i, (param, arg) in enumerate(changed)]
+        if self.accumulate is not None:
+            output += str(self.accumulate)
+        for param, arg in changed:
+            output += f'{param.name} = {arg.name};\n'
+        return output + f'goto {self.start.name};\n}}\n'
+
+
+# return from a function that was inlined into its caller, by storing the
+# value to result and jumping to the end of the inlined body
+class InlineReturn:
+    # the last one does not jump
+    rendered_late = True
+
+    def __init__(self, value, result, end):
+        self.value = value
+        self.result = result
+        self.end = end
+        # the return at the very end of the body does not need to jump
+        self.jump = True
+
+    @property
+    def assigns(self):
+        return () if self.value is None else (self.result.name, )
+
+    @property
+    def leaves(self):
+        return self.jump
+
+    def __str__(self):
+        output = ''
+        if self.value is not None:
+            output += f'{self.result.name} = {self.value.name};\n'
+        if self.jump:
+            output += f'goto {self.end.name};\n'
+        return output
+
+
 class IfStatement:
     def __init__(self, cond, body):
         self.cond = cond
@@ -55,25 +450,245 @@ class IfStatement:
         return f'if({self.cond}){{\n{self.body}\n}}\n'
 
 
+class BinaryOperation:
+    def __init__(self, lhs, op, rhs, _type=None):
+        self.lhs = lhs
+        self.op = op
+        self.rhs = rhs
+        self.type = _type
+
+    @property
+    def pure(self):
+        return self.lhs.pure and self.rhs.pure
+
+    @property
+    def name(self):
+        return f'({self.lhs.name} {self.op} {self.rhs.name})'
+
+    def __str__(self):
+        return self.name
+
+
+class UnaryOperation:
+    def __init__(self, op, operand, _type=None):
+        self.op = op
+        self.operand = operand
+        self.type = _type
+
+    @property
+    def pure(self):
+        return self.operand.pure
+
+    @property
+    def name(self):
+        return f'{self.op}{self.operand.name}'
+
+    def __str__(self):
+        return self.name
+
+
+# logical negation that cancels out double negations
+def negate(cond):
+    if isinstance(cond, UnaryOperation) and cond.op == '!':
+        return cond.operand
+    return UnaryOperation('!', cond, 'long')
+
+
 class FunctionCall:
-    def __init__(self, name, args):
-        self.name = name
+    # pure calls only read memory, so they can be moved like other
+    # expressions as long as they stay before the next statement
+    def __init__(self, func_name, args, _type=None, code=None, pure=False):
+        self.func_name = func_name
         self.args = args
+        self.type = _type
+        self.code = code  # code object of the called function, if known
+        self.pure = pure
+
+    @property
+    def name(self):
+        arg_str = ', '.join([str(arg.name) for arg in self.args])
+        return f'{self.func_name}({arg_str})'
+
+    def __str__(self):
+        return self.name
+
+
+# element list[index], bounds checked unless the index is known to be valid
+class ListItem:
+    pure = True
+
+    def __init__(self, items, index, _type, checked=True):
+        self.items = items
+        self.index = index
+        self.type = _type
+        self.checked = checked
+
+    @property
+    def name(self):
+        index = self.index.name
+        if self.checked:
+            index = f'py2c_list_index({self.items.name}, {index})'
+        return f'(({self.type} *){self.items.name}->data)[{index}]'
+
+    def __str__(self):
+        return self.name
+
+
+# item index of an array view, stride bytes after the previous item
+class ViewItem(ListItem):
+    @property
+    def name(self):
+        index = self.index.name
+        if self.checked:
+            index = f'py2c_view_index({self.items.name}, {index})'
+        return f'(*({self.type} *)({self.items.name}.data + {index} * ' \
+               f'{self.items.name}.stride))'
+
+
+# len of a list or a dict, which both keep their size in ->size, or of an
+# array view, which is passed by value
+class Length:
+    pure = True
+
+    def __init__(self, items, by_value=False):
+        self.items = items
+        self.type = 'long'
+        self.by_value = by_value
+
+    @property
+    def name(self):
+        return f'{self.items.name}.size' if self.by_value else \
+            f'{self.items.name}->size'
+
+    def __str__(self):
+        return self.name
+
+
+# a c array of the items, to initialize a list from
+class ArrayLiteral:
+    pure = True
+
+    def __init__(self, items, _type):
+        self.items = items
+        self.type = _type
+
+    @property
+    def name(self):
+        return f'({self.type}[]){{{", ".join(item.name for item in self.items)}}}'
+
+    def __str__(self):
+        return self.name
+
+
+# a tuple, built in place as a c struct of type _type, see
+# FunctionTranslator.C_TYPE_MAP
+class TupleLiteral:
+    def __init__(self, items, _type):
+        self.items = items
+        self.type = _type
+
+    @property
+    def pure(self):
+        return all(item.pure for item in self.items)
+
+    @property
+    def name(self):
+        return f'({self.type}){{{", ".join(item.name for item in self.items)}}}'
+
+    def __str__(self):
+        return self.name
+
+
+# item index of a tuple, which is a field of its struct
+class TupleItem:
+    def __init__(self, value, index, _type):
+        self.value = value
+        self.index = index
+        self.type = _type
+
+    @property
+    def pure(self):
+        return self.value.pure
+
+    @property
+    def name(self):
+        return f'{self.value.name}.f{self.index}'
+
+    def __str__(self):
+        return self.name
+
+
+# field of an instance, at a fixed offset in its struct
+class FieldAccess:
+    def __init__(self, owner, field, _type):
+        self.owner = owner
+        self.field = field
+        self.type = _type
+
+    @property
+    def pure(self):
+        return self.owner.pure
+
+    @property
+    def name(self):
+        return f'{self.owner.name}->{self.field}'
 
     def __str__(self):
-        arg_str = ', '.join([arg.name for arg in self.args])
-        return f'{self.name}({arg_str})'
+        return self.name
+
+
+# a method of a list, looked up by LOAD_METHOD
+class ListMethod:
+    def __init__(self, name, items, list_type):
+        self.name = name
+        self.items = items
+        self.list_type = list_type
+
+    def __eq__(self, other):
+        return isinstance(other, ListMethod) and (
+            other.name, other.items, other.list_type) == (
+                self.name, self.items, self.list_type)
+
+
+# a method of a dict, looked up by LOAD_METHOD
+class DictMethod:
+    def __init__(self, name, items, dict_type):
+        self.name = name
+        self.items = items
+        self.dict_type = dict_type
+
+    def __eq__(self, other):
+        return isinstance(other, DictMethod) and (
+            other.name, other.items, other.dict_type) == (
+                self.name, self.items, self.dict_type)
+
+
+# the result of dict.keys() or dict.values(), field is 'key' or 'value'
+class DictView:
+    def __init__(self, items, dict_type, field):
+        self.items = items
+        self.dict_type = dict_type
+        self.field = field
+
+    def __eq__(self, other):
+        return isinstance(other, DictView) and (
+            other.items, other.dict_type, other.field) == (
+                self.items, self.dict_type, self.field)
+
+
+class Len:
+    pass
 
 
 class Print:
-    FORMATTERS = {'long': '%ld', 'double': '%lf', 'char *': '%s'}
+    FORMATTERS = {'long': '%ld', 'double': '%lf', 'char*': '%s'}
 
     def __init__(self, args=None):
         self.args = args
 
     def __str__(self):
         return f'printf("{" ".join([Print.FORMATTERS[arg.type] for arg in self.args])}\\n"' \
-               f", {', '.join([arg.name for arg in self.args])});\n"
+               f", {', '.join([str(arg.name) for arg in self.args])});\n"
 
 
 class Range:
@@ -84,29 +699,251 @@ class Range:
             self.step = 1 if len(args) < 3 else args[2]
 
 
+# A for loop over a range whose iterations are independent, which OpenMP
+# runs on several threads, see runtime/parallel.h. sums are the integer
+# variables the iterations add to, and extremes the (op, variable,
+# arguments) of the `if value > variable: variable = value` patterns, op
+# being 'max' or 'min'. Their arguments are the variables assigned along
+# with the variable, which need the results of the threads to be combined
+# in the order of the iterations. Every other variable assigned in the loop
+# is private to each thread. threads is 0 to let OpenMP choose. The loop
+# only runs in parallel if its body, as the ForLoop records it, assigns no
+# other variable of the function and does not leave it
+class ParallelLoop:
+    COMPARISONS = {'max': '>', 'min': '<'}
+
+    def __init__(self, sums, extremes, threads, name):
+        self.sums = sums
+        self.extremes = extremes
+        self.threads = threads
+        self.name = name  # of the variables holding the results by thread
+        self.private = []
+
+    @property
+    def ordered(self):
+        return [extreme for extreme in self.extremes if extreme[2]]
+
+    # the variables of the ordered extremes, with the arrays of their values
+    # by thread
+    def combined(self):
+        variables = [
+            variable for _, variable, arguments in self.ordered
+            for variable in [variable, *arguments]
+        ]
+        return [(variable, f'{self.name}_{i}')
+                for i, variable in enumerate(variables)]
+
+    def clauses(self):
+        clauses = [f' reduction(+:{variable.name})' for variable in self.sums]
+        clauses += [
+            f' reduction({op}:{variable.name})'
+            for op, variable, arguments in self.extremes if not arguments
+        ]
+        return ''.join(clauses)
+
+    def private_clause(self):
+        if not self.private:
+            return ''
+        return f' private({", ".join(self.private)})'
+
+    # the pragma right before the for statement
+    def pragma(self):
+        if self.ordered:
+            return f'#pragma omp for schedule(static){self.clauses()}\n'
+        threads = f' num_threads({self.threads})' if self.threads else ''
+        return '#pragma omp parallel for schedule(guided)' \
+            f'{self.clauses()}{self.private_clause()}{threads}\n'
+
+    # With ordered extremes, each thread starts from the values before the
+    # loop and runs one chunk of the iterations, chunks being in the order of
+    # the threads. The results of the threads are then combined in that
+    # order, which is the order python would find them in
+    def opening(self):
+        if not self.ordered:
+            return ''
+        count = f'{self.name}_threads'
+        index = f'{self.name}_thread'
+        output = f'{{\nlong {count} = ' \
+            f'{self.threads or "omp_get_max_threads()"};\n'
+        for variable, array in self.combined():
+            output += f'{variable.type} {array}[{count}];\n'
+        output += f'for (long {index} = 0; {index} < {count}; ' \
+            f'{index} += 1) {{\n'
+        for variable, array in self.combined():
+            output += f'{array}[{index}] = {variable.name};\n'
+        first_private = ', '.join(variable.name
+                                  for variable, _ in self.combined())
+        return f'{output}}}\n#pragma omp parallel num_threads({count}) ' \
+            f'firstprivate({first_private}){self.private_clause()}\n{{\n'
+
+    # after the closing brace of the for statement
+    def closing(self):
+        if not self.ordered:
+            return ''
+        count = f'{self.name}_threads'
+        index = f'{self.name}_thread'
+        arrays = {
+            variable.name: array
+            for variable, array in self.combined()
+        }
+        output = ''.join(f'{array}[omp_get_thread_num()] = {variable.name};\n'
+                         for variable, array in self.combined())
+        output += f'}}\nfor (long {index} = 0; {index} < {count}; ' \
+            f'{index} += 1) {{\n'
+        for op, variable, arguments in self.ordered:
+            output += f'if ({arrays[variable.name]}[{index}] ' \
+                f'{self.COMPARISONS[op]} {variable.name}) {{\n'
+            for assigned in [variable, *arguments]:
+                output += f'{assigned.name} = {arrays[assigned.name]}[{index}];\n'
+            output += '}\n'
+        return output + '}\n}\n'
+
+
 class ForLoop:
-    def __init__(self, var, range_, gflc):
+    # its declarations and the way it runs in parallel are only known once
+    # the function is translated
+    rendered_late = True
+
+    def __init__(self, var, range_, gflc, prefix=''):
         self.var = var
         self.range = range_
         self.gflc = gflc
+        self.prefix = prefix
+        # the ParallelLoop it runs as, in --parallel mode, and what
+        # cfg.Structurer saw of its body: the names of the variables it
+        # assigns, whether it can leave the loop other than by continue, and
+        # the for loops in it
+        self.parallel = None
+        self.body_assigns = set()
+        self.body_leaves = False
+        self.inner = []
+        # In --vectorize mode, the python line of the loop, which a comment
+        # before the loop records for the vectorization report, and the
+        # variables declared in the body, see FunctionTranslator.localize
+        self.vectorize = False
+        self.line = None
+        self.declarations = []
+
+    @property
+    def assigns(self):
+        return (self.var.name, )
+
+    # the comment naming the python line of the loop, on the line before it
+    def marker(self):
+        if not self.vectorize:
+            return ''
+        return f'// py2c loop at line {self.line}\n'
+
+    # the start of the body, declaring its variables
+    def body(self):
+        return ''.join(map(str, self.declarations))
 
     def __str__(self):
         name = self.var.name
         output = ''
 
+        # constant bounds are literals in --vectorize mode, so the compiler
+        # sees a counted loop with a constant step
         start = self.range.start
-        if isinstance(self.range.start, Variable):
-            output += f'long for{self.gflc * 4} = {self.range.start.name};\n'
-            start = f'for{self.gflc * 4}'
+        if self.vectorize and isinstance(self.range.start, Constant):
+            start = self.range.start.name
+        elif isinstance(self.range.start, Variable):
+            output += f'long {self.prefix}for{self.gflc * 4} = {self.range.start.name};\n'
+            start = f'{self.prefix}for{self.gflc * 4}'
 
-        output += f'long for{self.gflc * 4 + 1} = {self.range.stop.name};\n'
-        stop = f'for{self.gflc * 4 + 1}'
+        output += f'long {self.prefix}for{self.gflc * 4 + 1} = {self.range.stop.name};\n'
+        stop = f'{self.prefix}for{self.gflc * 4 + 1}'
 
         step = self.range.step
-        if isinstance(self.range.step, Variable):
-            output += f'long for{self.gflc * 4 + 2} = {self.range.step.name};\n'
-            step = f'for{self.gflc * 4 + 2}'
+        if self.vectorize and isinstance(self.range.step, Constant):
+            step = self.range.step.name
+        elif isinstance(self.range.step, Variable):
+            output += f'long {self.prefix}for{self.gflc * 4 + 2} = {self.range.step.name};\n'
+            step = f'{self.prefix}for{self.gflc * 4 + 2}'
 
-        iterator = f'for{self.gflc * 4 + 3}'
+        iterator = f'{self.prefix}for{self.gflc * 4 + 3}'
+
+        if self.parallel is not None:
+            output = self.parallel.opening() + output + self.parallel.pragma()
+
+        return f'{output}{self.marker()}for (long {iterator} = {start}; {iterator} < {stop}; {iterator} += {step}) {{\n{self.body()}{name} = {iterator};\n'
+
+
+# for loop over the items of a list, which may grow while it runs. In
+# --vectorize mode, counted is set when the body cannot resize the list, so
+# its size is read once, and restrict when the body writes to no list or
+# array either, so its items are read through a restrict pointer
+class ListLoop(ForLoop):
+    counted = False
+    restrict = False
+
+    def __str__(self):
+        items = f'{self.prefix}for{self.gflc * 4}'
+        iterator = f'{self.prefix}for{self.gflc * 4 + 3}'
+        output = f'py2c_list* {items} = {self.range.name};\n'
+        size = f'{items}->size'
+        if self.counted:
+            size = f'{self.prefix}for{self.gflc * 4 + 1}'
+            output += f'long {size} = {items}->size;\n'
+        item = f'(({self.var.type} *){items}->data)[{iterator}]'
+        if self.restrict:
+            data = f'{self.prefix}for{self.gflc * 4 + 2}'
+            output += f'const {self.var.type} *restrict {data} = ' \
+                      f'{items}->data;\n'
+            item = f'{data}[{iterator}]'
+        return f'{output}{self.marker()}for (long {iterator} = 0; ' \
+               f'{iterator} < {size}; {iterator} += 1) {{\n' \
+               f'{self.body()}{self.var.name} = {item};\n'
 
-        return f'{output}for (long {iterator} = {start}; {iterator} < {stop}; {iterator} += {step}) {{\n{name} = {iterator};\n'
+
+# for loop over the items of an array, see ListLoop for restrict
+class ViewLoop(ForLoop):
+    restrict = False
+
+    def __str__(self):
+        items = f'{self.prefix}for{self.gflc * 4}'
+        iterator = f'{self.prefix}for{self.gflc * 4 + 3}'
+        output = f'py2c_view {items} = {self.range.name};\n'
+        data = f'{items}.data'
+        if self.restrict:
+            data = f'{self.prefix}for{self.gflc * 4 + 2}'
+            output += f'const char *restrict {data} = {items}.data;\n'
+        return f'{output}{self.marker()}for (long {iterator} = 0; ' \
+               f'{iterator} < {items}.size; {iterator} += 1) {{\n' \
+               f'{self.body()}{self.var.name} = *({self.var.type} *)' \
+               f'({data} + {iterator} * {items}.stride);\n'
+
+
+# for loop over the keys or values of a dict in insertion order, skipping
+# deleted entries. Unlike python, adding keys while the loop runs is not an
+# error, and the keys added are visited as well
+class DictLoop(ForLoop):
+    def __init__(self, var, range_, gflc, prefix, name, field):
+        super().__init__(var, range_, gflc, prefix)
+        self.name = name  # of the py2c_dict functions for the types
+        self.field = field
+
+    def __str__(self):
+        items = f'{self.prefix}for{self.gflc * 4}'
+        iterator = f'{self.prefix}for{self.gflc * 4 + 3}'
+        entry = f'((py2c_dict_entry_{self.name} *){items}->entries)' \
+                f'[{iterator}]'
+        return f'py2c_dict* {items} = {self.range.name};\n' \
+               f'{self.marker()}for (long {iterator} = 0; ' \
+               f'{iterator} < {items}->used; {iterator} += 1) {{\n' \
+               f'{self.body()}if (!{entry}.hash) continue;\n' \
+               f'{self.var.name} = {entry}.{self.field};\n'
+
+
+# the closing brace of a for loop, followed by the code combining the
+# results of its threads if it runs in parallel
+class EndLoop:
+    rendered_late = True
+
+    def __init__(self, loop):
+        self.loop = loop
+
+    def __str__(self):
+        if self.loop.parallel is None:
+            return '}\n'
+        return '}\n' + self.loop.parallel.closing()
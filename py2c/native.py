@@ -0,0 +1,96 @@
+import ast, importlib.machinery, importlib.util, inspect, os, sys, tempfile, \
+    textwrap
+from py2c.cache import BuildCache
+from py2c.compile import EXTENSION_SUFFIX, compile_c, extension_flags
+from py2c.ir import ANNOTATIONS, DECORATORS
+from py2c.translator import CodeTranslator
+
+# the python function of every native function made by jit, so that jitted
+# functions calling each other translate the callee from its source
+PYTHON_FUNCTIONS: dict = {}
+
+
+# the names a function or a class reads, including those in its decorators
+# and annotations
+def global_names(tree):
+    return {
+        node.id
+        for node in ast.walk(tree)
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load)
+    }
+
+
+# The source of a python module that defines func, preceded by the globals
+# it uses: the functions and classes it calls (from their source), the
+# modules and decorators it imports, and the numbers and strings it reads.
+# Globals of any other kind are left out, so the translator rejects them
+def module_source(func):
+    header = []
+    definitions = []
+    seen = {func.__name__}
+
+    def define(obj):
+        source = textwrap.dedent(inspect.getsource(obj))
+        if inspect.isfunction(obj):
+            namespace = obj.__globals__
+        else:
+            namespace = vars(sys.modules[obj.__module__])
+        for name in sorted(global_names(ast.parse(source))):
+            if name in seen or name not in namespace:
+                continue  # a builtin, a local variable or already defined
+            seen.add(name)
+            value = PYTHON_FUNCTIONS.get(namespace[name], namespace[name])
+            qualified_name = f'{getattr(value, "__module__", "")}.' \
+                f'{getattr(value, "__qualname__", "")}'
+            if inspect.ismodule(value):
+                header.append(f'import {value.__name__} as {name}\n')
+            elif qualified_name in DECORATORS | ANNOTATIONS:
+                header.append(f'from {value.__module__} import '
+                              f'{value.__qualname__} as {name}\n')
+            elif isinstance(value, (bool, int, float, str)):
+                header.append(f'{name} = {value!r}\n')
+            elif inspect.isfunction(value) or inspect.isclass(value):
+                define(value)
+        definitions.append(source)
+
+    define(func)
+    return ''.join(header) + '\n'.join(definitions)
+
+
+# translate the module source into an extension module and compile it with
+# the c compiler, returning the path of the binary in the cache
+def build(source, name, key, compiler, flags, cache):
+    code = compile(source, f'<jit {name}>', 'exec', dont_inherit=True)
+    with tempfile.TemporaryDirectory() as directory:
+        c_path = os.path.join(directory, f'{name}.c')
+        out_path = os.path.join(directory, f'{name}{EXTENSION_SUFFIX}')
+        with open(c_path, 'w') as writefile:
+            CodeTranslator(code, cache, module=name).translate(writefile)
+        compile_c(c_path, out_path, compiler, [*flags, *extension_flags()])
+        with open(out_path, 'rb') as readfile:
+            return cache.put_file(key, readfile, EXTENSION_SUFFIX,
+                                  executable=True)
+
+
+# Compile func to a native function. The extension module built from it is
+# cached by a hash of its source, so the compiler only runs the first time
+def compile_function(func, compiler='gcc', flags=('-O3', ), cache_dir=None):
+    cache = BuildCache(cache_dir)
+    source = module_source(func)
+    key = cache.key(source,
+                    flags=('jit', compiler, *flags, EXTENSION_SUFFIX))
+    name = f'{func.__name__}_{key[:16]}'
+    path = cache.get(key, EXTENSION_SUFFIX) or \
+        build(source, name, key, compiler, flags, cache)
+
+    loader = importlib.machinery.ExtensionFileLoader(name, path)
+    module = importlib.util.module_from_spec(
+        importlib.util.spec_from_file_location(name, path, loader=loader))
+    loader.exec_module(module)
+    native = getattr(module, func.__name__, None)
+    if native is None:
+        raise TypeError(f'{func.__name__}: the parameters and the result '
+                        'must be numbers, strings, arrays or None to be '
+                        'called from python')
+    PYTHON_FUNCTIONS[native] = func
+    return native
@@ -0,0 +1,232 @@
+import ast, dis, inspect, json, runpy, sys
+from py2c.inference import join, list_of, dict_of, tuple_of, profile_key, \
+    union_of, is_union, NUMERIC_TYPES
+
+RETURN_VALUE = dis.opmap['RETURN_VALUE']
+# the items of a list or dict whose types are looked at, spread over it
+SAMPLE_SIZE = 16
+# the names of the types in a profile
+TYPE_NAMES = {
+    'int': int,
+    'float': float,
+    'bool': bool,
+    'str': str,
+    'None': type(None),
+    'list': list,
+    'dict': dict,
+    'tuple': tuple
+}
+
+
+# a value of a type py2c cannot translate, or of two types that have none in
+# common
+class Unknown:
+    pass
+
+
+def sample(items):
+    step = max(len(items) // SAMPLE_SIZE, 1)
+    return items[::step][:SAMPLE_SIZE]
+
+
+def join_all(types_):
+    result = None
+    for _type in types_:
+        result = join_observed(result, _type)
+    return result
+
+
+def join_observed(a, b):
+    if a is Unknown or b is Unknown:
+        return Unknown
+    try:
+        return join(a, b)
+    except TypeError:
+        return Unknown
+
+
+# the members of a union of numeric types, or the type itself
+def numeric_members(py_type):
+    members = py_type.__args__ if is_union(py_type) else (py_type, )
+    return members if all(member in NUMERIC_TYPES
+                          for member in members) else None
+
+
+# Like join_observed, but a variable that held numbers of several types gets
+# their union rather than the widest of them, as a function called with ints
+# and with floats computes different results for each
+def join_variable(a, b):
+    a_members, b_members = numeric_members(a), numeric_members(b)
+    if a is None or a == b or a_members is None or b_members is None:
+        return join_observed(a, b)
+    members = [member for member in NUMERIC_TYPES
+               if member in a_members + b_members]
+    return union_of(members)
+
+
+# the type of the value as py2c sees it, the element types of lists and
+# dicts are taken from a sample of their items
+def observed_type(value):
+    if value is None:
+        return type(None)
+    if type(value) in (bool, int, float, str):
+        return type(value)
+    if type(value) is list:
+        if not value:
+            return list
+        element = join_all(observed_type(item) for item in sample(value))
+        return list_of(element) or Unknown
+    if type(value) is dict:
+        if not value:
+            return dict
+        keys = sample(list(value))
+        key = join_all(observed_type(key) for key in keys)
+        element = join_all(observed_type(value[key]) for key in keys)
+        return dict_of(key, element) or Unknown
+    if type(value) is tuple:
+        return tuple_of([observed_type(item) for item in value]) or Unknown
+    return Unknown
+
+
+def type_name(py_type):
+    if py_type is type(None):
+        return 'None'
+    if is_union(py_type):
+        return ' | '.join(map(type_name, py_type.__args__))
+    if py_type in (bool, int, float, str, list, dict):
+        return py_type.__name__
+    return str(py_type)
+
+
+# the type named by type_name, profiles come from files so they are parsed
+# rather than evaluated
+def parse_type(name):
+    def parse(node):
+        if isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitOr):
+            return union_of([parse(node.left), parse(node.right)])
+        if isinstance(node, ast.Name) and node.id in TYPE_NAMES:
+            return TYPE_NAMES[node.id]
+        if isinstance(node, ast.Constant) and node.value is None:
+            return type(None)
+        if isinstance(node, ast.Subscript) and \
+                isinstance(node.value, ast.Name) and \
+                node.value.id in ('list', 'dict', 'tuple'):
+            items = node.slice.elts if isinstance(node.slice, ast.Tuple) \
+                else [node.slice]
+            return TYPE_NAMES[node.value.id][tuple(map(parse, items))]
+        raise TypeError(f'{name} is not a type of a profile')
+
+    try:
+        return parse(ast.parse(name, mode='eval').body)
+    except SyntaxError:
+        raise TypeError(f'{name} is not a type of a profile') from None
+
+
+# The types seen by each function of one python file while it runs: of its
+# parameters when it is called, and of its locals and its result when it
+# returns. Functions are keyed by profile_key
+class TypeProfile:
+    def __init__(self, filename):
+        self.filename = filename
+        self.functions = {}
+
+    def observe(self, code, field, name, value):
+        function = self.functions.setdefault(profile_key(code), {
+            'params': {},
+            'locals': {},
+            'return': {}
+        })
+        variables = function[field]
+        variables[name] = join_variable(variables.get(name),
+                                        observed_type(value))
+
+    # the global trace function, which only traces the calls of functions
+    # of the file
+    def trace_call(self, frame, event, arg):
+        code = frame.f_code
+        if code.co_filename != self.filename or code.co_name == '<module>' \
+                or code.co_flags & inspect.CO_GENERATOR:
+            return None
+        for name in code.co_varnames[:code.co_argcount]:
+            self.observe(code, 'params', name, frame.f_locals[name])
+        frame.f_trace_lines = False
+        return self.trace_return
+
+    def trace_return(self, frame, event, arg):
+        # a function that raises returns from another instruction
+        if event != 'return' or \
+                frame.f_code.co_code[frame.f_lasti] != RETURN_VALUE:
+            return self.trace_return
+        code = frame.f_code
+        for name, value in frame.f_locals.items():
+            if name in code.co_varnames[code.co_argcount:]:
+                self.observe(code, 'locals', name, value)
+        self.observe(code, 'return', 'return', arg)
+        return self.trace_return
+
+    def to_json(self):
+        functions = {}
+        for key, function in self.functions.items():
+            functions[key] = {
+                'params': [[name, self.name(_type)]
+                           for name, _type in function['params'].items()],
+                'return': self.name(function['return'].get('return')),
+                'locals': {
+                    name: self.name(_type)
+                    for name, _type in function['locals'].items()
+                }
+            }
+        return {'functions': functions}
+
+    @staticmethod
+    def name(py_type):
+        return None if py_type in (None, Unknown) else type_name(py_type)
+
+
+# run the python file as __main__ and write the types it saw to out_path
+def record_profile(filepath, out_path, argv=()):
+    profile = TypeProfile(filepath)
+    old_argv = sys.argv
+    sys.argv = [filepath, *argv]
+    sys.settrace(profile.trace_call)
+    try:
+        runpy.run_path(filepath, run_name='__main__')
+    except SystemExit:
+        pass
+    finally:
+        sys.settrace(None)
+        sys.argv = old_argv
+        with open(out_path, 'w') as writefile:
+            json.dump(profile.to_json(), writefile, indent=1)
+
+
+# The profile written by record_profile, as the signature of each function
+# whose parameters and result all got a type, or None, and the types of its
+# locals, by profile_key. A function with parameters that held numbers of
+# several types is generic, see inference.specialize, and its locals that
+# did are left to the type inference of each clone
+def load_profile(path):
+    with open(path) as readfile:
+        functions = json.load(readfile)['functions']
+    profile = {}
+    for key, function in functions.items():
+        types_ = [_type for _, _type in function['params']]
+        types_.append(function['return'])
+        signature = None
+        if None not in types_:
+            signature = [(parse_type(_type), name)
+                         for (name, _), _type in zip(function['params'],
+                                                     types_)]
+            signature.append((parse_type(function['return']), 'return'))
+        locals_ = {
+            name: parse_type(_type)
+            for name, _type in function['locals'].items() if _type is not None
+        }
+        profile[key] = {
+            'signature': signature,
+            'locals': {
+                name: _type
+                for name, _type in locals_.items() if not is_union(_type)
+            }
+        }
+    return profile
@@ -0,0 +1,236 @@
+/* py2c runtime: dicts with int or str keys and number values.
+ *
+ * A dict keeps its entries (hash, key, value) in a dense array in insertion
+ * order, so iterating over it visits the keys in the same order as python.
+ * The entries are found through an index, an open-addressing hash table of
+ * entry numbers probed linearly from the home slot of the hash, so a lookup
+ * usually stays within one cache line of the index. Removing a key shifts
+ * the following slots of its probe run back instead of leaving a tombstone,
+ * and marks the entry as deleted with a hash of 0 (hashes are never 0).
+ *
+ * The index is rebuilt, dropping deleted entries, once the entry array is
+ * full, which happens when the index is PY2C_DICT_MAX_LOAD full. Compile
+ * with -DPY2C_DICT_MAX_LOAD=0.75 to trade longer probe runs for less memory.
+ * Dicts are never freed. Errors are raised through error.h.
+ */
+#ifndef PY2C_DICT_H
+#define PY2C_DICT_H
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+#ifndef PY2C_DICT_MAX_LOAD
+#define PY2C_DICT_MAX_LOAD 0.5
+#endif
+/* a float, so it cannot be checked with #if */
+_Static_assert(PY2C_DICT_MAX_LOAD > 0 && PY2C_DICT_MAX_LOAD < 1,
+               "PY2C_DICT_MAX_LOAD must be between 0 and 1");
+
+typedef struct {
+    long *index;          /* entry number of each slot, or -1 if empty */
+    unsigned long mask;   /* slots - 1, the number of slots is a power of 2 */
+    void *entries;
+    long used;            /* entries written, including deleted ones */
+    long size;            /* entries that are not deleted */
+    long capacity;        /* entries that fit before the index is rebuilt */
+} py2c_dict;
+
+static inline void *py2c_dict_alloc(void *data, long count, size_t item_size) {
+    data = realloc(data, (count ? count : 1) * item_size);
+    if (data == NULL)
+        py2c_raise("MemoryError", "");
+    return data;
+}
+
+static inline py2c_dict *py2c_dict_new(void) {
+    py2c_dict *dict = py2c_dict_alloc(NULL, 1, sizeof(py2c_dict));
+    /* a single empty slot, the first insertion builds the real index */
+    dict->index = py2c_dict_alloc(NULL, 1, sizeof(long));
+    dict->index[0] = -1;
+    dict->mask = 0;
+    dict->entries = NULL;
+    dict->used = 0;
+    dict->size = 0;
+    dict->capacity = 0;
+    return dict;
+}
+
+static inline unsigned long py2c_dict_mix(unsigned long hash) {
+    hash ^= hash >> 31;
+    hash *= 0x7fb5d329728ea185UL;
+    hash ^= hash >> 27;
+    return hash ? hash : 1;
+}
+
+static inline unsigned long py2c_dict_hash_long(long key) {
+    return py2c_dict_mix((unsigned long)key * 0x9e3779b97f4a7c15UL);
+}
+
+static inline unsigned long py2c_dict_hash_str(const char *key) {
+    unsigned long hash = 0xcbf29ce484222325UL;
+    for (; *key; key++) {
+        hash ^= (unsigned char)*key;
+        hash *= 0x100000001b3UL;
+    }
+    return py2c_dict_mix(hash);
+}
+
+static inline int py2c_dict_equal_long(long a, long b) {
+    return a == b;
+}
+
+static inline int py2c_dict_equal_str(const char *a, const char *b) {
+    return a == b || strcmp(a, b) == 0;
+}
+
+/* every entry starts with its hash */
+static inline unsigned long py2c_dict_entry_hash(py2c_dict *dict, long entry,
+                                                 size_t entry_size) {
+    return *(unsigned long *)((char *)dict->entries + entry * entry_size);
+}
+
+/* drop the deleted entries and rebuild the index for capacity entries */
+static inline void py2c_dict_resize(py2c_dict *dict, long capacity,
+                                    size_t entry_size) {
+    long size = 0;
+    for (long entry = 0; entry < dict->used; entry++) {
+        if (py2c_dict_entry_hash(dict, entry, entry_size) == 0)
+            continue;
+        if (size != entry)
+            memcpy((char *)dict->entries + size * entry_size,
+                   (char *)dict->entries + entry * entry_size, entry_size);
+        size++;
+    }
+    dict->used = size;
+    dict->entries = py2c_dict_alloc(dict->entries, capacity, entry_size);
+    dict->capacity = capacity;
+
+    unsigned long slots = 8;
+    while (slots * PY2C_DICT_MAX_LOAD < capacity)
+        slots *= 2;
+    dict->index = py2c_dict_alloc(dict->index, slots, sizeof(long));
+    memset(dict->index, -1, slots * sizeof(long));
+    dict->mask = slots - 1;
+    for (long entry = 0; entry < size; entry++) {
+        unsigned long slot = py2c_dict_entry_hash(dict, entry, entry_size);
+        while (dict->index[slot &= dict->mask] >= 0)
+            slot++;
+        dict->index[slot] = entry;
+    }
+}
+
+/* make room for one more entry */
+static inline void py2c_dict_reserve(py2c_dict *dict, size_t entry_size) {
+    if (dict->used < dict->capacity)
+        return;
+    py2c_dict_resize(dict, dict->size < 4 ? 8 : 2 * dict->size, entry_size);
+}
+
+/* delete the entry in the slot, and move the entries after it in the probe
+ * run back to where a lookup would start looking for them */
+static inline void py2c_dict_remove(py2c_dict *dict, unsigned long slot,
+                                    size_t entry_size) {
+    long entry = dict->index[slot];
+    *(unsigned long *)((char *)dict->entries + entry * entry_size) = 0;
+    dict->size--;
+    unsigned long hole = slot;
+    for (unsigned long next = (slot + 1) & dict->mask;
+         dict->index[next] >= 0; next = (next + 1) & dict->mask) {
+        unsigned long home = py2c_dict_entry_hash(
+            dict, dict->index[next], entry_size) & dict->mask;
+        if (((next - home) & dict->mask) >= ((next - hole) & dict->mask)) {
+            dict->index[hole] = dict->index[next];
+            hole = next;
+        }
+    }
+    dict->index[hole] = -1;
+}
+
+#define PY2C_DICT_FUNCTIONS(NAME, K, V, HASH, EQUAL, KEY_FORMAT)              \
+typedef struct {                                                              \
+    unsigned long hash;                                                       \
+    K key;                                                                    \
+    V value;                                                                  \
+} py2c_dict_entry_##NAME;                                                     \
+                                                                              \
+/* the slot holding key, or the empty slot where it would go */               \
+static inline unsigned long py2c_dict_find_##NAME(py2c_dict *dict, K key,     \
+                                                  unsigned long hash) {       \
+    py2c_dict_entry_##NAME *entries = dict->entries;                          \
+    unsigned long slot = hash & dict->mask;                                   \
+    for (;;) {                                                                \
+        long entry = dict->index[slot];                                       \
+        if (entry < 0 || (entries[entry].hash == hash &&                      \
+                          EQUAL(entries[entry].key, key)))                    \
+            return slot;                                                      \
+        slot = (slot + 1) & dict->mask;                                       \
+    }                                                                         \
+}                                                                             \
+                                                                              \
+static inline void py2c_dict_key_error_##NAME(K key) {                        \
+    py2c_raise("KeyError", KEY_FORMAT, key);                                  \
+}                                                                             \
+                                                                              \
+static inline V py2c_dict_get_##NAME(py2c_dict *dict, K key) {                \
+    long entry = dict->index[py2c_dict_find_##NAME(dict, key, HASH(key))];    \
+    if (entry < 0)                                                            \
+        py2c_dict_key_error_##NAME(key);                                      \
+    return ((py2c_dict_entry_##NAME *)dict->entries)[entry].value;            \
+}                                                                             \
+                                                                              \
+static inline V py2c_dict_get_default_##NAME(py2c_dict *dict, K key,          \
+                                             V value) {                       \
+    long entry = dict->index[py2c_dict_find_##NAME(dict, key, HASH(key))];    \
+    return entry < 0 ? value                                                  \
+                     : ((py2c_dict_entry_##NAME *)dict->entries)[entry].value;\
+}                                                                             \
+                                                                              \
+static inline long py2c_dict_contains_##NAME(py2c_dict *dict, K key) {        \
+    return dict->index[py2c_dict_find_##NAME(dict, key, HASH(key))] >= 0;     \
+}                                                                             \
+                                                                              \
+static inline void py2c_dict_set_##NAME(py2c_dict *dict, K key, V value) {    \
+    unsigned long hash = HASH(key);                                           \
+    unsigned long slot = py2c_dict_find_##NAME(dict, key, hash);              \
+    if (dict->index[slot] >= 0) {                                             \
+        ((py2c_dict_entry_##NAME *)dict->entries)[dict->index[slot]].value =  \
+            value;                                                            \
+        return;                                                               \
+    }                                                                         \
+    if (dict->used == dict->capacity) {                                       \
+        py2c_dict_reserve(dict, sizeof(py2c_dict_entry_##NAME));             \
+        slot = py2c_dict_find_##NAME(dict, key, hash);                        \
+    }                                                                         \
+    py2c_dict_entry_##NAME *entry =                                           \
+        (py2c_dict_entry_##NAME *)dict->entries + dict->used;                 \
+    entry->hash = hash;                                                       \
+    entry->key = key;                                                         \
+    entry->value = value;                                                     \
+    dict->index[slot] = dict->used++;                                         \
+    dict->size++;                                                             \
+}                                                                             \
+                                                                              \
+static inline void py2c_dict_delete_##NAME(py2c_dict *dict, K key) {          \
+    unsigned long slot = py2c_dict_find_##NAME(dict, key, HASH(key));         \
+    if (dict->index[slot] < 0)                                                \
+        py2c_dict_key_error_##NAME(key);                                      \
+    py2c_dict_remove(dict, slot, sizeof(py2c_dict_entry_##NAME));             \
+}                                                                             \
+                                                                              \
+static inline py2c_dict *py2c_dict_from_##NAME(long size, K *keys,            \
+                                               V *values) {                   \
+    py2c_dict *dict = py2c_dict_new();                                        \
+    for (long i = 0; i < size; i++)                                           \
+        py2c_dict_set_##NAME(dict, keys[i], values[i]);                       \
+    return dict;                                                              \
+}
+
+PY2C_DICT_FUNCTIONS(long_long, long, long, py2c_dict_hash_long,
+                    py2c_dict_equal_long, "%ld")
+PY2C_DICT_FUNCTIONS(long_double, long, double, py2c_dict_hash_long,
+                    py2c_dict_equal_long, "%ld")
+PY2C_DICT_FUNCTIONS(str_long, char *, long, py2c_dict_hash_str,
+                    py2c_dict_equal_str, "'%s'")
+
+#endif
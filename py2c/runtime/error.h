@@ -0,0 +1,42 @@
+/* py2c runtime: python exceptions.
+ *
+ * A program prints the exception and exits. An extension module, which
+ * defines PY2C_EXTENSION, raises it in the python code that called into
+ * the module instead: every entry point of the module sets py2c_error_jump
+ * before running translated code, and py2c_raise jumps back there. The
+ * memory allocated by the interrupted call is not freed.
+ */
+#ifndef PY2C_ERROR_H
+#define PY2C_ERROR_H
+
+#include <stdarg.h>
+#include <stdio.h>
+#include <stdlib.h>
+
+#ifdef PY2C_EXTENSION
+#include <setjmp.h>
+static jmp_buf py2c_error_jump;
+#endif
+
+/* raise the builtin exception named type, with a printf style message */
+static inline _Noreturn void py2c_raise(const char *type,
+                                        const char *format, ...) {
+    char message[256];
+    va_list args;
+    va_start(args, format);
+    vsnprintf(message, sizeof(message), format, args);
+    va_end(args);
+#ifdef PY2C_EXTENSION
+    PyObject *exception = PyDict_GetItemString(PyEval_GetBuiltins(), type);
+    PyErr_SetString(exception ? exception : PyExc_RuntimeError, message);
+    longjmp(py2c_error_jump, 1);
+#else
+    if (*message)
+        fprintf(stderr, "%s: %s\n", type, message);
+    else
+        fprintf(stderr, "%s\n", type);
+    exit(1);
+#endif
+}
+
+#endif
@@ -0,0 +1,69 @@
+/* py2c runtime: the arguments of the functions of an extension module.
+ *
+ * The functions take their positional arguments as an array of objects
+ * (METH_FASTCALL), which are unboxed into c values before the translated
+ * function is called. Each check returns 0 with a TypeError (or an
+ * OverflowError for ints that do not fit a long) set if the argument cannot
+ * be passed to the function.
+ */
+#ifndef PY2C_EXTENSION_H
+#define PY2C_EXTENSION_H
+
+static inline int py2c_check_nargs(const char *func, Py_ssize_t nargs,
+                                   Py_ssize_t expected) {
+    if (nargs == expected)
+        return 1;
+    PyErr_Format(PyExc_TypeError,
+                 "%s() takes %zd positional arguments but %zd were given",
+                 func, expected, nargs);
+    return 0;
+}
+
+/* index 0 is the result of a function run by python, see mixed.h */
+static inline int py2c_wrong_type(const char *func, int index,
+                                  const char *expected, PyObject *arg) {
+    if (index == 0)
+        PyErr_Format(PyExc_TypeError, "%s() must return %s, not %.200s",
+                     func, expected, Py_TYPE(arg)->tp_name);
+    else
+        PyErr_Format(PyExc_TypeError,
+                     "%s() argument %d must be %s, not %.200s", func, index,
+                     expected, Py_TYPE(arg)->tp_name);
+    return 0;
+}
+
+static inline int py2c_unbox_long(PyObject *arg, long *value,
+                                  const char *func, int index) {
+    if (!PyLong_Check(arg))
+        return py2c_wrong_type(func, index, "int", arg);
+    *value = PyLong_AsLong(arg);
+    return !(*value == -1 && PyErr_Occurred());
+}
+
+/* ints are accepted as well, like python does */
+static inline int py2c_unbox_double(PyObject *arg, double *value,
+                                    const char *func, int index) {
+    if (PyFloat_CheckExact(arg)) {
+        *value = PyFloat_AS_DOUBLE(arg);
+        return 1;
+    }
+    if (PyFloat_Check(arg)) {
+        *value = PyFloat_AsDouble(arg);
+        return 1;
+    }
+    if (!PyLong_Check(arg))
+        return py2c_wrong_type(func, index, "float", arg);
+    *value = PyLong_AsDouble(arg);
+    return !(*value == -1.0 && PyErr_Occurred());
+}
+
+/* the string stays owned by the argument, which outlives the call */
+static inline int py2c_unbox_str(PyObject *arg, char **value,
+                                 const char *func, int index) {
+    if (!PyUnicode_Check(arg))
+        return py2c_wrong_type(func, index, "str", arg);
+    *value = (char *)PyUnicode_AsUTF8(arg);
+    return *value != NULL;
+}
+
+#endif
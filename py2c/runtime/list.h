@@ -0,0 +1,92 @@
+/* py2c runtime: lists of numbers.
+ *
+ * A list is a growable buffer of longs or doubles, and is always handled
+ * through a pointer, so that like in python every name bound to it sees
+ * the changes made through the others. The capacity doubles whenever it
+ * runs out, so appending takes amortized constant time. Lists are never
+ * freed. Errors are raised through error.h.
+ */
+#ifndef PY2C_LIST_H
+#define PY2C_LIST_H
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+typedef struct {
+    void *data;
+    long size;
+    long capacity;
+} py2c_list;
+
+static inline void *py2c_list_alloc(void *data, long count, size_t item_size) {
+    data = realloc(data, (count ? count : 1) * item_size);
+    if (data == NULL)
+        py2c_raise("MemoryError", "");
+    return data;
+}
+
+static inline py2c_list *py2c_list_new(void) {
+    py2c_list *list = py2c_list_alloc(NULL, 1, sizeof(py2c_list));
+    list->data = NULL;
+    list->size = 0;
+    list->capacity = 0;
+    return list;
+}
+
+static inline void py2c_list_reserve(py2c_list *list, long capacity,
+                                     size_t item_size) {
+    if (capacity <= list->capacity)
+        return;
+    if (capacity < 2 * list->capacity)
+        capacity = 2 * list->capacity;
+    if (capacity < 8)
+        capacity = 8;
+    list->data = py2c_list_alloc(list->data, capacity, item_size);
+    list->capacity = capacity;
+}
+
+/* the position of list[index], counting negative indices from the end */
+static inline long py2c_list_index(py2c_list *list, long index) {
+    if (index < 0)
+        index += list->size;
+    if (index < 0 || index >= list->size)
+        py2c_raise("IndexError", "list index out of range");
+    return index;
+}
+
+#define PY2C_LIST_FUNCTIONS(T)                                               \
+static inline py2c_list *py2c_list_from_##T(long size, const T *items) {     \
+    py2c_list *list = py2c_list_new();                                       \
+    py2c_list_reserve(list, size, sizeof(T));                                \
+    memcpy(list->data, items, size * sizeof(T));                             \
+    list->size = size;                                                       \
+    return list;                                                             \
+}                                                                            \
+                                                                             \
+static inline py2c_list *py2c_list_repeat_##T(py2c_list *items, long n) {    \
+    py2c_list *list = py2c_list_new();                                       \
+    long size = n > 0 ? items->size * n : 0;                                 \
+    py2c_list_reserve(list, size, sizeof(T));                                \
+    for (long i = 0; i < size; i += items->size)                             \
+        memcpy((T *)list->data + i, items->data, items->size * sizeof(T));   \
+    list->size = size;                                                       \
+    return list;                                                             \
+}                                                                            \
+                                                                             \
+static inline void py2c_list_append_##T(py2c_list *list, T item) {           \
+    if (list->size == list->capacity)                                        \
+        py2c_list_reserve(list, list->size + 1, sizeof(T));                  \
+    ((T *)list->data)[list->size++] = item;                                  \
+}                                                                            \
+                                                                             \
+static inline T py2c_list_pop_##T(py2c_list *list) {                         \
+    if (list->size == 0)                                                     \
+        py2c_raise("IndexError", "pop from empty list");                     \
+    return ((T *)list->data)[--list->size];                                  \
+}
+
+PY2C_LIST_FUNCTIONS(long)
+PY2C_LIST_FUNCTIONS(double)
+
+#endif
@@ -0,0 +1,82 @@
+/* py2c runtime: memo tables for memoized functions.
+ *
+ * A table is a fixed-capacity open-addressing hash table. Each slot holds
+ * the hash of the arguments, the arguments and the result, all stored as
+ * longs (doubles are stored by their bits). A hash of 0 marks an empty slot.
+ * Lookups probe at most PY2C_MEMO_PROBES slots from the home slot of the
+ * hash. When all of them are taken, storing a result evicts one of them,
+ * chosen round robin, so the table never grows and never needs rehashing.
+ */
+#ifndef PY2C_MEMO_H
+#define PY2C_MEMO_H
+
+#include <string.h>
+
+#define PY2C_MEMO_PROBES 8
+
+typedef struct {
+    long *slots;         /* capacity * (nargs + 2) longs */
+    unsigned long mask;  /* capacity - 1, the capacity is a power of two */
+    int nargs;
+    unsigned long evictions;
+} py2c_memo;
+
+static inline long py2c_memo_from_double(double value) {
+    long bits;
+    memcpy(&bits, &value, sizeof bits);
+    return bits;
+}
+
+static inline double py2c_memo_to_double(long bits) {
+    double value;
+    memcpy(&value, &bits, sizeof value);
+    return value;
+}
+
+static inline unsigned long py2c_memo_hash(const long *key, int nargs) {
+    unsigned long hash = 0x9e3779b97f4a7c15UL;
+    for (int i = 0; i < nargs; i++) {
+        hash ^= (unsigned long)key[i];
+        hash *= 0xbf58476d1ce4e5b9UL;
+        hash ^= hash >> 31;
+    }
+    return hash ? hash : 1;
+}
+
+static inline long *py2c_memo_slot(py2c_memo *memo, unsigned long index) {
+    return memo->slots + (index & memo->mask) * (memo->nargs + 2);
+}
+
+/* the stored result for key, or NULL */
+static inline long *py2c_memo_get(py2c_memo *memo, const long *key,
+                                  unsigned long hash) {
+    for (unsigned long i = 0; i < PY2C_MEMO_PROBES; i++) {
+        long *slot = py2c_memo_slot(memo, hash + i);
+        if ((unsigned long)slot[0] == hash &&
+                memcmp(slot + 1, key, memo->nargs * sizeof(long)) == 0)
+            return slot + 1 + memo->nargs;
+        if (slot[0] == 0)
+            return NULL;
+    }
+    return NULL;
+}
+
+static inline void py2c_memo_put(py2c_memo *memo, const long *key,
+                                 unsigned long hash, long value) {
+    long *slot = NULL;
+    for (unsigned long i = 0; i < PY2C_MEMO_PROBES; i++) {
+        long *candidate = py2c_memo_slot(memo, hash + i);
+        if (candidate[0] == 0) {
+            slot = candidate;
+            break;
+        }
+    }
+    if (slot == NULL)
+        slot = py2c_memo_slot(
+            memo, hash + memo->evictions++ % PY2C_MEMO_PROBES);
+    slot[0] = (long)hash;
+    memcpy(slot + 1, key, memo->nargs * sizeof(long));
+    slot[1 + memo->nargs] = value;
+}
+
+#endif
@@ -0,0 +1,123 @@
+/* py2c runtime: mixed mode, where python runs what py2c cannot translate.
+ *
+ * The functions that could not be translated are made from their marshalled
+ * code objects when the module is initialized, with the module as their
+ * globals. Translated code calls them through stubs that box the arguments
+ * and unbox the result. If the module code itself cannot be translated,
+ * python runs it as well, without the definitions of the functions that
+ * were translated. Exceptions raised in python propagate through the
+ * translated code like the ones it raises itself, see error.h.
+ */
+#ifndef PY2C_MIXED_H
+#define PY2C_MIXED_H
+
+#include <marshal.h>
+#include <string.h>
+
+/* jump back to the entry point of the module with the exception set */
+static inline _Noreturn void py2c_python_error(void) {
+    longjmp(py2c_error_jump, 1);
+}
+
+/* the globals of the code python runs, the dict of the module */
+static inline PyObject *py2c_python_globals(PyObject *module) {
+    PyObject *globals = PyModule_GetDict(module);
+    if (PyDict_GetItemString(globals, "__builtins__") == NULL &&
+        PyDict_SetItemString(globals, "__builtins__",
+                             PyEval_GetBuiltins()) < 0)
+        py2c_python_error();
+    return globals;
+}
+
+static inline PyObject *py2c_python_code(const char *code, Py_ssize_t size) {
+    PyObject *code_object = PyMarshal_ReadObjectFromString(code, size);
+    if (code_object == NULL)
+        py2c_python_error();
+    return code_object;
+}
+
+/* the function made from the marshalled code object, also stored in the
+ * module under name unless name is NULL */
+static inline PyObject *py2c_python_function(PyObject *module,
+                                             const char *name,
+                                             const char *code,
+                                             Py_ssize_t size) {
+    PyObject *code_object = py2c_python_code(code, size);
+    PyObject *func = PyFunction_New(code_object, py2c_python_globals(module));
+    Py_DECREF(code_object);
+    if (func == NULL ||
+        (name != NULL && PyObject_SetAttrString(module, name, func) < 0))
+        py2c_python_error();
+    return func;
+}
+
+/* run the marshalled module code in the module */
+static inline void py2c_run_python(PyObject *module, const char *code,
+                                   Py_ssize_t size) {
+    PyObject *code_object = py2c_python_code(code, size);
+    PyObject *globals = py2c_python_globals(module);
+    PyObject *result = PyEval_EvalCode(code_object, globals, globals);
+    Py_DECREF(code_object);
+    if (result == NULL)
+        py2c_python_error();
+    Py_DECREF(result);
+}
+
+/* call the function with the boxed arguments, which are released */
+static inline PyObject *py2c_call_python(PyObject *func, PyObject **args,
+                                         Py_ssize_t nargs) {
+    PyObject *result = NULL;
+    Py_ssize_t boxed = 0;
+    while (boxed < nargs && args[boxed] != NULL)
+        boxed++;
+    if (boxed == nargs)
+        result = PyObject_Vectorcall(func, args, nargs, NULL);
+    for (Py_ssize_t i = 0; i < nargs; i++)
+        Py_XDECREF(args[i]);
+    if (result == NULL)
+        py2c_python_error();
+    return result;
+}
+
+static inline long py2c_python_result_long(PyObject *result,
+                                           const char *func) {
+    long value;
+    int unboxed = py2c_unbox_long(result, &value, func, 0);
+    Py_DECREF(result);
+    if (!unboxed)
+        py2c_python_error();
+    return value;
+}
+
+static inline double py2c_python_result_double(PyObject *result,
+                                               const char *func) {
+    double value;
+    int unboxed = py2c_unbox_double(result, &value, func, 0);
+    Py_DECREF(result);
+    if (!unboxed)
+        py2c_python_error();
+    return value;
+}
+
+/* the string is copied, as the result is released */
+static inline char *py2c_python_result_str(PyObject *result,
+                                           const char *func) {
+    char *value;
+    int unboxed = py2c_unbox_str(result, &value, func, 0);
+    if (unboxed && (value = strdup(value)) == NULL) {
+        PyErr_NoMemory();
+        unboxed = 0;
+    }
+    Py_DECREF(result);
+    if (!unboxed)
+        py2c_python_error();
+    return value;
+}
+
+static inline void py2c_python_result_none(PyObject *result,
+                                           const char *func) {
+    (void)func;
+    Py_DECREF(result);
+}
+
+#endif
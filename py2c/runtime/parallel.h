@@ -0,0 +1,22 @@
+/* py2c runtime: the loops translated with --parallel run on several threads
+ * through OpenMP, compile with -fopenmp.
+ *
+ * Without it the pragmas are ignored and each loop runs on one thread, so
+ * the OpenMP functions the loops call are defined for a single thread.
+ */
+#ifndef PY2C_PARALLEL_H
+#define PY2C_PARALLEL_H
+
+#ifdef _OPENMP
+#include <omp.h>
+#else
+static inline int omp_get_max_threads(void) {
+    return 1;
+}
+
+static inline int omp_get_thread_num(void) {
+    return 0;
+}
+#endif
+
+#endif
@@ -0,0 +1,78 @@
+/* py2c runtime: views of arrays of numbers.
+ *
+ * A view is a pointer into memory owned by someone else, with the number
+ * of items and the distance in bytes between them. The memory is a numpy
+ * array, an array.array or a memoryview passed to a function of an
+ * extension module, or a list passed to a function taking an array. Since
+ * items can be any number of bytes apart, a view of every other item, or
+ * of a column of a matrix, needs no copy. Views are passed by value.
+ */
+#ifndef PY2C_VIEW_H
+#define PY2C_VIEW_H
+
+typedef struct {
+    char *data;
+    long size;
+    long stride;  /* in bytes */
+} py2c_view;
+
+/* the position of view[index], counting negative indices from the end */
+static inline long py2c_view_index(py2c_view view, long index) {
+    if (index < 0)
+        index += view.size;
+    if (index < 0 || index >= view.size)
+        py2c_raise("IndexError", "array index out of range");
+    return index;
+}
+
+#ifdef PY2C_LIST_H
+#define PY2C_VIEW_FROM_LIST(T)                                               \
+static inline py2c_view py2c_view_from_list_##T(py2c_list *list) {           \
+    py2c_view view = {list->data, list->size, sizeof(T)};                    \
+    return view;                                                             \
+}
+
+PY2C_VIEW_FROM_LIST(long)
+PY2C_VIEW_FROM_LIST(double)
+#endif
+
+#ifdef PY2C_EXTENSION
+#include <string.h>
+
+/* view the argument, which has to support the buffer protocol with one
+ * dimension of items of one of the formats, without copying it. On success
+ * the buffer has to be released with py2c_release_buffer once the call is
+ * over. Buffers that are written to have to be writable */
+static inline int py2c_unbox_view(PyObject *arg, py2c_view *view,
+                                  Py_buffer *buffer, const char *formats,
+                                  Py_ssize_t itemsize, int writable,
+                                  const char *func, int index) {
+    int flags = PyBUF_STRIDES | PyBUF_FORMAT;
+    if (writable)
+        flags |= PyBUF_WRITABLE;
+    if (PyObject_GetBuffer(arg, buffer, flags) < 0)
+        return 0;
+    const char *format = buffer->format[0] == '@' ? buffer->format + 1
+                                                   : buffer->format;
+    if (buffer->ndim != 1 || buffer->itemsize != itemsize ||
+        !format[0] || format[1] || !strchr(formats, format[0])) {
+        PyErr_Format(PyExc_TypeError,
+                     "%s() argument %d must be a one dimensional buffer of "
+                     "format '%c', not '%s' with %d dimensions",
+                     func, index, formats[0], buffer->format, buffer->ndim);
+        PyBuffer_Release(buffer);
+        return 0;
+    }
+    view->data = buffer->buf;
+    view->size = buffer->shape[0];
+    view->stride = buffer->strides[0];
+    return 1;
+}
+
+static inline void py2c_release_buffer(Py_buffer *buffer) {
+    if (buffer->obj != NULL)
+        PyBuffer_Release(buffer);
+}
+#endif
+
+#endif
@@ -1,41 +1,530 @@
-import dis, inspect, types
-from py2c.ir import FunctionBlock, Assignment, \
-    Variable, FunctionPointer, FunctionCall, Print, \
-    IfStatement, Range, ForLoop
+import ast, dis, inspect, io, marshal, os, re, shutil, tempfile, types, \
+    typing
+from py2c import array
+from py2c.cfg import ControlFlowGraph, Structurer, JUMP_OPS
+from py2c.constants import ConstantPropagation, is_constant, global_stores, \
+    PURE_OPS
+from py2c.profiler import type_name
+from py2c.inference import TypeInference, STR_TO_TYPE, NUMERIC_TYPES, \
+    RESIZING_METHODS, assignable, function_signature, previous_instruction, \
+    join, is_list, list_of, element_type, is_dict, dict_of, key_type, \
+    value_type, is_tuple, tuple_of, item_types, tuple_index, is_array, \
+    writes_arrays, profiled_signature, profile_key, is_generic, specialize
+from py2c.ir import FunctionBlock, StatementBuffer, BlockStatements, \
+    Assignment, \
+    Variable, StackVariable, Constant, FunctionPointer, FunctionCall, Print, \
+    Range, Len, ForLoop, ListLoop, ListItem, Length, ListMethod, ViewItem, \
+    ViewLoop, \
+    ArrayLiteral, DictMethod, DictView, DictLoop, TupleLiteral, TupleItem, \
+    BuildClass, ClassType, InstanceType, BoundMethod, FieldAccess, \
+    BinaryOperation, UnaryOperation, Branch, Jump, negate, \
+    Label, Return, TailCall, InlineReturn, Module, Decorator, \
+    GenericFunction, ParallelLoop, DECORATORS, ANNOTATIONS
 
 DEBUG = False
 
+# functions of up to this many bytecode instructions are inlined
+INLINE_MAX_INSTRUCTIONS = 60
+
+# entries in the memo table of a memoized function without a maxsize
+MEMO_CAPACITY = 1 << 16
+# the maxsize of functools.lru_cache when none is given
+LRU_CACHE_MAXSIZE = 128
+# runtime headers in py2c/runtime, copied into the programs that use them
+RUNTIME_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'runtime')
+# tuples are structs named after the slot letters of their item types, such
+# as py2c_tuple_ld for tuple[int, float]
+TUPLE_STRUCT = 'py2c_tuple_'
+# bytecode the loops run in parallel may contain, see parallel_loop
+PARALLEL_OPS = PURE_OPS - {'RETURN_VALUE'} | {
+    'LOAD_NAME', 'LOAD_GLOBAL', 'STORE_NAME'
+}
+# the comparisons of `if value > variable: variable = value` that make it a
+# maximum or a minimum, by whether the variable is on the right
+EXTREMES = {
+    True: {'>': 'max', '>=': 'max', '<': 'min', '<=': 'min'},
+    False: {'<': 'max', '<=': 'max', '>': 'min', '>=': 'min'}
+}
+
+
+# describe a code object independently of its filename and line numbers, so
+# that editing one function does not change the fingerprint of the others
+def code_fingerprint(code):
+    consts = []
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            consts.append(code_fingerprint(const))
+        else:
+            consts.append((type(const).__name__, repr(const)))
+    return repr((code.co_name, code.co_code, code.co_names, code.co_varnames,
+                 code.co_argcount, code.co_kwonlyargcount, code.co_flags,
+                 code.co_freevars, code.co_cellvars, consts))
+
+
+# every global name referenced by the code object or its nested functions
+def referenced_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= referenced_names(const)
+    return names
+
+
+# every opcode name used by the code object or its nested functions
+def referenced_opnames(code):
+    opnames = {instr.opname for instr in dis.get_instructions(code)}
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            opnames |= referenced_opnames(const)
+    return opnames
+
+
+# whether the code object or its nested functions build dicts, function
+# annotations are built as dicts as well but only passed to MAKE_FUNCTION
+def builds_dicts(code):
+    instructions = list(dis.get_instructions(code))
+    for instr, next_instr in zip(instructions, instructions[1:] + [None]):
+        if instr.opname == 'BUILD_MAP' or \
+                instr.opname == 'BUILD_CONST_KEY_MAP' and not isinstance(
+                    next_instr.argval, types.CodeType):
+            return True
+    return any(
+        builds_dicts(const) for const in code.co_consts
+        if isinstance(const, types.CodeType))
+
+
+# the variable an instruction loads, stores or deletes, module level names
+# and globals being the same
+def variable_key(instr):
+    if instr.opname in ('LOAD_FAST', 'STORE_FAST', 'DELETE_FAST'):
+        return ('fast', instr.arg)
+    if instr.opname in ('LOAD_NAME', 'STORE_NAME', 'DELETE_NAME',
+                        'LOAD_GLOBAL', 'STORE_GLOBAL', 'DELETE_GLOBAL'):
+        return ('name', instr.argval)
+    return None
+
+
+# whether the function calls itself
+def is_recursive(code):
+    return code.co_name in code.co_names
+
+
+# whether the expression is made of literals only, so a call cannot change
+# its value
+def is_literal(expr):
+    if isinstance(expr, TupleLiteral):
+        return all(is_literal(item) for item in expr.items)
+    return isinstance(expr, Constant)
+
+
+# c types of python types, including the struct of every tuple type and the
+# struct pointer of every class
+class CTypeMap(dict):
+    def __missing__(self, py_type):
+        if isinstance(py_type, InstanceType):
+            return f'struct {py_type.cls.name}*'
+        if not is_tuple(py_type):
+            raise KeyError(py_type)
+        return TUPLE_STRUCT + ''.join(
+            FunctionTranslator.C_TYPES[self[_type]]
+            for _type in item_types(py_type))
+
+    def get(self, py_type, default=None):
+        try:
+            return self[py_type]
+        except (KeyError, TypeError):
+            return default
+
+    def __contains__(self, py_type):
+        return self.get(py_type) is not None
+
+
+# write the typedefs of the tuple structs among the c types. Each function
+# defines the structs it uses before itself, so that its translation is
+# complete on its own when it comes from the cache, and the guards keep the
+# structs that several functions use from being defined twice
+def write_structs(c_types, out):
+    letters = {
+        letter: c_type
+        for c_type, letter in FunctionTranslator.C_TYPES.items()
+    }
+    for c_type in sorted(set(c_types)):
+        if not c_type.startswith(TUPLE_STRUCT):
+            continue
+        fields = ''.join(
+            f'{letters[letter]} f{i}; '
+            for i, letter in enumerate(c_type[len(TUPLE_STRUCT):]))
+        guard = c_type.upper()
+        out.write(f'#ifndef {guard}\n#define {guard}\n'
+                  f'typedef struct {{ {fields}}} {c_type};\n#endif\n')
+
+
+# the c return type and parameter list of a function, functions annotated
+# with `-> None` return void
+def function_head(func_sig):
+    params = ', '.join(
+        f'{FunctionTranslator.C_TYPE_MAP[param[0]]} {param[1]}'
+        for param in func_sig[:-1])
+    ret_type = 'void' if func_sig[-1][0] is type(None) else \
+        FunctionTranslator.C_TYPE_MAP[func_sig[-1][0]]
+    return ret_type, params
+
+
+# how the arguments of the functions of an extension module are unboxed, and
+# their results boxed, see runtime/extension.h
+UNBOX_FUNCTIONS = {
+    int: 'py2c_unbox_long',
+    bool: 'py2c_unbox_long',
+    float: 'py2c_unbox_double',
+    str: 'py2c_unbox_str'
+}
+BOX_FUNCTIONS = {
+    int: 'PyLong_FromLong',
+    bool: 'PyBool_FromLong',
+    float: 'PyFloat_FromDouble',
+    str: 'PyUnicode_FromString'
+}
+# converts the result of a function run by python in mixed mode
+PYTHON_RESULT_FUNCTIONS = {
+    int: 'py2c_python_result_long',
+    bool: 'py2c_python_result_long',
+    float: 'py2c_python_result_double',
+    str: 'py2c_python_result_str',
+    type(None): 'py2c_python_result_none'
+}
+
+
+# whether an extension module can export the function, which needs a
+# python counterpart of its parameters and its result
+def exportable(fp):
+    return all(param[0] in UNBOX_FUNCTIONS or is_array(param[0])
+               for param in fp.func_sig[:-1]) and (
+                   fp.func_sig[-1][0] in BOX_FUNCTIONS or
+                   fp.func_sig[-1][0] is type(None))
+
+
+# the module source with only the statements that define something
+# translatable: imports, functions, classes and names assigned a literal
+# once. In mixed mode these are translated when the rest of the module is not
+def module_definitions(tree):
+    assignments = {}
+    for statement in tree.body:
+        for node in ast.walk(statement):
+            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+                assignments[node.id] = assignments.get(node.id, 0) + 1
+            elif isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+                assignments[node.name] = assignments.get(node.name, 0) + 1
+
+    def is_literal(node):
+        if isinstance(node, ast.UnaryOp):
+            node = node.operand
+        return isinstance(node, ast.Constant)
+
+    body = []
+    for statement in tree.body:
+        if isinstance(statement, ast.Assign):
+            targets = statement.targets
+        elif isinstance(statement, ast.AnnAssign) and statement.value:
+            targets = [statement.target]
+        else:
+            targets = None
+        if isinstance(statement, (ast.Import, ast.ImportFrom, ast.FunctionDef,
+                                  ast.ClassDef)) or targets and all(
+                                      isinstance(target, ast.Name) and
+                                      assignments[target.id] == 1
+                                      for target in targets) and is_literal(
+                                          statement.value):
+            body.append(statement)
+    return ast.Module(body=body, type_ignores=[])
 
-class CodeTranslator:
-    def __init__(self, code):
-        self.code = code
-        self.includes = ['<stdio.h>']
 
-    def translate(self):
-        output = ''
+# the module source without the definitions of the translated functions
+def python_body(tree, translated):
+    return ast.Module(body=[
+        statement for statement in tree.body
+        if not (isinstance(statement, ast.FunctionDef) and
+                statement.name in translated)
+    ], type_ignores=[])
 
-        # list files to include
-        for include in self.includes:
-            output += f'#include {include}\n'
 
-        compiled_code, func_table = FunctionTranslator(
-            code=self.code, func_sig=[]).translate()
+# the bytes as a c string literal, split over lines
+def c_bytes(data):
+    return '\n'.join('"' + ''.join(f'\\{byte:03o}'
+                                   for byte in data[start:start + 32]) + '"'
+                     for start in range(0, len(data), 32)) or '""'
 
-        # handle function table
-        for func_decl in func_table:
-            output += func_decl + '\n'
 
+class CodeTranslator:
+    # memoize_pure also memoizes the recursive functions on integers that
+    # only compute a value from their arguments. With a module name, the
+    # output is a python extension module of that name instead of a program.
+    # With the python source of the code, what cannot be translated is run
+    # by python (mixed mode), which programs embed. A profile from
+    # profiler.load_profile gives the types of the unannotated functions.
+    # parallel is the number of threads the loops with independent
+    # iterations run on (0 for as many as OpenMP chooses), or None to run
+    # them serially. vectorize writes the loops so that the c compiler can
+    # vectorize them, marking each with its python line, see
+    # compile.vectorization_report. After translate, tail_calls lists the
+    # (name, kind) of the functions whose recursion runs as a loop
+    def __init__(self, code, cache=None, memoize_pure=False, module=None,
+                 source=None, profile=None, parallel=None, vectorize=False):
+        self.code = code
+        self.cache = cache
+        self.memoize_pure = memoize_pure
+        self.source = source
+        self.profile = profile
+        self.parallel = parallel
+        self.vectorize = vectorize
+        self.tail_calls = []
+        self.embedded = source is not None and module is None
+        if self.embedded:
+            module = '__main__'
+        self.module = module
+        self.includes = ['<stdio.h>']
+        self.runtime = []
+        if memoize_pure or referenced_names(code) & {'lru_cache', 'cache'}:
+            self.runtime.append('memo.h')
+        # functions can take lists and dicts without building any
+        if 'BUILD_LIST' in referenced_opnames(code) or \
+                'list' in referenced_names(code):
+            self.runtime.append('list.h')
+        if builds_dicts(code) or 'dict' in referenced_names(code):
+            self.runtime.append('dict.h')
+        if 'array' in referenced_names(code):
+            self.runtime.append('view.h')
+        # instances are allocated by the constructors, which raise
+        # MemoryError, and extension modules raise every error in python
+        if self.runtime or module is not None or \
+                'LOAD_BUILD_CLASS' in referenced_opnames(code):
+            self.runtime.insert(0, 'error.h')
+        if module is not None:
+            self.runtime.append('extension.h')
+        if source is not None:
+            self.runtime.append('mixed.h')
+        if parallel is not None:
+            self.runtime.append('parallel.h')
+
+    # write the c program to out as it is generated,
+    # or return it as a string if no file object is given
+    def translate(self, out=None):
+        if out is None:
+            out = io.StringIO()
+            self.translate(out)
+            return out.getvalue()
+
+        if self.module is not None:
+            out.write('#define PY_SSIZE_T_CLEAN\n#include <Python.h>\n'
+                      '#define PY2C_EXTENSION\n')
+        # list files to include
+        for include in self.includes:
+            out.write(f'#include {include}\n')
+        if self.module is not None:
+            # print writes to sys.stdout, like in python
+            out.write('#define printf PySys_WriteStdout\n')
+        for header in self.runtime:
+            with open(os.path.join(RUNTIME_DIR, header)) as readfile:
+                shutil.copyfileobj(readfile, out)
+
+        # function declarations are written out as they are translated
+        if self.source is None:
+            code, tree = self.code, None
+            translator = self.translate_module(code, out)
+        else:
+            code, tree, translator, declarations = self.translate_mixed()
+            out.write(declarations)
+        fb = translator.fb
+        self.tail_calls = translator.globals['tail_calls']
+
+        write_structs(fb.c_types(), out)
+        if self.module is not None:
+            self.write_module(code, translator, out, tree)
+        if self.embedded:
+            # the module is run by the python embedded in the program
+            out.write('int main(int argc, char* argv[]){\n'
+                      'Py_Initialize();\n'
+                      f'PyObject* module = PyInit_{self.module}();\n'
+                      'int status = module == NULL;\n'
+                      'if (status) {\nPyErr_Print();\n}\n'
+                      'Py_XDECREF(module);\n'
+                      'if (Py_FinalizeEx() < 0) {\nstatus = 120;\n}\n'
+                      'return status;\n}\n')
+        if self.module is not None:
+            return
         # add main function declaration to main method
-        output += 'int main(int argc, char* argv[]){\n'
-        output += compiled_code
-        output += 'return 0;\n}\n'
-
-        return output
+        out.write('int main(int argc, char* argv[]){\n')
+        fb.write(out)
+        out.write('return 0;\n}\n')
+
+    # translate the module code, writing the functions to out
+    def translate_module(self, code, out):
+        translator = FunctionTranslator(code=code, func_sig=[],
+                                        cache=self.cache, out=out,
+                                        memoize_pure=self.memoize_pure,
+                                        mixed=self.source is not None,
+                                        profile=self.profile,
+                                        parallel=self.parallel,
+                                        vectorize=self.vectorize)
+        translator.translate()
+        translator.write_clones()
+        return translator
+
+    # Mixed mode: translate the module code, or only its definitions if
+    # python has to run it. That is when it does not translate, or when the
+    # functions python runs use module level names other than the functions
+    # of the module. Returns the code translated, the tree of the module
+    # code python runs (or None), the translator and the functions
+    def translate_mixed(self):
+        tree = ast.parse(self.source)
+        out = io.StringIO()
+        try:
+            translator = self.translate_module(self.code, out)
+            if not self.needs_python_body(self.code, translator):
+                return self.code, None, translator, out.getvalue()
+        except Exception:
+            pass
+        code = compile(module_definitions(tree), self.code.co_filename,
+                       'exec', dont_inherit=True)
+        out = io.StringIO()
+        translator = self.translate_module(code, out)
+        return code, tree, translator, out.getvalue()
+
+    # whether the functions run by python use the module level names that
+    # only exist in c
+    def needs_python_body(self, code, translator):
+        available = set()
+        for name, fp in zip(code.co_names, translator.fb.local_vars):
+            if isinstance(fp, FunctionPointer) and name == fp.name and (
+                    fp.python_code is not None or exportable(fp)):
+                available.add(name)
+        used = set()
+        for fp, _ in translator.globals['python_functions']:
+            used |= referenced_names(fp.python_code)
+        module_names = {
+            code.co_names[name_idx]
+            for name_idx in translator.types.name_types
+        }
+        return bool(used & module_names - available)
+
+    # write a function per module level function that unboxes the python
+    # arguments, calls it and boxes the result, the method table listing
+    # them, and the init function of the module, which runs the module
+    # level code. In mixed mode, the init function first makes the
+    # functions run by python, and python runs the module level code given
+    # as tree, if any
+    def write_module(self, code, translator, out, tree=None):
+        fb = translator.fb
+        global_types = translator.globals['types']
+        methods = []
+        translated = set()
+        for name, fp in zip(code.co_names, fb.local_vars):
+            if isinstance(fp, FunctionPointer) and name == fp.name and \
+                    fp.python_code is None and \
+                    self.write_wrapper(fp, global_types, out,
+                                       self.source is not None):
+                methods.append(f'{{"{name}", (PyCFunction)(void (*)(void))'
+                               f'py2c_wrap_{name}, METH_FASTCALL, NULL}},\n')
+                translated.add(name)
+        python_functions = translator.globals['python_functions']
+        for fp, _ in python_functions:
+            out.write(f'static const char py2c_code_{fp.name}[] = '
+                      f'{c_bytes(marshal.dumps(fp.python_code))};\n')
+        if tree is not None:
+            body = compile(python_body(tree, translated),
+                           self.code.co_filename, 'exec', dont_inherit=True)
+            out.write('static const char py2c_code[] = '
+                      f'{c_bytes(marshal.dumps(body))};\n')
+        out.write('static PyMethodDef py2c_methods[] = {\n' +
+                  ''.join(methods) + '{NULL, NULL, 0, NULL}\n};\n'
+                  'static struct PyModuleDef py2c_module = {\n'
+                  f'PyModuleDef_HEAD_INIT, "{self.module}", NULL, -1, '
+                  'py2c_methods\n};\n'
+                  f'PyMODINIT_FUNC PyInit_{self.module}(void) {{\n'
+                  'PyObject* module = PyModule_Create(&py2c_module);\n'
+                  'if (module == NULL) {\nreturn NULL;\n}\n'
+                  'if (setjmp(py2c_error_jump)) {\n'
+                  'Py_DECREF(module);\nreturn NULL;\n}\n')
+        for fp, qualname in python_functions:
+            # nested functions are not module attributes
+            name = 'NULL' if '.' in qualname else f'"{qualname}"'
+            out.write(f'py2c_python_{fp.name} = py2c_python_function('
+                      f'module, {name}, py2c_code_{fp.name}, '
+                      f'sizeof(py2c_code_{fp.name}) - 1);\n')
+        if tree is None:
+            fb.write(out)
+        else:
+            out.write('py2c_run_python(module, py2c_code, '
+                      'sizeof(py2c_code) - 1);\n')
+        out.write('return module;\n}\n')
+
+    # write the wrapper of the function, or return False if its parameters
+    # or its result have no python counterpart. Arrays view the buffers of
+    # the arguments, which are released once the call returns. With nested,
+    # the function may be called from python called by translated code, so
+    # the jump back to the caller is restored on return
+    @staticmethod
+    def write_wrapper(fp, global_types, out, nested=False):
+        if not exportable(fp):
+            return False
+        param_types = [param[0] for param in fp.func_sig[:-1]]
+        ret_type = fp.func_sig[-1][0]
+        arrays = [i for i, _type in enumerate(param_types) if is_array(_type)]
+        writable = int(bool(arrays) and writes_arrays(fp, global_types))
+        out.write(f'static PyObject* py2c_wrap_{fp.name}(PyObject* module, '
+                  'PyObject* const* args, Py_ssize_t nargs) {\n'
+                  'PyObject* result = NULL;\n')
+        for i, _type in enumerate(param_types):
+            out.write(f'{FunctionTranslator.C_TYPE_MAP[_type]} arg{i};\n')
+            if is_array(_type):
+                out.write(f'Py_buffer buffer{i} = {{NULL}};\n')
+        checks = [f'py2c_check_nargs("{fp.name}", nargs, {len(param_types)})']
+        for i, _type in enumerate(param_types):
+            if is_array(_type):
+                # the buffer formats of longs and doubles
+                formats = 'lq' if element_type(_type) is int else 'd'
+                item_c_type = FunctionTranslator.C_TYPE_MAP[element_type(
+                    _type)]
+                checks.append(
+                    f'py2c_unbox_view(args[{i}], &arg{i}, &buffer{i}, '
+                    f'"{formats}", sizeof({item_c_type}), {writable}, '
+                    f'"{fp.name}", {i + 1})')
+            else:
+                checks.append(f'{UNBOX_FUNCTIONS[_type]}(args[{i}], &arg{i}, '
+                              f'"{fp.name}", {i + 1})')
+        call = FunctionCall(fp.name, [
+            Variable(f'arg{i}', '') for i in range(len(param_types))
+        ])
+        if ret_type is type(None):
+            result = f'{call};\nPy_INCREF(Py_None);\nresult = Py_None;\n'
+        else:
+            result = f'result = {BOX_FUNCTIONS[ret_type]}({call});\n'
+        if nested:
+            out.write('jmp_buf caller_jump;\n'
+                      'memcpy(caller_jump, py2c_error_jump, sizeof(jmp_buf));\n')
+        # errors raised by the function come back to the setjmp
+        out.write(f'if ({" && ".join(checks)}) {{\n'
+                  'if (setjmp(py2c_error_jump) == 0) {\n'
+                  f'{result}}}\n}}\n')
+        if nested:
+            out.write('memcpy(py2c_error_jump, caller_jump, sizeof(jmp_buf));\n')
+        for i in arrays:
+            out.write(f'py2c_release_buffer(&buffer{i});\n')
+        out.write('return result;\n}\n')
+        return True
 
 
 class FunctionTranslator:
-    C_TYPES = ['long', 'double', 'char*']
-    C_TYPE_MAP = {
+    # c types, with the letter that names their stack slot variables
+    C_TYPES = {
+        'long': 'l',
+        'double': 'd',
+        'char*': 'c',
+        'py2c_list*': 'p',
+        'py2c_dict*': 'h',
+        'py2c_view': 'v'
+    }
+    C_TYPE_MAP = CTypeMap({
         int: 'long',
         'int': 'long',
         float: 'double',
@@ -43,15 +532,55 @@ class FunctionTranslator:
         str: 'char*',
         'str': 'char*',
         bool: 'long',
-        'bool': 'long'
-    }
-    STR_TO_TYPE = {'int': int, 'float': float, 'str': str, 'bool': bool}
-    NUMERIC_TYPES = [int, float, bool]
-
-    def __init__(self, code, func_sig, globals_=None):
-        self.opcode_map = lambda name: getattr(self, name)
-
-        self.func_decls = []
+        'bool': 'long',
+        # lists are passed by reference, whatever their element type
+        list: 'py2c_list*',
+        list[int]: 'py2c_list*',
+        list[float]: 'py2c_list*',
+        dict: 'py2c_dict*',
+        dict[int, int]: 'py2c_dict*',
+        dict[int, float]: 'py2c_dict*',
+        dict[str, int]: 'py2c_dict*',
+        # arrays are views passed by value
+        array[int]: 'py2c_view',
+        array[float]: 'py2c_view'
+    })
+    STR_TO_TYPE = STR_TO_TYPE
+    NUMERIC_TYPES = NUMERIC_TYPES
+    # handler of each opcode, filled in after the class
+    OPCODE_TABLE: typing.ClassVar[dict] = {}
+
+    def __init__(self, code, func_sig, globals_=None, cache=None, out=None,
+                 prefix='', memoize_pure=False, memoized=False, mixed=False,
+                 profile=None, profiled=False, parallel=None, in_loop=False,
+                 vectorize=False):
+        # BuildCache holding the translations of unchanged function bodies
+        self.cache = cache
+
+        # prepended to the names of the variables and labels, set when the
+        # function is inlined into another one
+        self.prefix = prefix
+
+        # declarations of nested functions are written here
+        self.out = out
+
+        # recursive calls of memoized functions have to go through the memo
+        # table, so they are not turned into loops
+        self.memoized = memoized
+
+        # whether func_sig was recorded by a type profile, see
+        # guard_profiled
+        self.profiled = profiled
+
+        # whether the function is inlined into a loop, whose loops are then
+        # not run in parallel, see parallel_loop
+        self.in_loop = in_loop
+
+        # the clones of generic functions declared in out, see declare_clone
+        self.declared_clones = set()
+
+        # module level names declared static const, see write_globals
+        self.const_names = set()
 
         self.code = code
         self.func_sig = func_sig
@@ -63,7 +592,32 @@ class FunctionTranslator:
         if not self.globals:
             self.globals = {
                 'names': self.code.co_names,
-                'locals': self.fb.local_vars
+                # position of each name, so lookups don't scan co_names
+                'index': {
+                    name: i for i, name in enumerate(self.code.co_names)
+                },
+                'locals': self.fb.local_vars,
+                # code objects being translated, which are not inlined again
+                'active': [],
+                # number of calls inlined so far into the function being
+                # translated, to name their variables
+                'inlined': 0,
+                'memoize_pure': memoize_pure,
+                # in mixed mode, the functions that could not be translated
+                # are run by python, see run_by_python
+                'mixed': mixed,
+                'python_functions': [],
+                # the types recorded by profiler.py, by profile_key
+                'profile': profile,
+                # the threads of the loops run in parallel, see
+                # parallel_loop
+                'parallel': parallel,
+                # whether loops are written for the vectorizer, see
+                # vectorize_loop and localize
+                'vectorize': vectorize,
+                # (name, kind) of the functions whose recursion runs as a
+                # loop, see convert_tail_calls
+                'tail_calls': []
             }
 
         # current instruction index and instruction
@@ -73,36 +627,133 @@ class FunctionTranslator:
         # current types on the stack
         self.stack_types = []
 
-        self.instructions = list(dis.get_instructions(self.code))
+        # assignments to stack slots that have not been emitted yet, by depth
+        self.pending = {}
+        # stack slots that need a declaration
+        self.used_stack_vars = {}
 
+        self.instructions = list(dis.get_instructions(self.code))
+        self.cfg = ControlFlowGraph(self.instructions, prefix)
+        self.types = TypeInference(self.code, self.cfg, self.instructions,
+                                   func_sig, self.globals.get('types', {}),
+                                   self.globals['mixed'],
+                                   self.globals['profile'])
+        self.constants = ConstantPropagation(self.code, self.cfg,
+                                             self.instructions, self.types,
+                                             self.globals.get('env'),
+                                             self.globals.get('pure'))
+        if not globals_:
+            # nested functions see the module level names with these types
+            # and values
+            self.globals['types'] = {
+                self.code.co_names[name_idx]: _type
+                for name_idx, _type in self.types.name_types.items()
+            }
+            self.globals['env'] = self.constants.env
+            self.globals['pure'] = self.constants.pure
+        if self.globals['vectorize']:
+            self.fb.statements.names = set()  # see localize
+        # the statements of the blocks, in the order they are translated,
+        # and those of the basic block being translated
+        self.block_statements = StatementBuffer()
+        self.statements = None
+
+        # stack depth before each instruction, following the jumps
         self.stack_depths = []
+        block_depths = {self.cfg.entry: 0}
         depth = 0
-        for instruction in self.instructions:
-            self.stack_depths.append(depth)
-            depth += dis.stack_effect(instruction.opcode, instruction.arg)
-
-        # top of stack is the next closing bracket we need to add
-        # this was Ben's idea
-        self.for_stack = [-1]
+        for block in self.cfg.blocks:
+            # unreachable blocks just continue from the previous one
+            depth = block_depths.get(block, depth)
+            for instruction in block.instructions:
+                self.stack_depths.append(depth)
+                if instruction.opcode in JUMP_OPS:
+                    target = self.cfg.block_at[instruction.argval]
+                    block_depths.setdefault(
+                        target, depth + dis.stack_effect(
+                            instruction.opcode, instruction.arg, jump=True))
+                depth += dis.stack_effect(instruction.opcode,
+                                          instruction.arg,
+                                          jump=False)
 
         # global for-loop counter
         self.gflc = -1
 
+        # block being translated
+        self.block = None
+        # (loop, list, index) for the loops whose index is always in range
+        self.ranged_loops = self.find_ranged_loops()
+        # the block of each instruction in the body of the loop that
+        # parallel_loop looks at
+        self.parallel_blocks = {}
+
+        if prefix:
+            # inlined returns store their value here and jump to the end
+            ret_type = func_sig[-1][0]
+            self.result = Variable(f'{prefix}ret',
+                                   self.C_TYPE_MAP.get(ret_type, ''))
+            self.end = Label(f'{prefix}end')
+
+    # the instruction count instructions before the current one,
+    # not counting EXTENDED_ARG prefixes
+    def previous_instruction(self, count):
+        return previous_instruction(self.instructions, self.instr_idx, count)
+
+    def next_instruction(self):
+        idx = self.instr_idx + 1
+        while self.instructions[idx].opcode == dis.EXTENDED_ARG:
+            idx += 1
+        return self.instructions[idx]
+
+    # the variable of the stack slot when it holds a value of type _type
+    def stack_var(self, stack_var_idx, _type):
+        c_type = self.C_TYPE_MAP[_type]
+        if c_type in self.C_TYPES:
+            letter = self.C_TYPES[c_type]
+        elif c_type.startswith(TUPLE_STRUCT):
+            letter = 't' + c_type[len(TUPLE_STRUCT):]
+        else:
+            # struct Name*
+            letter = f'o_{_type.cls.name}_'
+        return StackVariable(f'{self.prefix}s{letter}{stack_var_idx}', c_type,
+                             stack_var_idx)
+
     # return the variable corresponding to the result of the instruction
     # based on current stack depth and variable type
     def res_stack_var(self, _type):
-        cur_depth = self.stack_depths[self.instr_idx + 1]
-        c_type = self.C_TYPE_MAP[_type]
-        return Variable(f's{c_type[0]}{cur_depth - 1}', c_type)
+        cur_depth = self.stack_depths[self.instr_idx] + dis.stack_effect(
+            self.cur_instr.opcode, self.cur_instr.arg, jump=False)
+        return self.stack_var(cur_depth - 1, _type)
 
     # get the stack var at the offset from the top of the stack
     # get_stack_var(1) returns variable corresponding to TOS1
+    # if the value has not been stored to its stack slot yet, the pending
+    # expression is returned instead so it can be nested into the consumer
     def get_stack_var(self, offset):
         stack_var_idx = self.stack_depths[self.instr_idx] - offset - 1
         assert stack_var_idx >= 0
-        stack_var_type = self.stack_types[stack_var_idx]
-        c_type = self.C_TYPE_MAP[stack_var_type]
-        return Variable(f's{c_type[0]}{stack_var_idx}', c_type)
+        if stack_var_idx in self.pending:
+            return self.pending.pop(stack_var_idx).rhs
+        stack_var = self.stack_var(stack_var_idx,
+                                   self.stack_types[stack_var_idx])
+        self.used_stack_vars[stack_var.name] = stack_var
+        return stack_var
+
+    # hold back the assignment to a stack slot until its value is consumed
+    def defer(self, assignment):
+        if not assignment.rhs.pure or not is_literal(assignment.rhs) and \
+                not all(pending.rhs.pure for pending in self.pending.values()):
+            # keep calls in program order, and ahead of the reads after them,
+            # since c does not order the arguments of a call
+            self.flush_stack()
+        self.pending[assignment.lhs.index] = assignment
+
+    # store every pending expression to its stack slot
+    def flush_stack(self):
+        for stack_var_idx in sorted(self.pending):
+            assignment = self.pending.pop(stack_var_idx)
+            self.used_stack_vars[assignment.lhs.name] = assignment.lhs
+            self.statements.append(assignment)
 
     def BINARY_ADD(self):
         lhs_type = self.stack_types[-2]
@@ -123,8 +774,10 @@ class FunctionTranslator:
         self.stack_types.pop()
         self.stack_types.append(res_type)
 
-        return Assignment(stack_var,
-                          f'{lhs_stack_var.name} + {rhs_stack_var.name}')
+        return Assignment(
+            stack_var,
+            BinaryOperation(lhs_stack_var, '+', rhs_stack_var,
+                            stack_var.type))
 
     def BINARY_FLOOR_DIVIDE(self):
         lhs_type = self.stack_types[-2]
@@ -145,8 +798,10 @@ class FunctionTranslator:
         self.stack_types.pop()
         self.stack_types.append(res_type)
 
-        return Assignment(stack_var,
-                          f'{lhs_stack_var.name} / {rhs_stack_var.name}')
+        return Assignment(
+            stack_var,
+            BinaryOperation(lhs_stack_var, '/', rhs_stack_var,
+                            stack_var.type))
 
     def BINARY_MODULO(self):
         lhs_type = self.stack_types[-2]
@@ -167,12 +822,18 @@ class FunctionTranslator:
         self.stack_types.pop()
         self.stack_types.append(res_type)
 
-        return Assignment(stack_var,
-                          f'{lhs_stack_var.name} % {rhs_stack_var.name}')
+        return Assignment(
+            stack_var,
+            BinaryOperation(lhs_stack_var, '%', rhs_stack_var,
+                            stack_var.type))
 
     def BINARY_MULTIPLY(self):
         lhs_type = self.stack_types[-2]
         rhs_type = self.stack_types[-1]
+        if is_list(lhs_type) and rhs_type in (int, bool):
+            return self.repeat_list(1, 0)
+        if is_list(rhs_type) and lhs_type in (int, bool):
+            return self.repeat_list(0, 1)
         if (lhs_type not in FunctionTranslator.NUMERIC_TYPES) or (
                 rhs_type not in FunctionTranslator.NUMERIC_TYPES):
             raise Exception(
@@ -189,8 +850,63 @@ class FunctionTranslator:
         self.stack_types.pop()
         self.stack_types.append(res_type)
 
-        return Assignment(stack_var,
-                          f'{lhs_stack_var.name} * {rhs_stack_var.name}')
+        return Assignment(
+            stack_var,
+            BinaryOperation(lhs_stack_var, '*', rhs_stack_var,
+                            stack_var.type))
+
+    # [0] * n, for the list and the count at these offsets from the top
+    def repeat_list(self, list_offset, count_offset):
+        list_type = self.stack_types[-1 - list_offset]
+        c_type = self.item_c_type(list_type)
+        items = self.get_stack_var(list_offset)
+        count = self.get_stack_var(count_offset)
+        del self.stack_types[-2:]
+        self.stack_types.append(list_type)
+        stack_var = self.res_stack_var(list_type)
+        return Assignment(
+            stack_var,
+            FunctionCall(f'py2c_list_repeat_{c_type}', [items, count],
+                         stack_var.type))
+
+    # `int | float` in annotations, bitwise or is not supported
+    def BINARY_OR(self):
+        if self.stack_types[-2] is not None or \
+                self.stack_types[-1] is not None:
+            raise Exception(f'{inspect.stack()[0][3]}: | is only supported '
+                            'between types in annotations')
+        del self.stack_types[-2:]
+        self.stack_types.append(None)
+        return ''
+
+    def BINARY_SUBSCR(self):
+        if is_dict(self.stack_types[-2]):
+            name = self.dict_name(self.stack_types[-2])
+            value_type_ = value_type(self.stack_types[-2])
+            key = self.dict_key(key_type(self.stack_types[-2]))
+            items = self.get_stack_var(1)
+            del self.stack_types[-2:]
+            self.stack_types.append(value_type_)
+            stack_var = self.res_stack_var(value_type_)
+            return Assignment(
+                stack_var,
+                FunctionCall(f'py2c_dict_get_{name}', [items, key],
+                             stack_var.type, pure=True))
+        if is_tuple(self.stack_types[-2]):
+            return self.tuple_item()
+        if self.stack_types[-2] is str:
+            raise Exception(f'{inspect.stack()[0][3]}: indexing strings is '
+                            'not supported')
+        if not is_list(self.stack_types[-2]) and \
+                not is_array(self.stack_types[-2]):
+            # annotations such as list[int]
+            del self.stack_types[-2:]
+            self.stack_types.append(None)
+            return ''
+        item, item_type = self.list_item()
+        self.stack_types.append(item_type)
+        stack_var = self.res_stack_var(item_type)
+        return Assignment(stack_var, item)
 
     def BINARY_SUBTRACT(self):
         lhs_type = self.stack_types[-2]
@@ -211,38 +927,431 @@ class FunctionTranslator:
         self.stack_types.pop()
         self.stack_types.append(res_type)
 
-        return Assignment(stack_var,
-                          f'{lhs_stack_var.name} - {rhs_stack_var.name}')
+        return Assignment(
+            stack_var,
+            BinaryOperation(lhs_stack_var, '-', rhs_stack_var,
+                            stack_var.type))
+
+    def BINARY_TRUE_DIVIDE(self):
+        lhs_type = self.stack_types[-2]
+        rhs_type = self.stack_types[-1]
+        if (lhs_type not in FunctionTranslator.NUMERIC_TYPES) or (
+                rhs_type not in FunctionTranslator.NUMERIC_TYPES):
+            raise Exception(
+                f'{inspect.stack()[0][3]}:'
+                ' division on non-numeric types is not implemented')
+
+        res_type = float
+
+        stack_var = self.res_stack_var(res_type)
+        lhs_stack_var = self.get_stack_var(1)
+        rhs_stack_var = self.get_stack_var(0)
+
+        self.stack_types.pop()
+        self.stack_types.pop()
+        self.stack_types.append(res_type)
+
+        # dividing two integers in c would drop the remainder
+        return Assignment(
+            stack_var,
+            BinaryOperation(
+                UnaryOperation('(double)', lhs_stack_var, stack_var.type),
+                '/', rhs_stack_var, stack_var.type))
 
     def BUILD_CONST_KEY_MAP(self):
         count = self.cur_instr.arg
-        self.stack_types.pop()  # tuple of keys
-        # pop values
-        for i in range(count):
-            self.stack_types.pop()
-        self.stack_types.append(dict)
-        return ''
+        if isinstance(self.next_instruction().argval, types.CodeType):
+            # the annotations of a function
+            del self.stack_types[-1 - count:]
+            self.stack_types.append(dict)
+            return ''
+        keys = [
+            Constant(key)
+            for key in self.code.co_consts[self.previous_instruction(1).arg]
+        ]
+        values = [self.get_stack_var(count - i) for i in range(count)]
+        value_types = self.stack_types[-1 - count:-1]
+        del self.stack_types[-1 - count:]
+        return self.build_dict(keys, [type(key.value) for key in keys], values,
+                               value_types)
+
+    # {key: value, ...}, with the keys and values interleaved on the stack
+    def BUILD_MAP(self):
+        count = self.cur_instr.arg
+        if count == 0:
+            self.stack_types.append(dict)
+            stack_var = self.res_stack_var(dict)
+            return Assignment(stack_var,
+                              FunctionCall('py2c_dict_new', [],
+                                           stack_var.type))
+        items = [self.get_stack_var(2 * count - i - 1)
+                 for i in range(2 * count)]
+        item_types = self.stack_types[-2 * count:]
+        del self.stack_types[-2 * count:]
+        return self.build_dict(items[::2], item_types[::2], items[1::2],
+                               item_types[1::2])
+
+    def build_dict(self, keys, key_types, values, value_types):
+        key_type_ = value_type_ = None
+        for _type in key_types:
+            key_type_ = join(key_type_, _type)
+        for _type in value_types:
+            value_type_ = join(value_type_, _type)
+        dict_type = dict_of(key_type_, value_type_)
+        name = self.dict_name(dict_type)
+        self.stack_types.append(dict_type)
+        stack_var = self.res_stack_var(dict_type)
+        return Assignment(
+            stack_var,
+            FunctionCall(f'py2c_dict_from_{name}', [
+                Constant(len(keys)),
+                ArrayLiteral(keys, self.C_TYPE_MAP[key_type(dict_type)]),
+                ArrayLiteral(values, self.C_TYPE_MAP[value_type(dict_type)])
+            ], stack_var.type))
+
+    def BUILD_TUPLE(self):
+        count = self.cur_instr.arg
+        tuple_type = tuple_of(self.stack_types[len(self.stack_types) -
+                                               count:])
+        if tuple_type is None:
+            # annotations such as dict[int, int]
+            for offset in range(count):
+                self.pending.pop(
+                    self.stack_depths[self.instr_idx] - offset - 1, None)
+            del self.stack_types[len(self.stack_types) - count:]
+            self.stack_types.append(tuple)
+            return ''
+        items = [self.get_stack_var(count - i - 1) for i in range(count)]
+        del self.stack_types[-count:]
+        self.stack_types.append(tuple_type)
+        stack_var = self.res_stack_var(tuple_type)
+        return Assignment(stack_var, TupleLiteral(items, stack_var.type))
+
+    def BUILD_LIST(self):
+        count = self.cur_instr.arg
+        if count == 0:
+            # the element type is only known from how the list is used
+            self.stack_types.append(list)
+            stack_var = self.res_stack_var(list)
+            return Assignment(stack_var,
+                              FunctionCall('py2c_list_new', [],
+                                           stack_var.type))
+        item_type = None
+        for element in self.stack_types[-count:]:
+            item_type = join(item_type, element)
+        list_type = list_of(item_type)
+        c_type = self.item_c_type(list_type)
+        items = [self.get_stack_var(count - i - 1) for i in range(count)]
+        del self.stack_types[-count:]
+        self.stack_types.append(list_type)
+        stack_var = self.res_stack_var(list_type)
+        return Assignment(
+            stack_var,
+            FunctionCall(f'py2c_list_from_{c_type}',
+                         [Constant(count), ArrayLiteral(items, c_type)],
+                         stack_var.type))
 
     def CALL_FUNCTION(self):
         argc = self.cur_instr.arg
+        if isinstance(self.stack_types[-argc - 1], Decorator):
+            if argc == 1 and isinstance(self.stack_types[-1],
+                                        (FunctionPointer, GenericFunction)):
+                # the decorators were recorded when the function was made
+                fp = self.stack_types.pop()
+                self.stack_types.pop()
+                self.stack_types.append(fp)
+                return ''
+            return self.call_decorator(argc)
+        arg_types = self.stack_types[len(self.stack_types) - argc:]
+        fp = self.stack_types[-argc - 1]
+        if fp is BuildClass:
+            return self.build_class(argc)
+        if isinstance(fp, GenericFunction):
+            fp = self.declare_clone(fp, arg_types)
+        # tuple arguments are converted to the parameter types
+        param_types = self.param_types(fp, argc) or arg_types
+        if isinstance(fp, FunctionPointer) and fp.profiled:
+            for param_type, arg_type in zip(param_types, arg_types):
+                self.guard_profiled(f'{fp.name}()', param_type, arg_type)
         args = []
         for i in range(argc):
-            args.append(self.get_stack_var(argc - i - 1))
+            args.append(
+                self.converted_stack_var(argc - i - 1, param_types[i]))
         for i in range(argc):
             self.stack_types.pop()
-        fp = self.stack_types.pop()
+        self.stack_types.pop()
         if isinstance(fp, Print):
+            if any(is_list(arg_type) or is_dict(arg_type) or
+                   is_tuple(arg_type) or is_array(arg_type)
+                   for arg_type in arg_types):
+                raise Exception(f'{inspect.stack()[0][3]}: printing lists, '
+                                'arrays, dicts and tuples is not supported')
             self.stack_types.append(None)
             return Print(args=args)
         if isinstance(fp, Range):
             self.stack_types.append(Range(args=args))
             return ''
+        if isinstance(fp, Len):
+            if argc != 1 or not (is_list(arg_types[0]) or is_array(
+                    arg_types[0]) or is_dict(arg_types[0])):
+                raise Exception(f'{inspect.stack()[0][3]}: len is only '
+                                'supported on lists, arrays and dicts')
+            self.stack_types.append(int)
+            return Assignment(self.res_stack_var(int),
+                              Length(args[0], is_array(arg_types[0])))
+        if isinstance(fp, ClassType):
+            # the constructor allocates the instance and runs __init__
+            self.stack_types.append(fp.instance)
+            stack_var = self.res_stack_var(fp.instance)
+            return Assignment(stack_var,
+                              FunctionCall(fp.name, args, stack_var.type))
+        self.stack_types.append(fp.func_sig[-1][0])
+        return self.call(fp, args)
+
+    # the clone of the generic function for the argument types. It is
+    # declared here and defined by write_clones, after the functions it may
+    # call
+    def declare_clone(self, generic, arg_types):
+        clone = specialize(generic, arg_types, self.globals['types'])
+        if clone.name not in self.declared_clones:
+            self.declared_clones.add(clone.name)
+            ret_type, params = function_head(clone.func_sig)
+            write_structs([
+                self.C_TYPE_MAP.get(param[0], '') for param in clone.func_sig
+            ], self.out)
+            self.out.write(f'{ret_type} {clone.name}({params});\n')
+        clones = self.globals.setdefault('clones', [])
+        if clone not in clones:
+            clones.append(clone)
+        return clone
+
+    # write the clones of the generic functions called by the module, the
+    # loop also reaches the clones they call, which are appended to the list
+    def write_clones(self):
+        for clone in self.globals.get('clones', []):
+            self.translate_function(clone.code, clone.func_sig, clone.name,
+                                    self.memo_capacity(clone))
+
+    # the parameter types of the function, the constructor of the class or
+    # the method called with argc arguments, or None for builtins
+    def param_types(self, func, argc):
+        if isinstance(func, ClassType):
+            init = func.methods.get('__init__')
+            name = func.name
+            func_sig = init.func_sig[1:] if init else [(type(None), 'return')]
+        elif isinstance(func, BoundMethod):
+            name = func.func.name
+            func_sig = func.func.func_sig[1:]
+        elif isinstance(func, FunctionPointer):
+            name = func.name
+            func_sig = func.func_sig
+            if func_sig is None:
+                raise Exception(f'{inspect.stack()[0][3]}: {name} is run by '
+                                'python, so it cannot be called from '
+                                'translated code')
+        else:
+            return None
+        if len(func_sig) != argc + 1:
+            raise Exception(f'{inspect.stack()[0][3]}: {name} takes '
+                            f'{len(func_sig) - 1} arguments but {argc} were '
+                            'given')
+        return [param[0] for param in func_sig[:-1]]
+
+    # call the function, or inline it, and return the assignment of its
+    # result
+    def call(self, fp, args):
         ret_type = fp.func_sig[-1][0]
-        self.stack_types.append(ret_type)
-        if ret_type is None:
-            return FunctionCall(fp.name, args)
+        # calls folded into a constant are not worth inlining
+        if self.inlinable(fp) and \
+                self.cur_instr.offset not in self.constants.results:
+            return self.inline(fp, args)
+        if ret_type in (None, type(None)):
+            return f'{FunctionCall(fp.name, args)};\n'
         stack_var = self.res_stack_var(ret_type)
-        return Assignment(stack_var, FunctionCall(fp.name, args))
+        # the clones of a generic function call each other, which are not
+        # calls to themselves
+        code = fp.code if fp.func_sig == self.func_sig else None
+        return Assignment(stack_var,
+                          FunctionCall(fp.name, args, stack_var.type, code))
+
+    # `class Name: ...` calls the class body with the name, the class was
+    # already defined by the type inference
+    def build_class(self, argc):
+        cls = self.types.classes[self.cur_instr.offset]
+        for offset in range(argc):
+            self.pending.pop(
+                self.stack_depths[self.instr_idx] - offset - 1, None)
+        del self.stack_types[-argc - 1:]
+        # store the class a bit sooner for the methods to make instances
+        store = self.next_instruction()
+        if store.opname == 'STORE_NAME':
+            self.fb.local_vars[store.arg] = cls
+        elif store.opname == 'STORE_FAST':
+            self.fb.fast_local_vars[store.arg] = cls
+        self.globals.setdefault('classes', []).append(cls)
+        self.write_class(cls)
+        self.stack_types.append(cls)
+        return ''
+
+    # write the struct of the class, its methods and its constructor, which
+    # allocates an instance and runs __init__ on it. Instances are never
+    # freed, like lists and dicts
+    def write_class(self, cls):
+        struct = f'struct {cls.name}'
+        field_types = {
+            field: self.C_TYPE_MAP[_type]
+            for field, _type in cls.fields.items()
+        }
+        write_structs(field_types.values(), self.out)
+        # c structs cannot be empty
+        fields = ''.join(f'{c_type} {field};\n'
+                         for field, c_type in field_types.items()) or \
+            'char empty;\n'
+        self.out.write(f'{struct} {{\n{fields}}};\n')
+
+        init = cls.methods.get('__init__')
+        params = init.func_sig[1:-1] if init else []
+        constructor = f'{struct}* {cls.name}(' + ', '.join(
+            f'{self.C_TYPE_MAP[param[0]]} {param[1]}'
+            for param in params) + ')'
+        # the methods can call each other and make instances in any order
+        self.out.write(f'{constructor};\n')
+        for fp in cls.methods.values():
+            ret_type, params_ = function_head(fp.func_sig)
+            self.out.write(f'{ret_type} {fp.name}({params_});\n')
+        for fp in cls.methods.values():
+            self.translate_function(fp.code, fp.func_sig, fp.name)
+
+        self.out.write(f'{constructor} {{\n'
+                       f'{struct}* self = calloc(1, sizeof({struct}));\n'
+                       'if (self == NULL) {\n'
+                       'py2c_raise("MemoryError", "");\n'
+                       '}\n')
+        if init:
+            args = ', '.join(['self'] + [param[1] for param in params])
+            self.out.write(f'{init.name}({args});\n')
+        self.out.write('return self;\n}\n')
+
+    def CALL_FUNCTION_KW(self):
+        argc = self.cur_instr.arg
+        if not isinstance(self.stack_types[-argc - 2], Decorator):
+            raise Exception(f'{inspect.stack()[0][3]}: keyword arguments are '
+                            'only supported in decorators')
+        return self.call_decorator(argc, self.previous_instruction(1).argval)
+
+    # `module.function(...)` or `items.method(...)`, with a NULL below
+    def CALL_METHOD(self):
+        argc = self.cur_instr.arg
+        if isinstance(self.stack_types[-argc - 1], ListMethod):
+            return self.call_list_method(self.stack_types[-argc - 1], argc)
+        if isinstance(self.stack_types[-argc - 1], DictMethod):
+            return self.call_dict_method(self.stack_types[-argc - 1], argc)
+        if isinstance(self.stack_types[-argc - 1], BoundMethod):
+            return self.call_bound_method(self.stack_types[-argc - 1], argc)
+        if not isinstance(self.stack_types[-argc - 1], Decorator):
+            raise Exception(f'{inspect.stack()[0][3]}: only decorators are '
+                            'supported as module functions')
+        statement = self.call_decorator(argc)
+        del self.stack_types[-2]
+        return statement
+
+    # methods are called directly, with the instance as the first argument
+    def call_bound_method(self, method, argc):
+        param_types = self.param_types(method, argc)
+        args = [method.receiver] + [
+            self.converted_stack_var(argc - i - 1, param_types[i])
+            for i in range(argc)
+        ]
+        del self.stack_types[-argc - 2:]
+        self.stack_types.append(method.func.func_sig[-1][0])
+        return self.call(method.func, args)
+
+    def call_list_method(self, method, argc):
+        item_type = element_type(method.list_type)
+        c_type = self.item_c_type(method.list_type)
+        if method.name == 'append' and argc == 1:
+            if not assignable(item_type, self.stack_types[-1]):
+                raise TypeError(f'cannot append a {self.stack_types[-1]} to '
+                                f'a {method.list_type}')
+            item = self.get_stack_var(0)
+            del self.stack_types[-3:]
+            self.stack_types.append(None)
+            return f'py2c_list_append_{c_type}({method.items.name}, ' \
+                   f'{item.name});\n'
+        if method.name == 'pop' and argc == 0:
+            del self.stack_types[-2:]
+            self.stack_types.append(item_type)
+            stack_var = self.res_stack_var(item_type)
+            return Assignment(
+                stack_var,
+                FunctionCall(f'py2c_list_pop_{c_type}', [method.items],
+                             c_type))
+        raise Exception(f'{inspect.stack()[0][3]}: list.{method.name} with '
+                        f'{argc} arguments is not supported')
+
+    def call_dict_method(self, method, argc):
+        name = self.dict_name(method.dict_type)
+        if method.name in ('keys', 'values') and argc == 0:
+            # only iterated over, by FOR_ITER
+            del self.stack_types[-2:]
+            self.stack_types.append(
+                DictView(method.items, method.dict_type, method.name[:-1]))
+            return ''
+        if method.name == 'get' and argc == 2:
+            value_type_ = value_type(method.dict_type)
+            if not assignable(value_type_, self.stack_types[-1]):
+                raise TypeError(f'the default of {method.dict_type}.get '
+                                f'cannot be a {self.stack_types[-1]}')
+            key = self.dict_key(key_type(method.dict_type), 1)
+            default = self.get_stack_var(0)
+            del self.stack_types[-4:]
+            self.stack_types.append(value_type_)
+            stack_var = self.res_stack_var(value_type_)
+            return Assignment(
+                stack_var,
+                FunctionCall(f'py2c_dict_get_default_{name}',
+                             [method.items, key, default], stack_var.type,
+                             pure=True))
+        raise Exception(f'{inspect.stack()[0][3]}: dict.{method.name} with '
+                        f'{argc} arguments is not supported')
+
+    # `@decorator(...)` makes the decorator that is applied to the function,
+    # its arguments have to be constants
+    def call_decorator(self, argc, keywords=()):
+        values = []
+        for count in range(argc + bool(keywords), bool(keywords), -1):
+            instr = self.previous_instruction(count)
+            if instr.opname != 'LOAD_CONST':
+                raise Exception(f'{inspect.stack()[0][3]}: the arguments of '
+                                'a decorator must be constants')
+            values.append(instr.argval)
+        num_positional = argc - len(keywords)
+        # nothing is computed, the arguments are dropped from the stack
+        for offset in range(argc + bool(keywords)):
+            self.pending.pop(self.stack_depths[self.instr_idx] - offset - 1,
+                             None)
+            self.stack_types.pop()
+        decorator = self.stack_types.pop()
+        self.stack_types.append(
+            Decorator(decorator.name, tuple(values[:num_positional]),
+                      dict(zip(keywords, values[num_positional:]))))
+        return ''
+
+    # `key in items` and `key not in items`
+    def CONTAINS_OP(self):
+        dict_type = self.stack_types[-1]
+        if not is_dict(dict_type):
+            raise Exception(f'{inspect.stack()[0][3]}: `in` is only '
+                            'supported on dicts')
+        key = self.dict_key(key_type(dict_type), 1)
+        items = self.get_stack_var(0)
+        del self.stack_types[-2:]
+        self.stack_types.append(bool)
+        stack_var = self.res_stack_var(bool)
+        contains = FunctionCall(f'py2c_dict_contains_{self.dict_name(dict_type)}',
+                                [items, key], stack_var.type, pure=True)
+        return Assignment(
+            stack_var, negate(contains) if self.cur_instr.arg else contains)
 
     def COMPARE_OP(self):
         op_idx = self.cur_instr.arg
@@ -257,18 +1366,91 @@ class FunctionTranslator:
         self.stack_types.append(bool)
 
         return Assignment(
-            stack_var, f'{lhs_stack_var.name} {op_name} {rhs_stack_var.name}')
+            stack_var,
+            BinaryOperation(lhs_stack_var, op_name, rhs_stack_var,
+                            stack_var.type))
+
+    def DELETE_SUBSCR(self):
+        dict_type = self.stack_types[-2]
+        if not is_dict(dict_type):
+            raise Exception(f'{inspect.stack()[0][3]}: del is only '
+                            'supported on dict items')
+        key = self.dict_key(key_type(dict_type))
+        items = self.get_stack_var(1)
+        del self.stack_types[-2:]
+        return f'py2c_dict_delete_{self.dict_name(dict_type)}(' \
+               f'{items.name}, {key.name});\n'
+
+    # `items[key] += value` reads and writes the same item
+    def DUP_TOP(self):
+        return self.duplicate(1)
+
+    def DUP_TOP_TWO(self):
+        return self.duplicate(2)
+
+    # push copies of the count values on top of the stack
+    def duplicate(self, count):
+        depth = self.stack_depths[self.instr_idx]
+        slots = range(depth - count, depth)
+        if any(not isinstance(self.pending[idx].rhs, Variable)
+               for idx in slots if idx in self.pending):
+            # computed values are stored instead of computed twice
+            self.flush_stack()
+        for idx in slots:
+            self.stack_types.append(self.stack_types[idx])
+            if self.stack_types[idx] not in self.C_TYPE_MAP:
+                continue  # not a value
+            if idx in self.pending:
+                value = self.pending[idx].rhs
+            else:
+                value = self.stack_var(idx, self.stack_types[idx])
+                self.used_stack_vars[value.name] = value
+            self.pending[idx + count] = Assignment(
+                self.stack_var(idx + count, self.stack_types[idx]), value)
+        return ''
 
-    def FOR_ITER(self):
-        delta = self.cur_instr.arg
-        self.for_stack.append(self.cur_instr.offset + delta)
+    def EXTENDED_ARG(self):
+        # dis already folds the extended argument into the next instruction
+        return ''
 
+    def FOR_ITER(self):
+        iterable = self.stack_types[-1]
+        if is_dict(iterable) or isinstance(iterable, DictView):
+            if is_dict(iterable):
+                iterable = DictView(self.get_stack_var(0), iterable, 'key')
+            else:
+                self.pending.pop(self.stack_depths[self.instr_idx] - 1, None)
+            dict_type = iterable.dict_type
+            item_type = key_type(dict_type) if iterable.field == 'key' else \
+                value_type(dict_type)
+            self.stack_types.append(item_type)
+            stack_var = self.res_stack_var(item_type)
+            self.used_stack_vars[stack_var.name] = stack_var
+            self.gflc += 1
+            return self.vectorize_loop(
+                DictLoop(stack_var, iterable.items, self.gflc, self.prefix,
+                         self.dict_name(dict_type), iterable.field))
+        if is_list(self.stack_types[-1]) or is_array(self.stack_types[-1]):
+            loop = ViewLoop if is_array(self.stack_types[-1]) else ListLoop
+            item_type = element_type(self.stack_types[-1])
+            self.item_c_type(self.stack_types[-1])
+            items = self.get_stack_var(0)
+            self.stack_types.append(item_type)
+            stack_var = self.res_stack_var(item_type)
+            self.used_stack_vars[stack_var.name] = stack_var
+            self.gflc += 1
+            return self.vectorize_loop(
+                loop(stack_var, items, self.gflc, self.prefix))
         range_ = self.stack_types[-1]
         self.stack_types.append(int)
         stack_var = self.res_stack_var(int)
+        self.used_stack_vars[stack_var.name] = stack_var
 
         self.gflc += 1
-        return ForLoop(stack_var, range_, self.gflc)
+        loop = ForLoop(stack_var, range_, self.gflc, self.prefix)
+        if self.globals['parallel'] is not None:
+            loop.parallel = self.parallel_loop(range_)
+        return self.vectorize_loop(loop)
 
     def GET_ITER(self):
         return ''
@@ -278,25 +1460,47 @@ class FunctionTranslator:
 
     def INPLACE_FLOOR_DIVIDE(self):
         return self.BINARY_FLOOR_DIVIDE()
-    
+
+    def INPLACE_MODULO(self):
+        return self.BINARY_MODULO()
+
     def INPLACE_MULTIPLY(self):
         return self.BINARY_MULTIPLY()
 
-    def JUMP_ABSOLUTE(self):
-        if self.cur_instr.offset == self.for_stack[-1]:
-            # we are the end of a for-loop
-            self.for_stack.pop()
-            # pop off the iterator
-            # self.stack_types.pop()
-            return '}\n'
+    def INPLACE_SUBTRACT(self):
+        return self.BINARY_SUBTRACT()
+
+    def INPLACE_TRUE_DIVIDE(self):
+        return self.BINARY_TRUE_DIVIDE()
 
-        target = self.cur_instr.arg
-        return f'goto L{target};\n'
+    def JUMP_ABSOLUTE(self):
+        return Jump(self.cur_instr.argval)
 
     def JUMP_FORWARD(self):
-        delta = self.cur_instr.arg
-        target = self.cur_instr.offset + delta + 2
-        return f'goto L{target};\n'
+        return Jump(self.cur_instr.argval)
+
+    def LOAD_ATTR(self):
+        if isinstance(self.stack_types[-1], InstanceType):
+            cls = self.stack_types[-1].cls
+            field = self.cur_instr.argval
+            if field not in cls.fields:
+                raise Exception(f'{inspect.stack()[0][3]}: {cls.name} has no '
+                                f'slot {field}, methods have to be called')
+            field_type = cls.fields[field]
+            owner = self.get_stack_var(0)
+            self.stack_types[-1] = field_type
+            stack_var = self.res_stack_var(field_type)
+            return Assignment(stack_var,
+                              FieldAccess(owner, field, stack_var.type))
+        owner = self.stack_types.pop()
+        if not isinstance(owner, Module):
+            raise Exception(f'{inspect.stack()[0][3]}: attributes are only '
+                            'supported on modules and instances')
+        name = f'{owner.name}.{self.cur_instr.argval}'
+        if name not in DECORATORS:
+            raise Exception(f'{inspect.stack()[0][3]}: {name} is not supported')
+        self.stack_types.append(Decorator(name))
+        return ''
 
     def LOAD_CONST(self):
         const_idx = self.cur_instr.arg
@@ -308,43 +1512,51 @@ class FunctionTranslator:
         if const_type == FunctionPointer:
             return ''
         if const_type == tuple:
-            return ''
+            tuple_type = tuple_of([type(item) for item in const_val])
+            if tuple_type is None:
+                return ''
+            self.stack_types[-1] = tuple_type
+            stack_var = self.res_stack_var(tuple_type)
+            return Assignment(
+                stack_var,
+                TupleLiteral([
+                    Constant(item, self.C_TYPE_MAP[type(item)])
+                    for item in const_val
+                ], stack_var.type))
         if const_val is None:
             return ''
-        if const_type == bool:
-            const_val = int(const_val)
         stack_var = self.res_stack_var(const_type)
-        return Assignment(stack_var, Variable(const_val, const_type))
+        return Assignment(stack_var, Constant(const_val, stack_var.type))
 
     def LOAD_FAST(self):
         local_idx = self.cur_instr.arg
         if local_idx < len(self.func_sig) - 1:
             local_type, local_var = self.func_sig[local_idx]
+            local_var = Variable(self.prefix + local_var,
+                                 self.C_TYPE_MAP[local_type])
         else:
             local_var = self.fb.fast_local_vars[local_idx]
-            local_type = type(local_var)
-        if local_type == FunctionPointer:
-            self.stack_types.append(local_var)
-            return ''
-        # TODO figure out the type of the local
-        self.stack_types.append(int)
-        stack_var = self.res_stack_var(int)
-        if local_type == types.CodeType:
-            return ''
-        if local_type == tuple:
-            return ''
-        if local_var is None:
-            return ''
+            if isinstance(local_var,
+                          (FunctionPointer, GenericFunction, ClassType)):
+                self.stack_types.append(local_var)
+                return ''
+            local_type = local_var.py_type
+        if local_type not in FunctionTranslator.C_TYPE_MAP:
+            raise Exception(
+                f'{inspect.stack()[0][3]}: could not infer the type of'
+                f' {self.code.co_varnames[local_idx]}')
+        self.stack_types.append(local_type)
+        stack_var = self.res_stack_var(local_type)
         return Assignment(stack_var, local_var)
 
     def LOAD_GLOBAL(self):
         global_name = self.code.co_names[self.cur_instr.arg]
-        if global_name in self.globals['names']:
-            global_var = self.globals['locals'][self.globals['names'].index(global_name)]
+        if global_name in self.globals['index']:
+            global_var = self.globals['locals'][self.globals['index'][global_name]]
         else:
             global_var = self.fb.local_vars[self.cur_instr.arg]
         global_type = type(global_var)
-        if global_type == FunctionPointer:
+        if global_type in (FunctionPointer, GenericFunction, ClassType):
             self.stack_types.append(global_var)
             return ''
         # if the global variable doesn't have a type assign it type of TOS
@@ -358,15 +1570,64 @@ class FunctionTranslator:
         if global_name == 'range':
             self.stack_types.append(Range())
             return ''
+        if global_name == 'len':
+            self.stack_types.append(Len())
+            return ''
         # TODO get the actual type of the global var
         self.stack_types.append(None)
         return ''
 
+    def LIST_EXTEND(self):
+        # `[1, 2, 3]` makes an empty list and extends it with a tuple
+        items = self.previous_instruction(1)
+        list_idx = self.stack_depths[self.instr_idx] - 1 - self.cur_instr.arg
+        if items.opname != 'LOAD_CONST' or list_idx not in self.pending:
+            raise Exception(f'{inspect.stack()[0][3]}: only list literals '
+                            'are supported')
+        item_type = None
+        for item in items.argval:
+            item_type = join(item_type, type(item))
+        list_type = list_of(item_type)
+        c_type = self.item_c_type(list_type)
+        self.pending[list_idx].rhs = FunctionCall(
+            f'py2c_list_from_{c_type}', [
+                Constant(len(items.argval)),
+                ArrayLiteral([Constant(item) for item in items.argval],
+                             c_type)
+            ], 'py2c_list*')
+        self.stack_types.pop()
+        self.stack_types[-self.cur_instr.arg] = list_type
+        return ''
+
+    def LOAD_METHOD(self):
+        owner_type = self.stack_types[-1]
+        if is_list(owner_type):
+            self.stack_types[-1] = ListMethod(self.cur_instr.argval,
+                                              self.get_container_var(0),
+                                              owner_type)
+        elif is_dict(owner_type):
+            self.stack_types[-1] = DictMethod(self.cur_instr.argval,
+                                              self.get_container_var(0),
+                                              owner_type)
+        elif isinstance(owner_type, InstanceType):
+            method = owner_type.cls.methods.get(self.cur_instr.argval)
+            if method is None:
+                raise Exception(f'{inspect.stack()[0][3]}: '
+                                f'{owner_type.cls.name} has no method '
+                                f'{self.cur_instr.argval}')
+            self.stack_types[-1] = BoundMethod(method,
+                                               self.get_container_var(0))
+        else:
+            self.LOAD_ATTR()
+        self.stack_types.insert(-1, None)
+        return ''
+
     def LOAD_NAME(self):
         local_idx = self.cur_instr.arg
         local_name = self.code.co_names[local_idx]
         local_var = self.fb.local_vars[local_idx]
-        if type(local_var) == FunctionPointer:
+        if isinstance(local_var, (FunctionPointer, GenericFunction,
+                                  ClassType, Decorator, Module)):
             self.stack_types.append(local_var)
             return ''
         # if the local variable doesn't have a type assign it type of TOS
@@ -380,10 +1641,17 @@ class FunctionTranslator:
         if local_name == 'range':
             self.stack_types.append(Range())
             return ''
+        if local_name == 'len':
+            self.stack_types.append(Len())
+            return ''
         # TODO get the actual type of the local var
         self.stack_types.append(None)
         return ''
 
+    def LOAD_BUILD_CLASS(self):
+        self.stack_types.append(BuildClass)
+        return ''
+
     def MAKE_FUNCTION(self):
         self.stack_types.pop()  # function name
         self.stack_types.pop()  # code object
@@ -392,77 +1660,479 @@ class FunctionTranslator:
         for bit in bin(flags):
             if bit == '1':
                 self.stack_types.pop()
+        if self.stack_types and self.stack_types[-1] is BuildClass:
+            # the class body, its methods are translated with the class
+            self.stack_types.append(None)
+            return ''
 
-        # remove last 4 from statements
-        self.fb.statements.pop()  # load function name
-        name = self.code.co_consts[self.instructions[self.instr_idx - 1].arg]
+        # look back to the loads of the function name and code object
+        name = self.code.co_consts[self.previous_instruction(1).arg]
         name = name.replace('.', '_').replace('<', '_').replace('>', '_')
-        self.fb.statements.pop()  # load code object
-        code_object = self.code.co_consts[self.instructions[self.instr_idx -
-                                                            2].arg]
+        code_object = self.code.co_consts[self.previous_instruction(2).arg]
         assert isinstance(code_object, types.CodeType)
-        self.fb.statements.pop()  # build const key map
-        self.fb.statements.pop()  # load function type signature
-        param_names = self.code.co_consts[self.instructions[self.instr_idx -
-                                                            4].arg]
-        param_types = []
-        # look back to signature tuple and figure out types
-        for i in range(len(param_names)):
-            self.fb.statements.pop()
-            param_types.append(
-                self.code.co_names[self.instructions[self.instr_idx - 5 -
-                                                     i].arg])
-        param_types.reverse()
-        func_sig = [(FunctionTranslator.STR_TO_TYPE[param_types[i]],
-                     param_names[i]) for i in range(len(param_names))]
-
-        fp = FunctionPointer(name, func_sig)
+        # and to the annotations, which python does without in mixed mode
+        try:
+            func_sig = function_signature(self.code, self.instructions,
+                                          self.instr_idx,
+                                          self.types.known_classes(),
+                                          self.globals['profile'])
+        except Exception:
+            if not self.globals['mixed']:
+                raise
+            func_sig = None
+        if func_sig is not None and is_generic(func_sig) and \
+                self.globals['mixed']:
+            func_sig = None
+
+        if func_sig is not None and is_generic(func_sig):
+            # the same one the functions calling it see
+            fp = self.types.functions[self.cur_instr.offset]
+        else:
+            fp = FunctionPointer(name, func_sig, code_object)
+            fp.profiled = profiled_signature(
+                self.code, self.instructions, self.instr_idx,
+                self.globals['profile']) is not None
+        # the function is passed to each decorator below it on the stack
+        store_idx = self.instr_idx + 1
+        decorator_idx = len(self.stack_types)
+        while self.instructions[store_idx].opname in ('CALL_FUNCTION',
+                                                      'EXTENDED_ARG'):
+            if self.instructions[store_idx].opname == 'CALL_FUNCTION':
+                decorator_idx -= 1
+                decorator = self.stack_types[decorator_idx]
+                fp.decorators[decorator.name] = decorator
+            store_idx += 1
+
         # store the function pointer a bit sooner to handle recursive functions
-        # assumes the next instruction is STORE_NAME
-        local_idx = self.instructions[self.instr_idx + 1].arg
+        # assumes the function is then stored with STORE_NAME
+        local_idx = self.instructions[store_idx].arg
         self.fb.local_vars[local_idx] = fp
 
-        # recursively compile the function, add it to func decls
-        func_body, rec_func_decls = FunctionTranslator(
-            code=code_object, func_sig=func_sig,
-            globals_=self.globals).translate()
-        self.func_decls += rec_func_decls
-        func_decl = f'{FunctionTranslator.C_TYPE_MAP[func_sig[-1][0]]} {name}(' \
-            f'{", ".join([f"{FunctionTranslator.C_TYPE_MAP[param[0]]} {param[1]}" for param in func_sig[:-1]])}' \
-            f') {{{func_body}}}'  # construct function signature
-        self.func_decls.append(func_decl)
+        # recursively compile the function, write it and its nested functions
+        if isinstance(fp, GenericFunction):
+            pass  # each clone is translated once it is called
+        elif func_sig is None:
+            self.run_by_python(fp, self.previous_instruction(1).argval)
+        elif self.globals['mixed']:
+            self.translate_or_run_by_python(fp, self.previous_instruction(
+                1).argval)
+        else:
+            self.translate_function(code_object, func_sig, name,
+                                    self.memo_capacity(fp), fp.profiled)
         self.stack_types.append(fp)
         return ''
 
+    # translate the function, or have python run it if that fails
+    def translate_or_run_by_python(self, fp, qualname):
+        out = self.out
+        active = len(self.globals['active'])
+        # nothing is written unless the whole function translates
+        self.out = io.StringIO()
+        try:
+            self.translate_function(fp.code, fp.func_sig, fp.name,
+                                    self.memo_capacity(fp), fp.profiled)
+        except Exception:
+            del self.globals['active'][active:]
+            self.out = out
+            self.run_by_python(fp, qualname)
+            return
+        out.write(self.out.getvalue())
+        self.out = out
+
+    # Mixed mode: the function is made by the module from its code object,
+    # see runtime/mixed.h. Translated code calls it through a stub of the
+    # same name, if its parameters and result can be passed to python, and
+    # cannot call it otherwise
+    def run_by_python(self, fp, qualname):
+        fp.python_code, fp.code = fp.code, None
+        fp.decorators = {}
+        if fp.python_code.co_freevars:
+            raise Exception(f'{inspect.stack()[0][3]}: {qualname} uses the '
+                            'variables of the function around it')
+        self.globals['python_functions'].append((fp, qualname))
+        self.out.write(f'static PyObject* py2c_python_{fp.name};\n')
+        if fp.func_sig is None or any(
+                param[0] not in BOX_FUNCTIONS for param in fp.func_sig[:-1]
+        ) or fp.func_sig[-1][0] not in PYTHON_RESULT_FUNCTIONS:
+            fp.func_sig = None
+            return
+        ret_type, params = function_head(fp.func_sig)
+        args = ', '.join(f'{BOX_FUNCTIONS[param[0]]}({param[1]})'
+                         for param in fp.func_sig[:-1])
+        nargs = len(fp.func_sig) - 1
+        result = f'{PYTHON_RESULT_FUNCTIONS[fp.func_sig[-1][0]]}(' \
+            f'py2c_call_python(py2c_python_{fp.name}, ' \
+            f'{"args" if nargs else "NULL"}, {nargs}), "{qualname}")'
+        self.out.write(f'{ret_type} {fp.name}({params}) {{\n')
+        if nargs:
+            self.out.write(f'PyObject* args[] = {{{args}}};\n')
+        if fp.func_sig[-1][0] is type(None):
+            self.out.write(f'{result};\n}}\n')
+        else:
+            self.out.write(f'return {result};\n}}\n')
+
+    # the number of entries in the memo table of the function, or None if
+    # its results are not memoized
+    def memo_capacity(self, fp):
+        types_ = [param[0] for param in fp.func_sig]
+        if not types_ or types_[-1] is None or any(
+                _type not in NUMERIC_TYPES for _type in types_):
+            return None  # the results are looked up by numeric arguments
+        if 'functools.cache' in fp.decorators:
+            return MEMO_CAPACITY
+        if 'functools.lru_cache' in fp.decorators:
+            decorator = fp.decorators['functools.lru_cache']
+            maxsize = decorator.keywords.get(
+                'maxsize',
+                decorator.args[0] if decorator.args else LRU_CACHE_MAXSIZE)
+            if maxsize is None:
+                return MEMO_CAPACITY
+            if maxsize <= 0:
+                return None
+            return 1 << (maxsize - 1).bit_length()
+        if self.globals['memoize_pure'] and is_recursive(fp.code) and \
+                float not in types_ and any(
+                    func.__code__ is fp.code for func in self.globals['pure']):
+            return MEMO_CAPACITY
+        return None
+
+    # whether calls to the function may be replaced by its body, regardless
+    # of where it is called from
+    def can_inline(self, fp):
+        code = fp.code
+        if code is None or 'py2c.noinline' in fp.decorators or \
+                code.co_freevars or code.co_cellvars or is_recursive(code) \
+                or self.memo_capacity(fp):
+            return False
+        size = 0
+        for instr in dis.get_instructions(code):
+            if instr.opname == 'MAKE_FUNCTION':
+                return False
+            if instr.opcode != dis.EXTENDED_ARG:
+                size += 1
+        return size <= INLINE_MAX_INSTRUCTIONS
+
+    def inlinable(self, fp):
+        # stop inlining functions that end up calling themselves again
+        return self.can_inline(fp) and fp.code not in self.globals['active']
+
+    # emit the body of the function in place of the call, with its variables
+    # renamed apart, and return the assignment of its result
+    def inline(self, fp, args):
+        self.globals['inlined'] += 1
+        prefix = f'i{self.globals["inlined"]}_'
+        translator = FunctionTranslator(code=fp.code,
+                                        func_sig=fp.func_sig,
+                                        globals_=self.globals,
+                                        cache=self.cache,
+                                        out=self.out,
+                                        prefix=prefix,
+                                        profiled=fp.profiled,
+                                        in_loop=self.in_loop or any(
+                                            self.block in loop.body for loop
+                                            in self.cfg.loops.values()))
+        fb = translator.translate()
+
+        # the values computed before the call are stored first
+        self.flush_stack()
+        for (param_type, param_name), arg in zip(fp.func_sig, args):
+            param = Variable(prefix + param_name,
+                             self.C_TYPE_MAP[param_type])
+            self.fb.stack_vars.append(param)
+            self.statements.append(Assignment(param, arg))
+        self.fb.stack_vars += fb.stack_vars + fb.fast_local_vars
+        self.statements.append(fb.statements)
+        self.statements.append(translator.end)
+
+        if not translator.result.type:
+            return ''
+        self.fb.stack_vars.append(translator.result)
+        stack_var = self.res_stack_var(fp.func_sig[-1][0])
+        return Assignment(stack_var, translator.result)
+
+    # the translation of a function only depends on its code, its signature
+    # and the signatures of the globals it refers to
+    def function_fingerprint(self, code, func_sig):
+        global_sigs = []
+        for name in sorted(referenced_names(code)):
+            if name not in self.globals['index']:
+                continue
+            global_var = self.globals['locals'][self.globals['index'][name]]
+            if isinstance(global_var, FunctionPointer):
+                global_sigs.append((name, global_var.name,
+                                    repr(global_var.func_sig),
+                                    global_var.profiled))
+            elif isinstance(global_var, GenericFunction):
+                # the result types of the clones depend on the body
+                global_sigs.append((name, global_var.name,
+                                    repr(global_var.func_sig),
+                                    code_fingerprint(global_var.code)))
+            elif isinstance(global_var, ClassType):
+                global_sigs.append((name, repr(global_var.instance)))
+            else:
+                global_sigs.append((name, global_var.name, global_var.type,
+                                    repr(global_var.py_type)))
+        # constants folded into the function depend on the values of the
+        # globals and on the code of the pure functions that were evaluated,
+        # and inlined functions on their own code
+        global_values = []
+        names = referenced_names(code)
+        seen = set()
+        while names:
+            name = names.pop()
+            seen.add(name)
+            value = self.globals['env'].get(name)
+            if is_constant(value):
+                global_values.append((name, repr(value)))
+                continue
+            code_ = None
+            if value in self.globals['pure']:
+                code_ = value.__code__
+            if name in self.globals['index']:
+                global_var = self.globals['locals'][self.globals['index'][name]]
+                # whether a function is inlined depends on its decorators
+                if isinstance(global_var, FunctionPointer):
+                    inline = self.can_inline(global_var)
+                    global_values.append(
+                        (name, repr((inline,
+                                     sorted(global_var.decorators.items())))))
+                    if inline:
+                        code_ = global_var.code
+            if code_ is not None:
+                global_values.append((name, self.code_fingerprint(code_)))
+                names |= referenced_names(code_) - seen
+        # methods are inlined without their class being named
+        for cls in self.globals.get('classes', []):
+            global_values.append((cls.name, self.code_fingerprint(cls.code)))
+        global_values.sort()
+        # the types a profile recorded for the locals
+        profile = self.globals['profile'] or {}
+        profiled_locals = profile.get(profile_key(code), {}).get('locals')
+        return repr((self.code_fingerprint(code), repr(func_sig), global_sigs,
+                     global_values, repr(profiled_locals),
+                     self.globals['parallel'], self.globals['vectorize']))
+
+    # the code_fingerprint of code translated into the function, with its
+    # line numbers in --vectorize mode, where the loops are marked with them
+    def code_fingerprint(self, code):
+        if self.globals['vectorize']:
+            return repr((code_fingerprint(code), code.co_firstlineno,
+                         code.co_lnotab))
+        return code_fingerprint(code)
+
+    def translate_function(self, code, func_sig, name, memo_capacity=None,
+                           profiled=False):
+        if self.cache is None:
+            self.write_function(code, func_sig, name, self.out, memo_capacity,
+                                profiled)
+            return
+
+        key = self.cache.key(
+            repr((name, self.function_fingerprint(code, func_sig),
+                  memo_capacity, profiled)),
+            flags=('function',))
+        # the tail calls converted in the function are kept next to its c.
+        # They are named by function rather than line, as the key does not
+        # change when the function moves
+        tail_calls = self.globals['tail_calls']
+        cached = self.cache.get(key, '.c')
+        cached_tail_calls = self.cache.get(key, '.tail')
+        if cached and cached_tail_calls:
+            with open(cached_tail_calls) as readfile:
+                tail_calls += ast.literal_eval(readfile.read())
+            with open(cached) as readfile:
+                shutil.copyfileobj(readfile, self.out)
+            return
+
+        converted = len(tail_calls)
+        with tempfile.SpooledTemporaryFile(mode='w+') as func_decls:
+            self.write_function(code, func_sig, name, func_decls,
+                                memo_capacity, profiled)
+            func_decls.seek(0)
+            self.cache.put(key, repr(tail_calls[converted:]), '.tail')
+            self.cache.put_file(key, func_decls, '.c')
+            func_decls.seek(0)
+            shutil.copyfileobj(func_decls, self.out)
+
+    # write the declarations of the function and its nested functions to out
+    def write_function(self, code, func_sig, name, out, memo_capacity=None,
+                       profiled=False):
+        # the calls inlined into each function are numbered from 1, so that
+        # its c does not depend on what was translated or cached before it
+        inlined = self.globals['inlined']
+        self.globals['inlined'] = 0
+        try:
+            fb = FunctionTranslator(code=code, func_sig=func_sig,
+                                    globals_=self.globals, cache=self.cache,
+                                    out=out, memoized=bool(memo_capacity),
+                                    profiled=profiled).translate()
+        finally:
+            self.globals['inlined'] = inlined
+        ret_type, params = function_head(func_sig)
+        write_structs(
+            fb.c_types() + [
+                FunctionTranslator.C_TYPE_MAP.get(param[0], '')
+                for param in func_sig
+            ], out)
+        if memo_capacity:
+            # the body computes the results, and calls the function itself
+            # for recursive calls to be looked up as well
+            out.write(f'{ret_type} {name}({params});\n')
+            out.write(f'static {ret_type} {name}_uncached({params}) {{')
+        else:
+            # construct function signature
+            out.write(f'{ret_type} {name}({params}) {{')
+        fb.write(out)
+        out.write('}\n')
+        if memo_capacity:
+            self.write_memo(func_sig, name, params, out, memo_capacity)
+
+    # write the function that looks its results up in a memo table before
+    # calling name_uncached, see runtime/memo.h
+    def write_memo(self, func_sig, name, params, out, capacity):
+        nargs = len(func_sig) - 1
+        key = ', '.join(
+            f'py2c_memo_from_double({param[1]})' if param[0] is float else
+            param[1] for param in func_sig[:-1]) or '0'
+        ret_type = FunctionTranslator.C_TYPE_MAP[func_sig[-1][0]]
+        args = ', '.join(param[1] for param in func_sig[:-1])
+        out.write(f'static long {name}_memo_slots[{capacity * (nargs + 2)}];\n'
+                  f'static py2c_memo {name}_memo = '
+                  f'{{{name}_memo_slots, {capacity - 1}, {nargs}, 0}};\n'
+                  f'{ret_type} {name}({params}) {{\n'
+                  f'long key[{max(nargs, 1)}] = {{{key}}};\n'
+                  f'unsigned long hash = py2c_memo_hash(key, {nargs});\n'
+                  f'long *hit = py2c_memo_get(&{name}_memo, key, hash);\n')
+        if func_sig[-1][0] is float:
+            out.write('if (hit) return py2c_memo_to_double(*hit);\n'
+                      f'double result = {name}_uncached({args});\n'
+                      f'py2c_memo_put(&{name}_memo, key, hash, '
+                      'py2c_memo_from_double(result));\n')
+        else:
+            out.write('if (hit) return *hit;\n'
+                      f'long result = {name}_uncached({args});\n'
+                      f'py2c_memo_put(&{name}_memo, key, hash, result);\n')
+        out.write('return result;\n}\n')
+
     def POP_TOP(self):
+        stack_var = self.get_stack_var(0) \
+            if self.stack_depths[self.instr_idx] - 1 in self.pending else None
         self.stack_types.pop()
+        if stack_var is not None and not stack_var.pure:
+            # the value is unused but the call still has to happen
+            return f'{stack_var.name};\n'
         return ''
 
     def POP_JUMP_IF_FALSE(self):
-        target = self.cur_instr.arg
-        target_instr = self.instructions[target // 2]
-        if target_instr.opname == 'FOR_ITER':
-            target = target_instr.offset + target_instr.arg
         stack_var = self.get_stack_var(0)
         self.stack_types.pop()
-        return IfStatement(f'!{stack_var.name}', f'goto L{target};')
+        return Branch(negate(stack_var), self.cur_instr.argval)
 
     def POP_JUMP_IF_TRUE(self):
-        target = self.cur_instr.arg
-        target_instr = self.instructions[target // 2]
-        if target_instr.opname == 'FOR_ITER':
-            target = target_instr.offset + target_instr.arg
         stack_var = self.get_stack_var(0)
         self.stack_types.pop()
-        return IfStatement(f'{stack_var.name}', f'goto L{target};')
+        return Branch(stack_var, self.cur_instr.argval)
+
+    # A function translated for the types a profile recorded cannot be
+    # passed values of another type, which would be converted, or return
+    # them. The types are known when translating, so the check costs nothing
+    # at run time
+    def guard_profiled(self, name, expected, actual):
+        if not assignable(expected, actual):
+            raise TypeError(f'{name} was profiled with {type_name(expected)}, '
+                            f'not {type_name(actual)}')
 
     def RETURN_VALUE(self):
+        if self.profiled:
+            self.guard_profiled(f'the result of {self.code.co_name}()',
+                                self.func_sig[-1][0], self.stack_types[-1])
         if self.stack_types[-1] == type(None):
             self.stack_types.pop()
+            if self.prefix:
+                return InlineReturn(None, self.result, self.end)
+            # the module level code has no function signature, and the
+            # end of the function needs no return
+            if not self.func_sig or \
+                    self.instr_idx == len(self.instructions) - 1:
+                return ''
+            return Return(None)
+        ret_var = self.converted_stack_var(0, self.func_sig[-1][0])
+        self.stack_types.pop()
+        if self.prefix:
+            return InlineReturn(ret_var, self.result, self.end)
+        return Return(ret_var)
+
+    def IMPORT_FROM(self):
+        name = f'{self.stack_types[-1].name}.{self.cur_instr.argval}'
+        if name in ANNOTATIONS:
+            self.stack_types.append(Module(name))
             return ''
-        ret_var = self.get_stack_var(0)
+        if name not in DECORATORS:
+            raise Exception(f'{inspect.stack()[0][3]}: {name} is not supported')
+        self.stack_types.append(Decorator(name))
+        return ''
+
+    def IMPORT_NAME(self):
+        # the level and the names to import are not needed
+        for offset in (0, 1):
+            self.pending.pop(self.stack_depths[self.instr_idx] - offset - 1,
+                             None)
         self.stack_types.pop()
-        return f'return {ret_var.name};\n'
+        self.stack_types.pop()
+        self.stack_types.append(Module(self.cur_instr.argval))
+        return ''
+
+    # [a, b] -> [b, a]
+    def ROT_TWO(self):
+        return self.rotate((0, 1))
+
+    # [a, b, c] -> [c, a, b]
+    def ROT_THREE(self):
+        return self.rotate((0, 2, 1))
+
+    # move the values at the offsets from the top of the stack to the top
+    # slots, from the lowest one up
+    def rotate(self, offsets):
+        depth = self.stack_depths[self.instr_idx]
+        # the iterators of for loops are not values
+        values = [
+            self.get_stack_var(offset)
+            if self.stack_types[-1 - offset] in self.C_TYPE_MAP else None
+            for offset in offsets
+        ]
+        self.stack_types[-len(offsets):] = [
+            self.stack_types[-1 - offset] for offset in offsets
+        ]
+        self.move(depth - len(offsets), values)
+        return ''
+
+    # make the values pending in the stack slots from first_idx up, which
+    # already have the types of the values
+    def move(self, first_idx, values):
+        targets = [
+            self.stack_var(first_idx + i, _type) for i, _type in enumerate(
+                self.stack_types[first_idx:first_idx + len(values)])
+        ]
+        # the slots are stored in order, so values that read a slot stored
+        # before them are copied above the stack first
+        if any(value is not None and any(
+                re.search(rf'\b{target.name}\b', value.name)
+                for target in targets[:i])
+               for i, value in enumerate(values)):
+            self.flush_stack()
+            top = max(self.stack_depths[self.instr_idx],
+                      first_idx + len(values))
+            for i, value in enumerate(values):
+                if isinstance(value, Variable) and \
+                        not isinstance(value, StackVariable) or value is None:
+                    continue
+                temp = self.stack_var(top + i, self.stack_types[first_idx + i])
+                self.used_stack_vars[temp.name] = temp
+                self.statements.append(Assignment(temp, value))
+                values[i] = temp
+        for target, value in zip(targets, values):
+            if value is not None:
+                self.pending[target.index] = Assignment(target, value)
 
     def SETUP_ANNOTATIONS(self):
         # create local dictionary call __annotations__
@@ -472,73 +2142,823 @@ class FunctionTranslator:
         local_idx = self.cur_instr.arg
         if local_idx < len(self.func_sig) - 1:
             local_type, local_var = self.func_sig[local_idx]
-            local_var = Variable(local_var, local_type)
-            local_var.py_type = self.stack_types[-1]
+            local_var = Variable(self.prefix + local_var,
+                                 self.C_TYPE_MAP[local_type])
+            local_var.py_type = local_type
         else:
             local_var = self.fb.fast_local_vars[local_idx]
         if self.stack_types[-1] == tuple:
             self.stack_types.pop()
             return ''
-        if isinstance(self.stack_types[-1], FunctionPointer):
+        if isinstance(self.stack_types[-1],
+                      (FunctionPointer, GenericFunction, ClassType)):
             self.fb.fast_local_vars[local_idx] = self.stack_types.pop()
             return ''
         if local_var.type == '':
             local_var.py_type = self.stack_types[-1]
             local_var.type = self.C_TYPE_MAP[self.stack_types[-1]]
-        elif local_var.py_type != self.stack_types[-1]:
+        elif not assignable(local_var.py_type, self.stack_types[-1]):
             raise TypeError(
                 f'variable {self.code.co_varnames[local_idx]} must have unchanging type'
             )
-        stack_var = self.get_stack_var(0)
+        if self.constants.local_value(local_idx) is not None:
+            # every load of the variable is replaced by its value
+            self.stack_types.pop()
+            return ''
+        stack_var = self.converted_stack_var(0, local_var.py_type)
         self.stack_types.pop()
         return Assignment(local_var, stack_var)
 
+    # `global name` in a function assigns the file scope variable of the
+    # module level name, see write_globals. The module level code stores the
+    # names some function declares global with STORE_GLOBAL as well
+    def STORE_GLOBAL(self):
+        if not self.code.co_flags & inspect.CO_NEWLOCALS:
+            return self.STORE_NAME()
+        name = self.code.co_names[self.cur_instr.arg]
+        global_var = self.globals['locals'][self.globals['index'][name]] \
+            if name in self.globals['index'] else None
+        if not isinstance(global_var, Variable) or not global_var.type:
+            raise Exception(f'{inspect.stack()[0][3]}: global {name} must be '
+                            'assigned at module level')
+        if not assignable(global_var.py_type, self.stack_types[-1]):
+            raise TypeError(f'variable {name} must have unchanging type')
+        stack_var = self.converted_stack_var(0, global_var.py_type)
+        self.stack_types.pop()
+        return Assignment(global_var, stack_var)
+
     def STORE_NAME(self):
         local_idx = self.cur_instr.arg
         local_var = self.fb.local_vars[local_idx]
+        if local_idx in self.const_names:
+            # initialized where it is declared
+            self.stack_types.pop()
+            return ''
         if self.stack_types[-1] == tuple:
             self.stack_types.pop()
             return ''
-        if isinstance(self.stack_types[-1], FunctionPointer):
+        if isinstance(self.stack_types[-1], (FunctionPointer, GenericFunction,
+                                             ClassType, Decorator, Module)):
             self.fb.local_vars[local_idx] = self.stack_types.pop()
             return ''
         if local_var.type == '':
             local_var.py_type = self.stack_types[-1]
             local_var.type = self.C_TYPE_MAP[self.stack_types[-1]]
-        elif local_var.py_type != self.stack_types[-1]:
+        elif not assignable(local_var.py_type, self.stack_types[-1]):
             raise TypeError(
                 f'variable {self.code.co_names[local_idx]} must have unchanging type'
             )
-        stack_var = self.get_stack_var(0)
+        if self.constants.name_value(local_idx) is not None:
+            self.stack_types.pop()
+            return ''
+        stack_var = self.converted_stack_var(0, local_var.py_type)
         self.stack_types.pop()
         return Assignment(local_var, stack_var)
 
+    # `owner.field = value`, with the value below the owner
+    def STORE_ATTR(self):
+        owner_type = self.stack_types[-1]
+        if not isinstance(owner_type, InstanceType):
+            raise Exception(f'{inspect.stack()[0][3]}: attributes can only '
+                            'be stored on instances')
+        cls = owner_type.cls
+        field = self.cur_instr.argval
+        if field not in cls.fields:
+            raise Exception(f'{inspect.stack()[0][3]}: {cls.name} has no '
+                            f'slot {field}')
+        field_type = cls.fields[field]
+        if not assignable(field_type, self.stack_types[-2]):
+            raise TypeError(f'cannot store a {self.stack_types[-2]} in '
+                            f'{cls.name}.{field}')
+        owner = self.get_stack_var(0)
+        value = self.converted_stack_var(1, field_type)
+        del self.stack_types[-2:]
+        return Assignment(
+            FieldAccess(owner, field, self.C_TYPE_MAP[field_type]), value)
+
     def STORE_SUBSCR(self):
-        array_idx = self.stack_types.pop()
-        self.fb.statements.pop()
-        array_name = self.stack_types.pop()
-        self.fb.statements.pop()
-        array_val = self.stack_types.pop()
-        self.fb.statements.pop()
-        # TODO actually do the right store_subscr
+        if is_dict(self.stack_types[-2]):
+            dict_type = self.stack_types[-2]
+            if not assignable(value_type(dict_type), self.stack_types[-3]):
+                raise TypeError(f'cannot store a {self.stack_types[-3]} in '
+                                f'a {dict_type}')
+            key = self.dict_key(key_type(dict_type))
+            items = self.get_stack_var(1)
+            value = self.get_stack_var(2)
+            del self.stack_types[-3:]
+            return f'py2c_dict_set_{self.dict_name(dict_type)}(' \
+                   f'{items.name}, {key.name}, {value.name});\n'
+        container_type = self.stack_types[-2]
+        if not is_list(container_type) and not is_array(container_type):
+            # `name: type = value` stores the type to __annotations__[name]
+            del self.stack_types[-3:]
+            return ''
+        value_type_ = self.stack_types[-3]
+        item, item_type = self.list_item()
+        if not assignable(item_type, value_type_):
+            raise TypeError(f'cannot store a {value_type_} in a '
+                            f'{container_type}')
+        value = self.get_stack_var(2)
+        self.stack_types.pop()
+        return Assignment(item, value)
+
+    # `a, b = items` moves the items to the slots, the first one on top.
+    # A tuple that is built right there is never stored as a struct
+    def UNPACK_SEQUENCE(self):
+        count = self.cur_instr.arg
+        tuple_type = self.stack_types[-1]
+        if not is_tuple(tuple_type) or len(item_types(tuple_type)) != count:
+            raise Exception(f'{inspect.stack()[0][3]}: only tuples of '
+                            f'{count} items can be unpacked to {count} '
+                            'variables')
+        stack_var_idx = self.stack_depths[self.instr_idx] - 1
+        if isinstance(getattr(self.pending.get(stack_var_idx), 'rhs', None),
+                      TupleLiteral):
+            items = self.get_stack_var(0).items
+        else:
+            value = self.get_container_var(0)
+            items = [
+                TupleItem(value, i, self.C_TYPE_MAP[_type])
+                for i, _type in enumerate(item_types(tuple_type))
+            ]
+        self.stack_types.pop()
+        self.stack_types += reversed(item_types(tuple_type))
+        self.move(stack_var_idx, items[::-1])
         return ''
 
+    # items[index] for the tuple and the literal index on top of the stack
+    def tuple_item(self):
+        tuple_type = self.stack_types[-2]
+        index = tuple_index(self.instructions, self.instr_idx, tuple_type)
+        if index is None:
+            raise Exception(f'{inspect.stack()[0][3]}: tuples can only be '
+                            'indexed by integer literals in range')
+        item_type = item_types(tuple_type)[index]
+        self.get_stack_var(0)
+        value = self.get_stack_var(1)
+        del self.stack_types[-2:]
+        self.stack_types.append(item_type)
+        stack_var = self.res_stack_var(item_type)
+        if isinstance(value, TupleLiteral):
+            return Assignment(stack_var, value.items[index])
+        return Assignment(stack_var, TupleItem(value, index, stack_var.type))
+
+    # the value at the offset from the top of the stack for a variable of
+    # type to, tuples are converted item by item since c only converts
+    # numbers, and lists are viewed as arrays
+    def converted_stack_var(self, offset, to):
+        from_ = self.stack_types[-1 - offset]
+        if is_array(to) and is_list(from_):
+            if not assignable(to, from_):
+                raise TypeError(f'cannot convert a {from_} to a {to}')
+            # the array views the memory of the list
+            return FunctionCall(
+                f'py2c_view_from_list_{self.item_c_type(from_)}',
+                [self.get_container_var(offset)], 'py2c_view', pure=True)
+        if not is_tuple(to) or from_ == to:
+            return self.get_stack_var(offset)
+        if not assignable(to, from_):
+            raise TypeError(f'cannot convert a {from_} to a {to}')
+        stack_var_idx = self.stack_depths[self.instr_idx] - offset - 1
+        if isinstance(getattr(self.pending.get(stack_var_idx), 'rhs', None),
+                      TupleLiteral):
+            items = self.get_stack_var(offset).items
+        else:
+            value = self.get_container_var(offset)
+            items = [
+                TupleItem(value, i, self.C_TYPE_MAP[_type])
+                for i, _type in enumerate(item_types(from_))
+            ]
+        return TupleLiteral(items, self.C_TYPE_MAP[to])
+
+    # the c type of the elements of the list
+    def item_c_type(self, list_type):
+        item_type = element_type(list_type)
+        if item_type is None:
+            raise Exception(f'{inspect.stack()[0][3]}: could not infer the '
+                            'element type of a list, only lists of int or '
+                            'float are supported')
+        return self.C_TYPE_MAP[item_type]
+
+    # the name of the py2c_dict functions for the key and value types
+    def dict_name(self, dict_type):
+        if key_type(dict_type) is None:
+            raise Exception(f'{inspect.stack()[0][3]}: could not infer the '
+                            'types of a dict, only dict[int, int], '
+                            'dict[int, float] and dict[str, int] are '
+                            'supported')
+        key_c_type = self.C_TYPE_MAP[key_type(dict_type)]
+        value_c_type = self.C_TYPE_MAP[value_type(dict_type)]
+        return f'{"str" if key_c_type == "char*" else key_c_type}_' \
+               f'{value_c_type}'
+
+    # the key at the offset from the top of the stack, checked against the
+    # key type of the dict
+    def dict_key(self, _type, offset=0):
+        if not assignable(_type, self.stack_types[-1 - offset]):
+            raise TypeError(f'dict keys must be of type {_type.__name__}')
+        return self.get_stack_var(offset)
+
+    # the list or dict at the offset from the top of the stack, stored to
+    # its stack slot first if it is computed, since accesses name it twice
+    # and method calls use it after their arguments are computed
+    def get_container_var(self, offset):
+        stack_var_idx = self.stack_depths[self.instr_idx] - offset - 1
+        if stack_var_idx in self.pending and not isinstance(
+                self.pending[stack_var_idx].rhs, Variable):
+            self.flush_stack()
+        return self.get_stack_var(offset)
+
+    # list[index] for the list and the index on top of the stack, and the
+    # type of the element
+    def list_item(self):
+        list_type, index_type = self.stack_types[-2:]
+        c_type = self.item_c_type(list_type)
+        if index_type not in (int, bool):
+            raise TypeError('list indices must be integers')
+        checked = not self.in_range()
+        items = self.get_container_var(1)
+        index = self.get_stack_var(0)
+        del self.stack_types[-2:]
+        item = ViewItem if is_array(list_type) else ListItem
+        return item(items, index, c_type, checked), element_type(list_type)
+
+    # for loops over range(len(items)) or range(0, len(items)) where nothing
+    # in the body can change the length of items or the index, so indexing
+    # items with the index needs no bounds check
+    def find_ranged_loops(self):
+        ranged_loops = []
+        for header, loop in self.cfg.loops.items():
+            if not loop.is_for:
+                continue
+            for_idx = self.types.instr_indices[header.start]
+            before = [
+                previous_instruction(self.instructions, for_idx, count)
+                for count in range(1, min(for_idx, 7) + 1)
+            ]
+            if len(before) < 6 or \
+                    [instr.opname for instr in before[:3]] != \
+                    ['GET_ITER', 'CALL_FUNCTION', 'CALL_FUNCTION'] or \
+                    before[2].arg != 1 or before[4].argval != 'len':
+                continue
+            items = variable_key(before[3])
+            if before[1].arg == 1:
+                range_ = before[5]
+            elif len(before) == 7 and before[5].opname == 'LOAD_CONST' and \
+                    before[1].arg == 2 and before[5].argval == 0:
+                range_ = before[6]
+            else:
+                continue
+            index_store = self.instructions[for_idx + 1]
+            index = variable_key(index_store)
+            if range_.argval != 'range' or items is None or index is None:
+                continue
+
+            for block in loop.body:
+                for instr in block.instructions:
+                    if instr is not index_store and \
+                            instr.opname.startswith(('STORE_', 'DELETE_')) \
+                            and variable_key(instr) in (items, index):
+                        break
+                    if instr.opname == 'LOAD_METHOD' and \
+                            instr.argval in RESIZING_METHODS:
+                        break
+                    # user functions could resize the list
+                    if instr.opname == 'LOAD_FAST' and isinstance(
+                            self.types.local_types.get(instr.arg),
+                            (FunctionPointer, GenericFunction)):
+                        break
+                    if instr.opname in ('LOAD_NAME', 'LOAD_GLOBAL') and \
+                            isinstance(self.types.load_name(instr.arg),
+                                       (FunctionPointer, GenericFunction)):
+                        break
+                else:
+                    continue
+                break
+            else:
+                ranged_loops.append((loop, items, index))
+        return ranged_loops
+
+    # whether the index loaded by the previous instruction is always in
+    # range of the list loaded before it
+    def in_range(self):
+        items = variable_key(self.previous_instruction(2))
+        index = variable_key(self.previous_instruction(1))
+        return any(
+            self.block in loop.body and (items, index) == (loop_items,
+                                                           loop_index)
+            for loop, loop_items, loop_index in self.ranged_loops)
+
+    # The ParallelLoop that the for loop over range_ at the current
+    # instruction runs as, or None if its iterations may depend on each
+    # other, or if the loop is in another loop. They do not if the loop only
+    # calls pure functions, and each variable it assigns is either
+    # - assigned before being read in every iteration and not read after
+    #   the loop, so that each thread can have its own,
+    # - an integer that is only changed by `variable += value`,
+    # - or only changed by `if value > variable: variable = value` (or <,
+    #   >= and <=), along with the variables assigned in the same if, which
+    #   the loop does not read.
+    # Floats are not summed, as adding them in another order rounds them
+    # differently. The c body of the loop is checked by parallelize
+    def parallel_loop(self, range_):
+        step = range_.step
+        if not (step == 1 or isinstance(step, Constant) and step.value > 0):
+            return None  # openmp has to know which way the loop goes
+        if self.in_loop or any(
+                self.block in loop.body
+                for header, loop in self.cfg.loops.items()
+                if header is not self.block):
+            return None  # the threads would be started every iteration
+        loop = self.cfg.loops[self.block]
+        self.parallel_blocks = {
+            self.types.instr_indices[instr.offset]: block
+            for block in loop.body if block is not self.block
+            for instr in block.instructions
+        }
+        loads = {}
+        stores = {}
+        for idx in sorted(self.parallel_blocks):
+            instr = self.instructions[idx]
+            if instr.opcode in JUMP_OPS and \
+                    self.cfg.block_at[instr.argval] not in loop.body:
+                return None  # break or return
+            if instr.opname == 'STORE_SUBSCR' and previous_instruction(
+                    self.instructions, idx, 2).argval == '__annotations__':
+                continue  # `name: type = value`
+            if instr.opname not in PARALLEL_OPS:
+                return None
+            key = variable_key(instr)
+            if instr.opname.startswith('STORE_'):
+                stores.setdefault(key, []).append(idx)
+            elif key is not None:
+                value = self.loaded_type(instr)
+                if value in (Print, BuildClass) or isinstance(
+                        value, (GenericFunction, ClassType, Module, Decorator)):
+                    return None
+                if isinstance(value, FunctionPointer) and \
+                        not self.thread_safe(self.loaded_function(instr)):
+                    return None
+                loads.setdefault(key, []).append(idx)
+        # the variables the functions read
+        outside = set()
+        for const in self.code.co_consts:
+            if isinstance(const, types.CodeType):
+                outside |= {('name', name) for name in referenced_names(const)}
+
+        extremes = []
+        seen = set()
+        for idx in sorted(self.parallel_blocks):
+            if self.instructions[idx].opname != 'COMPARE_OP':
+                continue
+            extreme = self.extreme(idx)
+            if extreme is None:
+                continue
+            op, key, load, store, arguments = extreme
+            variable = self.stored_variable(store)
+            if loads[key] != [load] or stores[key] != [store] or \
+                    variable.py_type not in NUMERIC_TYPES:
+                return None
+            for argument_key, argument_store in arguments:
+                if argument_key in loads or \
+                        stores[argument_key] != [argument_store] or \
+                        not self.stored_variable(argument_store).type:
+                    return None
+            extremes.append((op, variable, [
+                self.stored_variable(argument_store)
+                for _, argument_store in arguments
+            ]))
+            seen |= {key, *[argument_key for argument_key, _ in arguments]}
+
+        sums = []
+        private = []
+        for key, indices in stores.items():
+            if key in seen:
+                continue
+            if self.is_sum(loads.get(key, []), indices):
+                sums.append(self.stored_variable(indices[0]))
+            elif key not in outside and not self.read_after(loop, key) and all(
+                    any(self.assigned_before(store, load) for store in indices)
+                    for load in loads.get(key, [])):
+                private.append(self.stored_variable(indices[0]).name)
+            else:
+                return None
+        parallel = ParallelLoop(sums, extremes, self.globals['parallel'],
+                                f'{self.prefix}par{self.gflc}')
+        parallel.private = private
+        return parallel
+
+    # whether the loop can call the function from several threads at once,
+    # which it can if the function is pure, and neither it nor the functions
+    # it calls memoize their results
+    def thread_safe(self, fp):
+        functions = [fp]
+        seen = set()
+        while functions:
+            fp = functions.pop()
+            if not isinstance(fp, FunctionPointer) or fp.code is None or \
+                    fp.func_sig is None or fp.profiled or \
+                    self.memo_capacity(fp) or \
+                    not any(func.__code__ is fp.code
+                            for func in self.globals['pure']):
+                return False
+            for name in referenced_names(fp.code) - seen:
+                seen.add(name)
+                if isinstance(self.globals['types'].get(name),
+                              FunctionPointer):
+                    functions.append(self.globals['locals'][
+                        self.globals['index'][name]])
+        return True
+
+    def loaded_type(self, instr):
+        if instr.opname == 'LOAD_FAST':
+            return self.types.local_types.get(instr.arg)
+        return self.types.load_name(instr.arg)
+
+    # the FunctionPointer the translator made for the function the
+    # instruction loads, which knows its decorators, or a variable if the
+    # function is not translated yet
+    def loaded_function(self, instr):
+        if instr.opname == 'LOAD_FAST':
+            return self.fb.fast_local_vars[instr.arg]
+        return self.globals['locals'][self.globals['index'][instr.argval]]
+
+    # the variable the instruction at idx stores to
+    def stored_variable(self, idx):
+        instr = self.instructions[idx]
+        if instr.opname == 'STORE_NAME':
+            return self.typed_variable(self.fb.local_vars[instr.arg].name,
+                                       self.types.name_types.get(instr.arg))
+        if instr.arg < len(self.func_sig) - 1:
+            param_type, param_name = self.func_sig[instr.arg]
+            return self.typed_variable(self.prefix + param_name, param_type)
+        return self.typed_variable(self.fb.fast_local_vars[instr.arg].name,
+                                   self.types.local_types.get(instr.arg))
+
+    # whether the store at store_idx always runs before the load at load_idx
+    # in an iteration of the loop
+    def assigned_before(self, store_idx, load_idx):
+        store_block = self.parallel_blocks[store_idx]
+        load_block = self.parallel_blocks[load_idx]
+        if store_block is load_block:
+            return store_idx < load_idx
+        return self.cfg.dominates(store_block, load_block)
+
+    # whether the value the variable has after the loop may be read
+    def read_after(self, loop, key):
+        blocks = [loop.exit] if loop.exit else []
+        seen = set()
+        while blocks:
+            block = blocks.pop()
+            if block in seen:
+                continue
+            seen.add(block)
+            for instr in block.instructions:
+                if variable_key(instr) == key:
+                    if instr.opname.startswith('LOAD_'):
+                        return True
+                    break  # assigned again
+            else:
+                blocks += block.succs
+        return False
+
+    # whether the only load and store of an integer variable in the loop
+    # are those of `variable += value` or `variable = value + variable`
+    def is_sum(self, loads, stores):
+        if len(loads) != 1 or len(stores) != 1 or \
+                self.stored_variable(stores[0]).py_type is not int:
+            return False
+        load, store = loads[0], stores[0]
+        add = self.types.instr_indices[previous_instruction(
+            self.instructions, store, 1).offset]
+        if self.instructions[add].opname not in ('INPLACE_ADD',
+                                                 'BINARY_ADD') or \
+                self.parallel_blocks[load] is not self.parallel_blocks[add] \
+                or load > add:
+            return False
+        # the value loaded is an operand of the addition, so nothing in
+        # between uses it or copies it
+        depth = self.stack_depths[load]
+        return self.stack_depths[add] - depth in (1, 2) and all(
+            self.stack_depths[idx + 1] >= depth + 2 and
+            self.instructions[idx].opname not in ('DUP_TOP', 'DUP_TOP_TWO',
+                                                  'ROT_TWO', 'ROT_THREE')
+            for idx in range(load + 1, add))
+
+    # Match `if value > variable: variable = value` at the comparison at
+    # compare_idx, where the if may assign other variables (its arguments)
+    # from values it does not assign. Returns 'max' or 'min', the variable,
+    # the indices of its load and of its store, and the variable and the
+    # index of the store of each argument, or None
+    def extreme(self, compare_idx):
+        def following(idx):
+            idx += 1
+            while self.instructions[idx].opcode == dis.EXTENDED_ARG:
+                idx += 1
+            return idx
+
+        compare = self.instructions[compare_idx]
+        jump = self.instructions[following(compare_idx)]
+        if compare.argval not in EXTREMES[True] or \
+                jump.opname != 'POP_JUMP_IF_FALSE':
+            return None
+        # the assignments of the if, (value, variable, index of the store)
+        assignments = []
+        idx = following(following(compare_idx))
+        while self.instructions[idx].opname in ('LOAD_CONST', 'LOAD_FAST',
+                                                'LOAD_NAME', 'LOAD_GLOBAL'):
+            store_idx = following(idx)
+            store = self.instructions[store_idx]
+            if store.opname not in ('STORE_FAST', 'STORE_NAME'):
+                break
+            assignments.append((variable_key(self.instructions[idx]),
+                                variable_key(store), store_idx))
+            idx = following(store_idx)
+        end = self.instructions[idx]
+        if end.offset != jump.argval and not (
+                end.opname in ('JUMP_ABSOLUTE', 'JUMP_FORWARD') and
+                end.argval == jump.argval):
+            return None
+
+        variables = [store for _, store, _ in assignments]
+        if len(set(variables)) != len(variables) or any(
+                value in variables for value, _, _ in assignments):
+            return None  # the assignments depend on their order
+        lhs = previous_instruction(self.instructions, compare_idx, 2)
+        rhs = previous_instruction(self.instructions, compare_idx, 1)
+        for right, variable, value in ((True, rhs, lhs), (False, lhs, rhs)):
+            key, value_key = variable_key(variable), variable_key(value)
+            stores = [
+                store_idx for value_, store, store_idx in assignments
+                if (value_, store) == (value_key, key)
+            ]
+            if key is None or value_key is None or len(stores) != 1:
+                continue
+            arguments = [(store, store_idx)
+                         for _, store, store_idx in assignments
+                         if store != key]
+            if arguments and compare.argval not in ('<', '>'):
+                # which iteration assigns the arguments on ties depends on
+                # the order
+                return None
+            return (EXTREMES[right][compare.argval], key,
+                    self.types.instr_indices[variable.offset], stores[0],
+                    arguments)
+        return None
+
+    # Run the loops parallel_loop found independent on several threads,
+    # unless their body leaves them or assigns variables of the function
+    # that parallel_loop did not see, which inlined functions cannot, as
+    # cfg.Structurer recorded on the ForLoop. Each thread has its own copy of
+    # the other variables the body assigns. The loops inside a parallel loop
+    # stay serial. loops are the for loops of the function, in order
+    def parallelize(self, loops):
+        if self.globals['parallel'] is None:
+            return
+        python_names = {
+            variable.name
+            for variable in self.fb.local_vars + self.fb.fast_local_vars
+            if isinstance(variable, Variable)
+        } | {self.prefix + name for _, name in self.func_sig[:-1]}
+        names = python_names | {
+            variable.name
+            for variable in self.fb.stack_vars
+        }
+        if self.prefix:
+            names.add(self.result.name)
+
+        serial = set()
+        for loop in loops:
+            parallel = loop.parallel
+            if parallel is None:
+                continue
+            if id(loop) in serial:
+                loop.parallel = None
+                continue
+            reductions = {variable.name for variable in parallel.sums} | {
+                variable.name
+                for _, extreme, arguments in parallel.extremes
+                for variable in [extreme, *arguments]
+            }
+            if loop.body_leaves or loop.body_assigns & python_names - \
+                    reductions - set(parallel.private):
+                loop.parallel = None
+                continue
+            serial |= {id(inner) for inner in loop.inner}
+            # the loop variable is declared in the body if localize moved it
+            parallel.private = sorted(
+                (loop.body_assigns | {loop.var.name}) & names - reductions)
+
+    # In --vectorize mode, mark the for loop at the current instruction with
+    # its python line. A loop over a list whose body cannot resize it reads
+    # its size once, and if the body writes to no list or array either, a
+    # loop over numbers reads them through a restrict pointer
+    def vectorize_loop(self, loop):
+        if not self.globals['vectorize']:
+            return loop
+        loop.vectorize = True
+        idx = self.instr_idx
+        while self.instructions[idx].starts_line is None:
+            idx -= 1
+        loop.line = self.instructions[idx].starts_line
+        if not isinstance(loop, (ListLoop, ViewLoop)) or \
+                self.block not in self.cfg.loops:
+            return loop
+
+        resizes = writes = False
+        for block in self.cfg.loops[self.block].body:
+            for instr in block.instructions:
+                idx = self.types.instr_indices[instr.offset]
+                if instr.opname == 'STORE_SUBSCR' and previous_instruction(
+                        self.instructions, idx, 2).argval == '__annotations__':
+                    continue  # `name: type = value`
+                if instr.opname in ('LOAD_METHOD', 'DELETE_SUBSCR'):
+                    resizes = True
+                elif instr.opname in ('STORE_SUBSCR', 'STORE_ATTR'):
+                    writes = True
+                # user functions could resize the list
+                elif instr.opname in ('LOAD_FAST', 'LOAD_NAME',
+                                      'LOAD_GLOBAL') and isinstance(
+                                          self.loaded_type(instr),
+                                          (FunctionPointer, GenericFunction,
+                                           ClassType)):
+                    resizes = True
+        loop.counted = not resizes
+        loop.restrict = not resizes and not writes and \
+            loop.var.type in ('long', 'double')
+        return loop
+
+    # In --vectorize mode, declare the stack slots and the variables of the
+    # inlined functions that only the statements of a loop use in the body
+    # of the innermost such loop, rather than in the function. They never
+    # carry a value from one iteration to the next, which the c compiler
+    # then sees. scopes holds the for loops around every use of each name,
+    # from cfg.Structurer
+    def localize(self, scopes):
+        if not self.globals['vectorize']:
+            return
+        localized = set()
+        for variable in self.fb.stack_vars:
+            if variable.type not in self.C_TYPES or not variable.declared:
+                continue
+            common = scopes.get(variable.name, ())
+            if common:
+                common[-1].declarations.append(variable)
+                localized.add(variable.name)
+        self.fb.stack_vars = [
+            variable for variable in self.fb.stack_vars
+            if variable.name not in localized
+        ]
+
+    # a variable declared with the c type of py_type, or left untyped if
+    # py_type has no c equivalent
+    def typed_variable(self, name, py_type):
+        variable = Variable(name, FunctionTranslator.C_TYPE_MAP.get(py_type, ''))
+        if variable.type:
+            variable.py_type = py_type
+        return variable
+
+    # hand the stack over to the successors and resolve jump targets
+    def end_block(self, block):
+        last = block.last
+        for succ in block.succs:
+            if succ.entry_types is None:
+                depth = self.stack_depths[self.instr_idx] + dis.stack_effect(
+                    last.opcode, last.arg, jump=succ is not block.fallthrough)
+                succ.entry_types = self.stack_types[:depth]
+        if isinstance(block.terminator, (Branch, Jump)):
+            block.terminator.target = self.cfg.block_at[
+                block.terminator.target]
+        if isinstance(block.terminator, Branch):
+            block.terminator.fallthrough = block.fallthrough
+
+    def is_self_call(self, value):
+        return isinstance(value, FunctionCall) and value.code is self.code
+
+    # replace `return f(...)` in f by assigning the arguments to the
+    # parameters and jumping back to the start, and `return x + f(...)` or
+    # `return x * f(...)` as well, by adding x to an accumulator that the
+    # other returns add to their value
+    def convert_tail_calls(self):
+        if self.prefix or self.memoized or not self.func_sig:
+            return
+        # the returns are rendered late, see StatementBuffer
+        holes = self.fb.statements.holes
+        # index of the return -> recursive call, other operand, operator
+        tail_calls = {}
+        for i, (_, statement) in enumerate(holes):
+            if not isinstance(statement, Return):
+                continue
+            value = statement.value
+            if self.is_self_call(value):
+                tail_calls[i] = (value, None, None)
+            elif isinstance(value, BinaryOperation) and \
+                    value.op in ('+', '*') and self.func_sig[-1][0] is int:
+                # reassociating is only exact on integers
+                for call, other in ((value.lhs, value.rhs),
+                                    (value.rhs, value.lhs)):
+                    if self.is_self_call(call) and other.pure:
+                        tail_calls[i] = (call, other, value.op)
+                        break
+        if not tail_calls:
+            return
+
+        # a single accumulator, the returns with other operators stay calls
+        ops = [op for call, other, op in tail_calls.values() if op]
+        op = ops[0] if ops else None
+        for i, (call, other, call_op) in list(tail_calls.items()):
+            if call_op not in (None, op):
+                del tail_calls[i]
+
+        params = [
+            Variable(name, self.C_TYPE_MAP[_type])
+            for _type, name in self.func_sig[:-1]
+        ]
+        start = Label('start')
+        start.used = True
+        kind = 'accumulator' if op else 'tail'
+        self.globals['tail_calls'].append((self.code.co_name, kind))
+        prologue = [
+            f'// {kind} recursion of {self.code.co_name} runs as a loop\n'
+        ]
+        if op:
+            acc = Variable('tailacc', 'long')
+            self.fb.stack_vars.append(acc)
+            prologue.append(Assignment(acc, Constant(int(op == '*'))))
+        prologue.append(start)
+        for i, hole in enumerate(holes):
+            if i in tail_calls:
+                call, other, call_op = tail_calls[i]
+                hole[1] = TailCall(
+                    params, call.args, start,
+                    Assignment(acc, BinaryOperation(acc, op, other, 'long'))
+                    if other else None)
+            elif op and isinstance(hole[1], Return):
+                hole[1] = Return(
+                    BinaryOperation(acc, op, hole[1].value, 'long'))
+        holes[:0] = [[0, statement] for statement in prologue]
+
+    # Declare the module level names the functions use at file scope. Those
+    # assigned a literal once, and by no function, are declared static
+    # const with that value, so that the compiler can propagate it into the
+    # functions
+    def write_globals(self):
+        used = set()
+        for const in self.code.co_consts:
+            if isinstance(const, types.CodeType):
+                used |= referenced_names(const)
+        written = global_stores(self.code)
+        stores = {}
+        for idx, instr in enumerate(self.instructions):
+            if instr.opname in ('STORE_NAME', 'DELETE_NAME', 'STORE_GLOBAL'):
+                stores.setdefault(instr.arg, []).append(idx)
+        variables = [
+            variable for i, variable in enumerate(self.fb.local_vars)
+            if variable.type and variable.declared and
+            self.code.co_names[i] in used
+        ]
+        write_structs([variable.type for variable in variables], self.out)
+        for variable in variables:
+            name_idx = self.fb.local_vars.index(variable)
+            value = None
+            if len(stores.get(name_idx, ())) == 1 and \
+                    self.code.co_names[name_idx] not in written:
+                load = previous_instruction(self.instructions,
+                                            stores[name_idx][0], 1)
+                if load.opname == 'LOAD_CONST' and \
+                        type(load.argval) in (int, float, bool, str):
+                    value = Constant(load.argval)
+            if value is None:
+                self.out.write(f'static {variable}')
+            else:
+                self.out.write(f'static {variable.type} const '
+                               f'{variable.name} = {value.name};\n')
+                self.const_names.add(name_idx)
+            variable.declared = False  # not again in main
+
+    # translate the code object into self.fb and return it
     def translate(self):
-        output = ''
+        self.globals['active'].append(self.code)
 
-        # create a stack for each type
-        for _type in FunctionTranslator.C_TYPES:
-            for i in range(max(self.stack_depths)):
-                self.fb.stack_vars.append(Variable(f's{_type[0]}{i}', _type))
-
-        # TODO figure out the actual types of local variables
-        # create local variables
+        # create local variables with their inferred types
         for i, name in enumerate(self.code.co_names):
-            self.fb.local_vars.append(Variable(f'loc{i}', ''))
-
-        # create FAST local variables
+            self.fb.local_vars.append(
+                self.typed_variable(f'{self.prefix}loc{i}',
+                                    self.types.name_types.get(i)))
+            if self.constants.name_value(i) is not None:
+                self.fb.local_vars[i].declared = False
+        if self.globals['locals'] is self.fb.local_vars:
+            self.write_globals()  # the module level code
+
+        # create FAST local variables, parameters are declared by the caller
         for i, name in enumerate(self.code.co_varnames):
-            self.fb.fast_local_vars.append(Variable(f'fasloc{i}', ''))
+            self.fb.fast_local_vars.append(
+                self.typed_variable(
+                    f'{self.prefix}fasloc{i}',
+                    None if i < self.types.num_params else
+                    self.types.local_types.get(i)))
+            if self.constants.local_value(i) is not None:
+                self.fb.fast_local_vars[i].declared = False
 
         for instr in self.instructions:
             if DEBUG:
@@ -546,13 +2966,87 @@ class FunctionTranslator:
                 print('\tstack_types:', self.stack_types)
                 print(instr.opname, '->', instr)
             self.cur_instr = instr
-            # add a label if the instruction is a jump target
-            if instr.is_jump_target or instr.opname == 'JUMP_ABSOLUTE':
-                self.fb.statements.append(f'L{instr.offset}:;\n')
-
-            self.fb.statements.append(self.opcode_map(instr.opname)())
+            # drop values that were popped without being consumed
+            for stack_var_idx in list(self.pending):
+                if stack_var_idx >= self.stack_depths[self.instr_idx]:
+                    del self.pending[stack_var_idx]
+            if instr.offset in self.cfg.block_at:
+                # blocks can be entered from several places, so values left
+                # on the stack have to be stored to their slots
+                if self.statements is not None:
+                    self.flush_stack()
+                block = self.cfg.block_at[instr.offset]
+                self.block = block
+                self.statements = block.statements = BlockStatements(
+                    self.block_statements, self.globals['vectorize'])
+                if block.entry_types is not None:
+                    self.stack_types = list(block.entry_types)
+
+            handler = FunctionTranslator.OPCODE_TABLE.get(instr.opcode)
+            if handler is None:
+                raise Exception(
+                    f'{instr.opname}: opcode is not implemented')
+            statement = handler(self)
+            if isinstance(statement, Assignment) and \
+                    isinstance(statement.lhs, StackVariable) and \
+                    instr.offset in self.constants.results:
+                # the expression always has the same value
+                statement.rhs = Constant(self.constants.results[instr.offset],
+                                         statement.lhs.type)
+            if isinstance(statement, Assignment) and \
+                    isinstance(statement.lhs, StackVariable) and \
+                    statement.lhs.type == getattr(statement.rhs, 'type', None):
+                self.defer(statement)
+                statement = ''
+            elif isinstance(statement, (Branch, Jump, ForLoop)):
+                self.flush_stack()
+                block.terminator = statement
+            elif statement != '':
+                self.flush_stack()
+                if isinstance(statement, Assignment) and \
+                        isinstance(statement.lhs, StackVariable):
+                    self.used_stack_vars[statement.lhs.name] = statement.lhs
+                self.statements.append(statement)
+            if instr is block.last:
+                self.end_block(block)
             self.instr_idx += 1
-
-        output += str(self.fb)
-
-        return (output, self.func_decls)
+        self.flush_stack()
+
+        # emit the blocks as nested loops and conditionals
+        structurer = Structurer(self.cfg, self.fb.statements,
+                                self.globals['vectorize'])
+        structurer.structure()
+        self.block_statements.close()
+        self.convert_tail_calls()
+
+        # only declare the stack slots that are still referenced, by type
+        c_types = list(FunctionTranslator.C_TYPES)
+        self.fb.stack_vars += sorted(
+            self.used_stack_vars.values(),
+            key=lambda stack_var: (c_types.index(stack_var.type)
+                                   if stack_var.type in c_types else
+                                   len(c_types), stack_var.type,
+                                   stack_var.index))
+
+        self.localize(structurer.scopes)
+        self.parallelize(structurer.for_loops)
+        if self.prefix:
+            # falling off the end of the inlined body needs no jump, the
+            # statements of inlined functions are written out already
+            holes = self.fb.statements.holes
+            if holes and holes[-1][0] == self.fb.statements.size and \
+                    isinstance(holes[-1][1], InlineReturn):
+                holes[-1][1].jump = False
+            self.end.used = any(
+                isinstance(statement, InlineReturn) and statement.jump
+                for _, statement in holes)
+
+        self.globals['active'].pop()
+        return self.fb
+
+
+# static dispatch table from opcode number to its handler
+FunctionTranslator.OPCODE_TABLE = {
+    opcode: getattr(FunctionTranslator, name)
+    for name, opcode in dis.opmap.items() if hasattr(FunctionTranslator, name)
+}
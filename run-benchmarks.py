@@ -2,8 +2,7 @@
 
 import time
 import os
-from py2c.compile import compile_to_bytecode
-from py2c.translator import CodeTranslator
+from py2c.batch import translate_batch, compile_batch, print_summary
 
 ################################################################################
 ## User-Defined Constants: (make sure to change these to match your system)   ##
@@ -14,6 +13,8 @@ PYTHON_INTERPRETER = 'python3.9'  # name of python interpreter
 PYPY_INTERPRETER = 'pypy3'  # name of pypy command
 isCythonInstalled = True  # set to true if cython is installed
 hasIdiomaticVersion = True
+useBuildCache = False  # reuse translations and binaries of unchanged files
+NUM_JOBS = os.cpu_count()  # number of files translated/compiled in parallel
 
 NUM_TRIES = 1  # number of times each benchmark is run
 
@@ -58,22 +59,22 @@ if __name__ == '__main__':
     check_installed(PYTHON_INTERPRETER)
     check_installed(PYPY_INTERPRETER)
 
-    for path in BENCHMARKS:
+    # translate and compile everything up front, in parallel
+    results = translate_batch([f'{path}.py' for path in BENCHMARKS],
+                              jobs=NUM_JOBS,
+                              use_cache=useBuildCache,
+                              compiler=C_COMPILER)
+    compile_batch(results, C_COMPILER, ['-O3'], NUM_JOBS, useBuildCache,
+                  suffix='-O3')
+    print_summary(results)
+
+    for path, result in zip(BENCHMARKS, results):
         print(f'Executing {path}...')
-        bytecode = compile_to_bytecode(f'{path}.py')
-        translation_time = time.time()
-        c_source = CodeTranslator(bytecode).translate()
-        translation_time = time.time() - translation_time
-        print(f'  Translation time: {translation_time * 1000:.3f} ms')
-
-        with open(f'{path}.c', 'w') as writefile:
-            writefile.write(c_source)
-
-        os.system(f'{C_COMPILER} {path}.c -o {path}')
-        compilation_time = time.time()
-        os.system(f'{C_COMPILER} -O3 {path}.c -o {path}-O3')
-        compilation_time = time.time() - compilation_time
-        print(f'  Compilation time: {compilation_time * 1000:.3f} ms')
+        if result.error:
+            print('  Skipped, see above')
+            continue
+        print(f'  Translation time: {result.translation_time * 1000:.3f} ms')
+        print(f'  Compilation time: {result.compilation_time * 1000:.3f} ms')
 
         print(f'  Python ({NUM_TRIES} trials):')
         python_runtime = time_execution(
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3.9
+
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
+from py2c.compile import EXTENSION_SUFFIX, compile_c, extension_flags, \
+    openmp_flags, translate_file, vectorization_report
+from py2c.profiler import record_profile
+
+################################################################################
+## User-Defined Constants: (make sure to change these to match your system)   ##
+################################################################################
+
+C_COMPILER = 'gcc'  # name of the c compiler
+C_FLAGS = ['-O3']  # flags passed to the c compiler
+
+# examples translated to programs, which have to print what python prints
+PROGRAMS = [
+    'test/recursion.py',
+    'test/lists.py',
+    'test/dicts.py',
+    'test/tuples.py',
+    'test/classes.py',
+    'test/extension.py',
+    'test/generics.py',
+]
+
+# examples built as extension modules, and the python code that imports
+# each of them as `m` and calls its functions, which has to print the same
+# as with the python module
+EXTENSIONS = {
+    'test/extension.py': [
+        'print(m.gcd(1071, 462), m.mean(1, 2.5), m.is_even(7))',
+        'print(m.pick(True, "a", "b"), m.pick(False, "a", "b"))',
+        'print(m.collatz_steps(97))',
+        'try:\n    m.gcd("1", 2)\nexcept TypeError:\n    print("TypeError")',
+    ],
+    'test/arrays.py': [
+        'import array',
+        'd = array.array("d", [1.5, 2.25, -4.0, 8.0])',
+        'q = array.array("q", [3, -1, 4, 1, 5, 9])',
+        'print(m.total(d), m.total(memoryview(d)[::2]))',
+        'print(m.total(memoryview(d)[::-1]))',
+        'print(m.dot(q, q), m.dot(memoryview(q)[::2], memoryview(q)[1::2]))',
+        'm.scale(memoryview(q)[1::2], 10)',
+        'print(list(q), m.largest(q), m.largest(memoryview(q)[:2]))',
+        'try:\n    m.scale(memoryview(bytes(16)).cast("q"), 2)\n'
+        'except (BufferError, TypeError):\n    print("read-only")',
+    ],
+}
+
+# examples that python runs with their py2c.jit functions compiled
+JIT = ['test/jit.py']
+
+# examples translated with the types recorded by running them, as --profile
+# does
+PROFILED = ['test/profiled.py']
+
+# examples translated with --parallel, and how many of their loops have to
+# run on several threads
+PARALLEL = {'test/parallel.py': 2}
+
+# examples translated with --vectorize, whose vectorization report has to
+# list every loop, and say that those marked `# vectorized` are
+VECTORIZE = ['test/vectorize.py', 'benchmarks/pythagorean.py']
+
+################################################################################
+
+# runs a python file with py2c.jit leaving the functions to python
+WITHOUT_JIT = '''import py2c, runpy, sys
+py2c.jit = lambda func=None, **options: func or (lambda func: func)
+runpy.run_path(sys.argv[1], run_name='__main__')
+'''
+
+
+# the output of the command, which has to succeed
+def run(command, path=None, env=None):
+    env = dict(os.environ, **(env or {}))
+    env['PYTHONPATH'] = os.pathsep.join(
+        directory for directory in (path, os.getcwd()) if directory)
+    return subprocess.run(command, capture_output=True, text=True, env=env,
+                          check=True).stdout
+
+
+def difference(expected, actual):
+    if expected == actual:
+        return None
+    return f'printed\n{actual}instead of\n{expected}'
+
+
+def check_program(path, directory, parallel=None, vectorize=False,
+                  profile_path=None):
+    c_path = os.path.join(directory, 'program.c')
+    program = os.path.join(directory, 'program')
+    translate_file(path, c_path, profile_path=profile_path,
+                   parallel=parallel, vectorize=vectorize)
+    flags = openmp_flags() if parallel is not None else []
+    compile_c(c_path, program, C_COMPILER, [*C_FLAGS, *flags])
+    return difference(run([sys.executable, path]), run([program]))
+
+
+def check_extension(path, calls, directory):
+    name = os.path.splitext(os.path.basename(path))[0]
+    c_path = os.path.join(directory, f'{name}.c')
+    translate_file(path, c_path, extension=True)
+    compile_c(c_path, os.path.join(directory, f'{name}{EXTENSION_SUFFIX}'),
+              C_COMPILER, [*C_FLAGS, *extension_flags()])
+    code = '\n'.join([f'import {name} as m', *calls])
+    return difference(
+        run([sys.executable, '-c', code], os.path.dirname(path)),
+        run([sys.executable, '-c', code], directory))
+
+
+# The functions are compiled on the first run, into a new build cache. The
+# second run has to load them from the cache, as it cannot find the compiler
+def check_jit(path, directory):
+    expected = run([sys.executable, '-c', WITHOUT_JIT, path])
+    env = {'PY2C_CACHE_DIR': os.path.join(directory, 'cache')}
+    return difference(expected, run([sys.executable, path], env=env)) or \
+        difference(expected,
+                   run([sys.executable, path], env=dict(env, PATH='')))
+
+
+def check_profiled(path, directory):
+    profile_path = os.path.join(directory, 'profile.json')
+    with contextlib.redirect_stdout(io.StringIO()):
+        record_profile(path, profile_path)
+    return check_program(path, directory, profile_path=profile_path)
+
+
+def check_parallel(path, loops, directory):
+    error = check_program(path, directory, parallel=0)
+    with open(os.path.join(directory, 'program.c')) as readfile:
+        parallel = readfile.read().count('#pragma omp parallel')
+    if error is None and parallel != loops:
+        error = f'{parallel} loops run in parallel instead of {loops}'
+    return error
+
+
+def check_vectorize(path, directory):
+    error = check_program(path, directory, vectorize=True)
+    if error:
+        return error
+    with open(path) as readfile:
+        lines = readfile.readlines()
+    loops = {
+        number: line.rstrip().endswith('# vectorized')
+        for number, line in enumerate(lines, 1)
+        if line.lstrip().startswith('for ')
+    }
+    report = vectorization_report(os.path.join(directory, 'program.c'),
+                                  C_COMPILER, C_FLAGS)
+    reported = {line: copies == vectorized
+                for line, copies, vectorized, _ in report}
+    if reported.keys() != loops.keys():
+        return f'the report is on the loops at lines {sorted(reported)} ' \
+            f'instead of {sorted(loops)}'
+    missed = [line for line in loops if loops[line] and not reported[line]]
+    if missed:
+        return f'the loops at lines {missed} are not vectorized'
+    return None
+
+
+# translate, compile and run every example, and report the ones that
+# behave differently from python
+if __name__ == '__main__':
+    checks = [(path, check_program, (path, )) for path in PROGRAMS]
+    checks += [(f'{path} (extension)', check_extension, (path, calls))
+               for path, calls in EXTENSIONS.items()]
+    checks += [(f'{path} (jit)', check_jit, (path, )) for path in JIT]
+    checks += [(f'{path} (--profile)', check_profiled, (path, ))
+               for path in PROFILED]
+    checks += [(f'{path} (--parallel)', check_parallel, (path, loops))
+               for path, loops in PARALLEL.items()]
+    checks += [(f'{path} (--vectorize)', check_vectorize, (path, ))
+               for path in VECTORIZE]
+
+    failed = 0
+    for name, check, args in checks:
+        with tempfile.TemporaryDirectory() as directory:
+            try:
+                error = check(*args, directory)
+            except subprocess.CalledProcessError as e:
+                error = f'{e.cmd[0]} failed:\n{e.stderr.strip()}'
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+        print(f'{name}: {"ok" if error is None else "FAILED"}')
+        if error is not None:
+            print('  ' + error.replace('\n', '\n  '))
+            failed += 1
+    print(f'{len(checks) - failed} of {len(checks)} examples passed')
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,30 @@
+# Built as an extension module by run-examples.py, which passes it
+# array.array and memoryview buffers, strided ones included
+from py2c import array
+
+
+def total(xs: array[float]) -> float:
+    s: float = 0.0
+    for x in xs:
+        s += x
+    return s
+
+
+def dot(xs: array[int], ys: array[int]) -> int:
+    s: int = 0
+    for i in range(len(xs)):
+        s += xs[i] * ys[i]
+    return s
+
+
+def scale(xs: array[int], factor: int) -> None:
+    for i in range(len(xs)):
+        xs[i] = xs[i] * factor
+
+
+def largest(xs: array[int]) -> int:
+    best: int = xs[0]
+    for x in xs:
+        if x > best:
+            best = x
+    return best
@@ -0,0 +1,59 @@
+class Point:
+    __slots__ = ('x', 'y')
+    x: int
+    y: int
+
+    def __init__(self, x: int, y: int) -> None:
+        self.x = x
+        self.y = y
+
+    def norm1(self) -> int:
+        n: int = 0
+        if self.x < 0:
+            n -= self.x
+        else:
+            n += self.x
+        if self.y < 0:
+            n -= self.y
+        else:
+            n += self.y
+        return n
+
+    def move(self, dx: int, dy: int) -> None:
+        self.x += dx
+        self.y += dy
+
+
+class Counter:
+    __slots__ = ('count', 'step')
+    count: int
+    step: int
+
+    def __init__(self, step: int) -> None:
+        self.count = 0
+        self.step = step
+
+    def tick(self) -> int:
+        self.count += self.step
+        return self.count
+
+
+def farthest(a: Point, b: Point) -> Point:
+    if a.norm1() >= b.norm1():
+        return a
+    return b
+
+p: Point = Point(3, -4)
+print(p.x, p.y, p.norm1())
+p.move(1, 10)
+print(p.x, p.y, p.norm1())
+q: Point = Point(-20, 1)
+f: Point = farthest(p, q)
+print(f.x, f.y)
+f.x = 0
+print(q.x, q.norm1())
+
+c: Counter = Counter(5)
+for i in range(3):
+    print(c.tick())
+print(c.count)
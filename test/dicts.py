@@ -0,0 +1,40 @@
+def count(words: list[int]) -> dict[int, int]:
+    counts: dict[int, int] = {}
+    for w in words:
+        counts[w] = counts.get(w, 0) + 1
+    return counts
+
+def total(d: dict[str, int]) -> int:
+    s: int = 0
+    for v in d.values():
+        s += v
+    return s
+
+ages: dict[str, int] = {"ann": 31, "bob": 27}
+ages["cy"] = 45
+ages["ann"] += 1
+print(ages["ann"], ages["cy"], len(ages), total(ages))
+if "bob" in ages and "dan" not in ages:
+    print("bob", ages.get("bob", -1), "dan", ages.get("dan", -1))
+del ages["bob"]
+if "bob" not in ages:
+    print("deleted", len(ages))
+for name in ages:
+    print(name, ages[name])
+for name in ages.keys():
+    print(name)
+
+c: dict[int, int] = count([3, 1, 3, 2, 3, 1])
+for k in c:
+    print(k, c[k])
+
+# enough keys to rebuild the table a few times
+squares: dict[int, int] = {}
+for i in range(100):
+    squares[i] = i * i
+for i in range(0, 100, 2):
+    del squares[i]
+s: int = 0
+for k in squares:
+    s += squares[k]
+print(len(squares), s, squares[99])
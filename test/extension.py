@@ -0,0 +1,37 @@
+# Built as an extension module by run-examples.py, which imports it and
+# calls its functions from python. It also runs as a program
+
+
+def gcd(a: int, b: int) -> int:
+    while b != 0:
+        a, b = b, a % b
+    return a
+
+
+def mean(a: float, b: float) -> float:
+    return (a + b) / 2
+
+
+def is_even(n: int) -> bool:
+    return n % 2 == 0
+
+
+def pick(first: bool, a: str, b: str) -> str:
+    if first:
+        return a
+    return b
+
+
+def collatz_steps(n: int) -> int:
+    steps: int = 0
+    while n != 1:
+        if n % 2 == 0:
+            n = n // 2
+        else:
+            n = 3 * n + 1
+        steps += 1
+    return steps
+
+
+# runs when the module is imported
+print(gcd(1071, 462), collatz_steps(27))
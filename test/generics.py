@@ -0,0 +1,31 @@
+from typing import Union
+
+def square(x):
+    return x * x
+
+def larger(a: Union[int, float], b: Union[int, float]):
+    if a > b:
+        return a
+    return b
+
+def clamp(x: Union[int, float], lo: int, hi: int):
+    if x < lo:
+        return lo
+    if x > hi:
+        return hi
+    return x
+
+def count_down(n):
+    total = 0
+    while n > 0:
+        total += n
+        n -= 1
+    return total
+
+print(square(7), square(-12))
+print(larger(3, 9), larger(-4, -8))
+print(clamp(15, 0, 10), clamp(-3, 0, 10), clamp(4, 0, 10))
+print(count_down(100))
+# floats print differently in c, so they are only compared
+if square(1.5) == 2.25 and larger(2.5, 1) == 2.5:
+    print("floats")
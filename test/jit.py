@@ -0,0 +1,35 @@
+# Compiles its functions when python runs it, see run-examples.py. py2c.py
+# translates it as a program, ignoring the decorators
+from py2c import jit
+
+LIMIT = 1000
+
+
+def is_prime(n: int) -> bool:
+    if n < 2:
+        return False
+    d: int = 2
+    while d * d <= n:
+        if n % d == 0:
+            return False
+        d += 1
+    return True
+
+
+@jit
+def count_primes(n: int) -> int:
+    count: int = 0
+    for i in range(n):
+        if is_prime(i):
+            count += 1
+    return count
+
+
+@jit(flags=('-O2', ))
+def below_limit(n: int) -> int:
+    if n > LIMIT:
+        n = LIMIT
+    return count_primes(n)
+
+
+print(count_primes(100), count_primes(10000), below_limit(5000))
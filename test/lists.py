@@ -0,0 +1,41 @@
+def total(xs: list[int]) -> int:
+    s: int = 0
+    for x in xs:
+        s += x
+    return s
+
+def squares(n: int) -> list[int]:
+    ys: list[int] = []
+    for i in range(n):
+        ys.append(i * i)
+    return ys
+
+# reverses xs in place and returns the number of swaps
+def reverse(xs: list[int]) -> int:
+    i: int = 0
+    j: int = len(xs) - 1
+    while i < j:
+        t: int = xs[i]
+        xs[i] = xs[j]
+        xs[j] = t
+        i += 1
+        j -= 1
+    return i
+
+a: list[int] = [3, 1, 4, 1, 5]
+print(len(a), a[0], a[-1], total(a))
+a.append(9)
+a[1] = 2
+print(len(a), a[1], a[-1], total(a))
+print(a.pop(), len(a))
+print(reverse(a))
+for x in a:
+    print(x)
+
+b: list[int] = squares(6)
+for i in range(len(b)):
+    print(i, b[i])
+
+c: list[int] = [0] * 4
+c[2] = 7
+print(len(c), total(c), c[2], c[-2])
@@ -0,0 +1,45 @@
+# With --parallel, the first two loops run on several threads and the last
+# one stays serial, since the function it calls prints. run-examples.py
+# checks which loops are parallel
+
+
+def digit_sum(n: int) -> int:
+    s: int = 0
+    while n > 0:
+        s += n % 10
+        n = n // 10
+    return s
+
+
+calls: int = 0
+
+
+def logged_square(n: int) -> int:
+    global calls
+    calls += 1
+    if n % 250 == 0:
+        print('square of', n)
+    return n * n
+
+
+# a sum of a pure function
+total: int = 0
+for i in range(1, 100000):
+    total += digit_sum(i)
+print(total)
+
+# a maximum, and where it was found first
+best: int = 0
+best_at: int = 0
+for i in range(1, 100000):
+    d: int = digit_sum(i * 7)
+    if d > best:
+        best = d
+        best_at = i
+print(best, best_at)
+
+# the callee prints and counts its calls, so the iterations run in order
+squares: int = 0
+for i in range(1000):
+    squares += logged_square(i)
+print(squares, calls)
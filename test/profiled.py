@@ -0,0 +1,23 @@
+# Unannotated, translated with the types python saw when running it, see
+# run-examples.py
+def add(a, b):
+    return a + b
+
+def digits(n):
+    count = 0
+    while n > 0:
+        n = n // 10
+        count += 1
+    return count
+
+def mean(xs):
+    total = 0.0
+    for x in xs:
+        total += x
+    return total / len(xs)
+
+print(add(2, 3), add(-7, 4))
+print(digits(7), digits(123456789))
+# add also gets floats, so it is translated for both
+if add(1.5, 2) == 3.5 and mean([1.0, 2.0, 4.5]) == 2.5:
+    print("floats")
@@ -0,0 +1,24 @@
+def factorial(n: int, acc: int) -> int:
+    if n <= 1:
+        return acc
+    return factorial(n - 1, acc * n)
+
+def gcd(a: int, b: int) -> int:
+    if b == 0:
+        return a
+    return gcd(b, a % b)
+
+def sum_to(n: int) -> int:
+    if n == 0:
+        return 0
+    return n + sum_to(n - 1)
+
+def power(base: int, exp: int) -> int:
+    if exp == 0:
+        return 1
+    return base * power(base, exp - 1)
+
+print(factorial(10, 1), factorial(20, 1))
+print(gcd(1071, 462), gcd(17, 5))
+print(sum_to(10), sum_to(900))
+print(power(3, 13), power(2, 62))
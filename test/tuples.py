@@ -0,0 +1,39 @@
+def divmod_(a: int, b: int) -> tuple[int, int]:
+    q: int = a // b
+    return q, a - q * b
+
+def fib(n: int) -> int:
+    a: int = 0
+    b: int = 1
+    for i in range(n):
+        a, b = b, a + b
+    return a
+
+def min_max(xs: list[int]) -> tuple[int, int]:
+    lo: int = xs[0]
+    hi: int = xs[0]
+    for x in xs:
+        if x < lo:
+            lo = x
+        if x > hi:
+            hi = x
+    return lo, hi
+
+def describe(p: tuple[str, int]) -> int:
+    print(p[0], p[1])
+    return p[1] * 2
+
+q, r = divmod_(17, 5)
+print(q, r)
+q, r = divmod_(r, 2)
+print(q, r)
+t: tuple[int, int] = divmod_(100, 7)
+print(t[0], t[1])
+print(fib(10), fib(30))
+lo, hi = min_max([4, -2, 9, 0])
+print(lo, hi)
+x: int = 1
+y: int = 2
+x, y = y, x
+print(x, y)
+print(describe(("total", lo + hi)))
@@ -0,0 +1,37 @@
+# With --vectorize, gcc -O3 vectorizes the loop marked below.
+# run-examples.py checks that the report lists every loop
+
+
+def total(xs: list[int]) -> int:
+    s: int = 0
+    for x in xs:  # vectorized
+        s += x
+    return s
+
+
+def count_below(xs: list[int], limit: int) -> int:
+    n: int = 0
+    for x in xs:
+        if x < limit:
+            n += 1
+    return n
+
+
+def first_negative(xs: list[int]) -> int:
+    i: int = 0
+    while i < len(xs):
+        if xs[i] < 0:
+            return i
+        i += 1
+    return -1
+
+
+squares: list[int] = []
+for i in range(1000):
+    squares.append(i * i % 997 - 10)
+print(total(squares), count_below(squares, 500), first_negative(squares))
+
+s: int = 0
+for i in range(0, 1000, 4):
+    s += i * 3
+print(s)
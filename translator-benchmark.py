@@ -0,0 +1,117 @@
+#!/usr/bin/env python3.9
+
+import dis
+import os
+import sys
+import time
+import tracemalloc
+import types
+from py2c.translator import CodeTranslator
+
+################################################################################
+## User-Defined Constants:                                                    ##
+################################################################################
+
+# approximate number of bytecode instructions in each generated module
+SIZES = [10_000, 100_000, 1_000_000]
+
+STATEMENTS_PER_FUNCTION = 50  # each statement is about 10 instructions
+GLOBALS_PER_FUNCTION = 2
+
+# approximate number of bytecode instructions in the single function of the
+# second series, which checks that the memory used by one very large
+# function body stays bounded
+FUNCTION_SIZES = [20_000, 80_000, 320_000]
+BRANCH_EVERY = 10  # one statement in this many is an if
+
+################################################################################
+
+
+# synthetic module with many functions reading many globals and calling
+# each other, using only features py2c supports
+def generate_module(num_instructions):
+    num_functions = max(1, num_instructions // (STATEMENTS_PER_FUNCTION * 10))
+    num_globals = num_functions * GLOBALS_PER_FUNCTION
+    lines = [f'g{i}: int = {i}' for i in range(num_globals)]
+    for f in range(num_functions):
+        lines.append(f'def f{f}(a: int, b: int) -> int:')
+        lines.append('    x: int = a + b')
+        for s in range(STATEMENTS_PER_FUNCTION):
+            lines.append(f'    x = x * {s % 7 + 1} + '
+                         f'g{(f * 31 + s) % num_globals} - b')
+        if f:
+            lines.append(f'    return x + f{f - 1}(a, b)')
+        else:
+            lines.append('    return x')
+    lines.append('s: int = 0')
+    lines.append('for i in range(10):')
+    lines.append(f'    s += f{num_functions - 1}(i, 1)')
+    lines.append('print(s)')
+    return '\n'.join(lines) + '\n', num_functions, num_globals
+
+
+# synthetic module with a single function of about num_instructions
+# instructions, made of straight-line statements and small ifs
+def generate_function(num_instructions):
+    num_statements = max(1, num_instructions // 10)
+    lines = ['g: int = 3', 'def f(a: int, b: int) -> int:',
+             '    x: int = a + b']
+    for s in range(num_statements):
+        if s % BRANCH_EVERY:
+            lines.append(f'    x = x * {s % 7 + 1} + g - b')
+        else:
+            lines.append(f'    if x > {s}:')
+            lines.append(f'        x = x - a * {s % 5 + 1}')
+    lines.append('    return x')
+    lines.append('print(f(1, 2))')
+    return '\n'.join(lines) + '\n', 1, 1
+
+
+def count_instructions(code):
+    count = len(list(dis.get_instructions(code)))
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            count += count_instructions(const)
+    return count
+
+
+def measure(num_instructions, generate=generate_module):
+    source, num_functions, num_globals = generate(num_instructions)
+    code = compile(source, f'<synthetic {num_instructions}>', 'exec')
+    count = count_instructions(code)
+
+    with open(os.devnull, 'w') as out:
+        translation_time = time.perf_counter()
+        CodeTranslator(code).translate(out)
+        translation_time = time.perf_counter() - translation_time
+
+        # measured separately since tracing slows the translation down
+        tracemalloc.start()
+        CodeTranslator(code).translate(out)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return count, num_functions, num_globals, translation_time, peak_memory
+
+
+def print_series(sizes, generate):
+    print(f'{"instrs":>10} {"funcs":>7} {"globals":>8} {"time (s)":>10} '
+          f'{"us/instr":>9} {"scaling":>8} {"peak (MB)":>10}')
+    base = None
+    for size in sizes:
+        count, functions, globals_, seconds, memory = measure(size, generate)
+        per_instruction = seconds / count * 1e6
+        base = base or per_instruction
+        print(f'{count:>10} {functions:>7} {globals_:>8} {seconds:>10.3f} '
+              f'{per_instruction:>9.3f} {per_instruction / base:>7.2f}x '
+              f'{memory / 2**20:>10.1f}')
+
+
+if __name__ == '__main__':
+    sizes = [int(size) for size in sys.argv[1:]]
+
+    print('many functions:')
+    print_series(sizes or SIZES, generate_module)
+    print()
+    print('one large function:')
+    print_series(sizes or FUNCTION_SIZES, generate_function)